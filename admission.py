@@ -0,0 +1,151 @@
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from metrics import registry, CallbackGauge, Counter, Histogram
+
+
+# Graph runs that may execute at once, more wait in a bounded queue
+MAX_INFLIGHT_REQUESTS = int(os.getenv("MAX_INFLIGHT_REQUESTS", "8"))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "32"))
+# Running plus queued requests one user (or thread) may have
+MAX_REQUESTS_PER_USER = int(os.getenv("MAX_REQUESTS_PER_USER", "2"))
+# Seconds a request may wait for a slot, and then run, before it is given up
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "10"))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "120"))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted, maps to an HTTP 429 or 503"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Request rejected ({reason}), retry after {retry_after}s")
+
+    def to_dict(self):
+        return {"code": self.reason, "message": str(self), "retry_after": self.retry_after}
+
+
+admission_wait = registry.register(Histogram("agent_admission_wait_seconds", "Time requests spent queued before running"))
+admission_rejections = registry.register(Counter("agent_admission_rejections_total", "Requests turned away", ["reason"]))
+request_timeouts = registry.register(Counter("agent_request_timeouts_total", "Graph runs cancelled at REQUEST_TIMEOUT"))
+
+
+class AdmissionController:
+    """Bounded queue in front of the shared graph with a per-user cap and one run per thread at a time"""
+
+    def __init__(self, max_inflight=MAX_INFLIGHT_REQUESTS, max_queued=MAX_QUEUED_REQUESTS,
+                 per_user=MAX_REQUESTS_PER_USER, queue_timeout=QUEUE_TIMEOUT):
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.per_user = per_user
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self.queued = 0
+        self._per_user = {}
+        # thread_id -> [lock, requests holding or waiting for it], two runs must not write one checkpoint thread
+        self._threads = {}
+        self._slots = asyncio.Semaphore(max_inflight)
+        # recent run times, used to estimate Retry-After
+        self._durations = []
+
+    def retry_after(self) -> int:
+        mean = sum(self._durations) / len(self._durations) if self._durations else 5.0
+        waves = (self.queued + self.inflight) / self.max_inflight
+        return max(1, math.ceil(mean * max(1.0, waves)))
+
+    def _reject(self, status_code, reason):
+        admission_rejections.inc(reason=reason)
+        raise AdmissionRejected(status_code, reason, self.retry_after())
+
+    def check(self, user_id: str):
+        """Raise AdmissionRejected if a request from this user would be turned away right now"""
+        if self._per_user.get(user_id, 0) >= self.per_user:
+            self._reject(429, "too_many_user_requests")
+        if self.inflight >= self.max_inflight and self.queued >= self.max_queued:
+            self._reject(503, "queue_full")
+
+    async def acquire(self, user_id: str, thread_id: str = None):
+        """Wait for the thread's earlier run to finish and for a run slot, or raise AdmissionRejected straight away when saturated"""
+        self.check(user_id)
+
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        self.queued += 1
+        start = time.perf_counter()
+        thread_lock = self._thread_lock(thread_id)
+        locked = False
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                if thread_lock is not None:
+                    await thread_lock.acquire()
+                    locked = True
+                await self._slots.acquire()
+        except BaseException as e:
+            self._release_thread(thread_id, locked)
+            self._release_user(user_id)
+            if isinstance(e, TimeoutError):
+                self._reject(503, "queue_timeout")
+            raise
+        finally:
+            self.queued -= 1
+        admission_wait.observe(time.perf_counter() - start)
+        self.inflight += 1
+        return time.perf_counter()
+
+    def release(self, user_id: str, started: float, thread_id: str = None):
+        self.inflight -= 1
+        self._slots.release()
+        self._release_thread(thread_id, True)
+        self._release_user(user_id)
+        self._durations = (self._durations + [time.perf_counter() - started])[-50:]
+
+    def _release_user(self, user_id):
+        remaining = self._per_user.get(user_id, 0) - 1
+        if remaining > 0:
+            self._per_user[user_id] = remaining
+        else:
+            self._per_user.pop(user_id, None)
+
+    def _thread_lock(self, thread_id):
+        if thread_id is None:
+            return None
+        entry = self._threads.setdefault(thread_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        return entry[0]
+
+    def _release_thread(self, thread_id, locked: bool):
+        if thread_id is None:
+            return
+        entry = self._threads[thread_id]
+        if locked:
+            entry[0].release()
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._threads[thread_id]
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, thread_id: str = None):
+        started = await self.acquire(user_id, thread_id)
+        try:
+            yield
+        finally:
+            self.release(user_id, started, thread_id)
+
+    def stats(self):
+        return {
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "max_inflight": self.max_inflight,
+            "max_queued": self.max_queued,
+            "users": len(self._per_user),
+        }
+
+
+admission = AdmissionController()
+
+registry.register(CallbackGauge("agent_queue_depth", "Requests waiting for a run slot", lambda: admission.queued))
+registry.register(CallbackGauge("agent_inflight_requests", "Graph runs executing", lambda: admission.inflight))
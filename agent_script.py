@@ -1,131 +1,125 @@
 #import libraries
-from langchain_openai import ChatOpenAI
-from langchain_groq import ChatGroq
-from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+# Provider clients, the SQLite checkpointer and mcp_use are imported where they are first used,
+# so importing this module (backend.py does) stays cheap
+from langchain_core.messages import HumanMessage, AIMessage
 from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import tools_condition, ToolNode
-from langgraph.graph import MessagesState
+from langgraph.prebuilt import ToolNode
 import asyncio
 import os
-import subprocess
 from dotenv import load_dotenv
-from mcp_use.client import MCPClient
-from mcp_use.adapters.langchain_adapter import LangChainAdapter
-import requests
-from typing import Annotated, List, Dict, Any, TypedDict
-import streamlit as st
-import json
+import time
 
-
-# Load environment variables
+# Load environment variables before the modules below read their settings from them at import
 load_dotenv()
 
+from graph_state import MultiAgentState
+from mcp_registry import tool_registry
+from routing import categorize_request, fast_route
+from tool_projection import project_tool_messages, record_playlist_info
+from context_budget import build_context
+from llm_gateway import LLMGateway, fallback_model
+from response_cache import response_cache, cached_ainvoke, lookup_turn, store_turn
+from playlist_writer import bulk_add_tracks_tool
+from parallel_tools import PARALLEL_TOOLS, TOOL_CONCURRENCY, limit_concurrency, search_many_tool
+from search_cache import search_cache, cached_search_tool, record_search_results, format_search_results
+from speculation import speculator
+from library_mirror import library, mirrored_playlist_tools, search_library_tool, format_library
+from token_manager import token_manager
+from chat_response import turn_response, tool_preview
+from turn_budget import TurnBudget, MAX_HOPS, MAX_TOOL_CALLS, TURN_DEADLINE
+from metrics import registry, CallbackGauge, instrument_node, instrument_tool, trace_request
+from supervisor import MCPWatchdog, free_port
 
-def kill_processes_on_port(port):
-    """Kill all processes running on the specified port"""
-    try:
-        # Find processes using the port
-        result = subprocess.run(['lsof', '-ti', f':{port}'], 
-                              capture_output=True, text=True, check=False)
-        
-        if result.returncode == 0 and result.stdout.strip():
-            pids = result.stdout.strip().split('\n')
-            print(f"Found processes on port {port}: {pids}")
-            
-            # Kill each process
-            for pid in pids:
-                if pid:
-                    try:
-                        subprocess.run(['kill', '-9', pid], check=True)
-                        print(f"Killed process {pid} on port {port}")
-                    except subprocess.CalledProcessError:
-                        print(f"Failed to kill process {pid}")
-        else:
-            print(f"No processes found on port {port}")
-            
-    except FileNotFoundError:
-        print("lsof command not found, trying alternative method...")
-        try:
-            # Alternative method using netstat and kill
-            result = subprocess.run(['netstat', '-tulpn'], 
-                                  capture_output=True, text=True, check=False)
-            if result.returncode == 0:
-                lines = result.stdout.split('\n')
-                for line in lines:
-                    if f':{port}' in line and 'LISTEN' in line:
-                        parts = line.split()
-                        if len(parts) > 6 and '/' in parts[6]:
-                            pid = parts[6].split('/')[0]
-                            try:
-                                subprocess.run(['kill', '-9', pid], check=True)
-                                print(f"Killed process {pid} on port {port}")
-                            except subprocess.CalledProcessError:
-                                print(f"Failed to kill process {pid}")
-        except Exception as e:
-            print(f"Error killing processes on port {port}: {e}")
-
-
-# Validate OpenAI API key
-openai_key = os.getenv("OPENAI_API_KEY")
-if not openai_key:
-    raise ValueError("OPENAI_API_KEY environment variable is not set.")
-
-
-# Custom State for Multi-Agent System
-class MultiAgentState(TypedDict):
-    messages: Annotated[List, "The conversation messages"]
-    current_agent: str  # Track which agent should handle the task
-    task_type: str      # Type of task: "search", "playlist", or "general"
-    search_results: Dict[str, Any]  # Store search results between agents
-    playlist_info: Dict[str, Any]   # Store playlist information
-
-
-def categorize_request(message: str) -> str:
-    """Determine which agent should handle the request"""
-    message_lower = message.lower()
-    
-    # Playlist-related keywords
-    playlist_keywords = ["playlist", "create", "add tracks", "add songs", "make a playlist"]
-    
-    # Search-related keywords  
-    search_keywords = ["search", "find", "look for", "discover", "track", "song", "artist", "album"]
-    
-    if any(keyword in message_lower for keyword in playlist_keywords):
-        return "playlist"
-    elif any(keyword in message_lower for keyword in search_keywords):
-        return "search"
-    else:
-        return "general"
 
 
-async def create_multi_agent_graph():
-    # Create MCP client and load tools
-    client = MCPClient.from_config_file("mcp_config.json")
-    adapter = LangChainAdapter()
-    all_tools = await adapter.create_tools(client)
+# Search cache effectiveness shows up next to the latency histograms on /metrics
+registry.register(CallbackGauge("agent_search_cache_hits", "searchSpotify calls served from the cache",
+                                lambda: search_cache.stats()["hits"]))
+registry.register(CallbackGauge("agent_search_cache_misses", "searchSpotify calls sent to MCP",
+                                lambda: search_cache.stats()["misses"]))
+
+
+# Characters of each tool result sent with tool_end stream events, the UI shows them collapsed
+STREAM_TOOL_OUTPUT_CHARS = int(os.getenv("STREAM_TOOL_OUTPUT_CHARS", "2000"))
+
+# Conversation state is stored per thread in this SQLite file
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.sqlite")
+
+
+def open_checkpointer(path: str = CHECKPOINT_DB):
+    """Async context manager for the SQLite checkpointer that stores each thread's state"""
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    return AsyncSqliteSaver.from_conn_string(path)
+
+
+async def create_multi_agent_graph(checkpointer=None, config_path="mcp_config.json", llm=None,
+                                   max_hops=MAX_HOPS, max_tool_calls=MAX_TOOL_CALLS, deadline=TURN_DEADLINE):
+    build_start = time.perf_counter()
+    # Every turn runs under hop, tool call and wall-clock limits and wraps up with a partial answer past them
+    budget = TurnBudget(max_hops, max_tool_calls, deadline)
+    warm = tool_registry.is_warm(config_path)
+
+    # Load tools through the shared registry, which reuses live MCP sessions across builds
+    all_tools = await tool_registry.get_tools(config_path)
     
     print(f"Loaded {len(all_tools)} tools from MCP")
+
+    # Time every MCP round trip, the wrappers below (cache, bulk writer) only add calls on top
+    all_tools = [instrument_tool(tool) for tool in all_tools]
     
-    # Filter tools by category
-    search_tools = [tool for tool in all_tools if tool.name in ["searchSpotify"]]
-    playlist_tools = [tool for tool in all_tools if tool.name in [
+    # Cap concurrent MCP calls, ToolNode runs every call from one model turn at the same time
+    tool_semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+
+    # Filter tools by category, searches go through the shared result cache
+    raw_search_tools = [limit_concurrency(tool, tool_semaphore) for tool in all_tools if tool.name in ["searchSpotify"]]
+    search_tools = [cached_search_tool(tool, search_cache, speculator) for tool in raw_search_tools]
+    playlist_tools = [limit_concurrency(tool, tool_semaphore) for tool in all_tools if tool.name in [
         "createPlaylist", "addTracksToPlaylist", "getMyPlaylists", "getPlaylistTracks"
     ]]
+
+    # Playlist reads come from the local library mirror when it is fresh, writes mark it stale
+    if library is not None:
+        playlist_tools = mirrored_playlist_tools(playlist_tools, library) + [search_library_tool(library)]
+
+    # Playlist writes go through a deduplicating, chunked writer instead of one call per track
+    tools_by_name = {tool.name: tool for tool in playlist_tools}
+    if "addTracksToPlaylist" in tools_by_name and "getPlaylistTracks" in tools_by_name:
+        bulk_add = bulk_add_tracks_tool(tools_by_name["addTracksToPlaylist"], tools_by_name["getPlaylistTracks"])
+        playlist_tools = [bulk_add if tool.name == bulk_add.name else tool for tool in playlist_tools]
+
+    # Resolve a whole list of songs in one step instead of one model turn per song
+    if PARALLEL_TOOLS and search_tools:
+        bulk_search = search_many_tool(search_tools[0])
+        search_tools.append(bulk_search)
+        playlist_tools.append(bulk_search)
     
     print(f"Search tools: {[t.name for t in search_tools]}")
     print(f"Playlist tools: {[t.name for t in playlist_tools]}")
     
-    # Define LLM
-    llm = ChatGroq(model='meta-llama/llama-4-scout-17b-16e-instruct')
+    # Define LLM, benchmarks pass in a scripted model instead
+    if llm is None:
+        from langchain_groq import ChatGroq
+        # the gateway owns retries, so the client's own retry loop is turned off
+        llm = ChatGroq(model='meta-llama/llama-4-scout-17b-16e-instruct', max_retries=0)
+    # Every node calls the model through one gateway: async, rate limited, retried, optionally hedged
+    gateway = LLMGateway(llm, fallback=fallback_model())
     
     # ORCHESTRATOR AGENT
-    def orchestrator_agent(state: MultiAgentState):
+    async def orchestrator_agent(state: MultiAgentState):
         """Routes requests to appropriate specialized agents"""
         last_message = state["messages"][-1]
         
         if isinstance(last_message, HumanMessage):
-            task_type = categorize_request(last_message.content)
+            # Confident keyword routes go straight to the specialist without an LLM call
+            route = fast_route(last_message.content)
+            task_type = route or categorize_request(last_message.content)
+
+            # Searches named in the message start now and run while the LLMs decide on the same calls
+            if task_type == "search" and speculator is not None and raw_search_tools:
+                speculator.prefetch(last_message.content, raw_search_tools[0], search_cache)
+
+            if route is not None:
+                return {"task_type": route, "current_agent": route}
             
             system_msg = """You are an orchestrator agent for a Spotify multi-agent system. 
             
@@ -139,33 +133,45 @@ async def create_multi_agent_graph():
             
             Task Type Identified: """ + task_type
             
-            response = llm.invoke([
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": last_message.content}
-            ])
+            response = await cached_ainvoke(response_cache, "orchestrator", gateway, build_context(system_msg, [last_message]))
             
             return {
-                "messages": state["messages"] + [response],
+                "messages": [response],
                 "task_type": task_type,
                 "current_agent": task_type if task_type in ["search", "playlist"] else "orchestrator"
             }
         
-        return {"messages": state["messages"]}
+        # Nothing new to route, end the turn rather than re-dispatching to a stale current_agent
+        return {"current_agent": "orchestrator"}
     
+    # Prompt lines that depend on whether one turn may issue many tool calls
+    if PARALLEL_TOOLS:
+        search_many_help = "\n        - searchSpotifyMany: Search for a list of songs or artists at once"
+        multi_song_hint = "- If user wants multiple songs, call searchSpotifyMany once with all of them"
+        playlist_songs_hint = "- Look up all the songs with one searchSpotifyMany call before adding them"
+    else:
+        search_many_help = ""
+        multi_song_hint = "- If user wants multiple songs, search for each individually or use broader queries"
+        playlist_songs_hint = "- Use track IDs found earlier in the conversation"
+    library_help = "\n        - searchMyLibrary: Find the user's playlists and saved songs by name or artist" if library is not None else ""
+
+    # Bind the tools once per graph instead of on every call
+    search_llm = gateway.bind_tools(search_tools, parallel_tool_calls=PARALLEL_TOOLS)
+    playlist_llm = gateway.bind_tools(playlist_tools, parallel_tool_calls=PARALLEL_TOOLS)
+
     # SEARCH AGENT
-    def search_agent(state: MultiAgentState):
+    async def search_agent(state: MultiAgentState):
         """Specialized agent for finding tracks, albums, artists"""
-        search_llm = llm.bind_tools(search_tools, parallel_tool_calls=False)
         
         system_msg = """You are a specialist Spotify Search Agent. Your only job is to find tracks, albums, artists, or playlists on Spotify.
         
         Available tools:
-        - searchSpotify: Search for tracks, albums, artists, or playlists
+        - searchSpotify: Search for tracks, albums, artists, or playlists""" + search_many_help + """
         
         When searching:
         - Use appropriate search queries
         - Return detailed information about found items
-        - If user wants multiple songs, search for each individually or use broader queries
+        """ + multi_song_hint + """
         - Always provide track URIs/IDs for playlist creation
         
         CRITICAL - Parameter Type Requirements:
@@ -174,26 +180,25 @@ async def create_multi_agent_graph():
         - WRONG: limit: "10"
         """
         
-        recent_messages = state["messages"][-5:]
-        response = search_llm.invoke([{"role": "system", "content": system_msg}] + 
-                                   [{"role": "user", "content": msg.content} for msg in recent_messages if hasattr(msg, 'content')])
+        # Recent turns that fit the token budget, with tool calls kept next to their results
+        response = await cached_ainvoke(response_cache, "search_agent", search_llm, build_context(system_msg, state["messages"]))
         
-        return {"messages": state["messages"] + [response]}
+        return {"messages": [response]}
     
     # PLAYLIST AGENT  
-    def playlist_agent(state: MultiAgentState):
+    async def playlist_agent(state: MultiAgentState):
         """Specialized agent for playlist operations"""
-        playlist_llm = llm.bind_tools(playlist_tools, parallel_tool_calls=False)
         
         system_msg = """You are a specialist Spotify Playlist Agent. Your job is to create and manage playlists.
         
         Available tools:
         - createPlaylist: Create a new playlist
-        - addTracksToPlaylist: Add tracks to a playlist
+        - addTracksToPlaylist: Add tracks to a playlist, pass all of them in one call
         - getMyPlaylists: Get user's playlists
-        - getPlaylistTracks: Get tracks from a playlist
+        - getPlaylistTracks: Get tracks from a playlist""" + search_many_help + library_help + """
         
         When creating playlists:
+        """ + playlist_songs_hint + """
         - If user doesn't specify size, limit to 10 songs
         - Create descriptive playlist names and descriptions
         - Add appropriate tracks based on the theme/genre requested
@@ -205,11 +210,24 @@ async def create_multi_agent_graph():
         - WRONG: limit: "10"
         """
         
-        recent_messages = state["messages"][-5:]
-        response = playlist_llm.invoke([{"role": "system", "content": system_msg}] + 
-                                     [{"role": "user", "content": msg.content} for msg in recent_messages if hasattr(msg, 'content')])
+        # Let the playlist agent use tracks found earlier in the thread without searching again
+        # (its calls are never cached, they lead to playlist writes)
+        previous_searches = format_search_results(state.get("search_results"))
+        if previous_searches:
+            system_msg += "\n\nTracks already found in this conversation:\n" + previous_searches
+
+        # The user's playlists come from the local mirror, so "add to my workout playlist" needs no lookup call
+        playlist_info = state.get("playlist_info") or {}
+        update = {}
+        if library is not None and library.ready and playlist_info.get("library", {}).get("synced_at") != library.synced_at:
+            playlist_info = update["playlist_info"] = {**playlist_info, "library": library.playlist_info()}
+        known_playlists = format_library(playlist_info)
+        if known_playlists:
+            system_msg += "\n\nThe user's playlists (use these IDs directly):\n" + known_playlists
+
+        response = await playlist_llm.ainvoke(build_context(system_msg, state["messages"]))
         
-        return {"messages": state["messages"] + [response]}
+        return {"messages": [response], **update}
 
     # AGENT ROUTER
     def route_to_agent(state: MultiAgentState):
@@ -219,8 +237,12 @@ async def create_multi_agent_graph():
         
         # Check if we need tools (last message is a tool call)
         last_message = state["messages"][-1] if state["messages"] else None
+        if budget.current(state)["stopped"]:
+            return "orchestrator"
         if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-            return "tools"
+            return "wrap_up" if budget.check(state, len(last_message.tool_calls)) else "tools"
+        if budget.check(state):
+            return "wrap_up"
         
         # Route based on current agent
         if current_agent == "search":
@@ -230,14 +252,64 @@ async def create_multi_agent_graph():
         else:
             return "orchestrator"
 
+    # TOOLS
+    tool_node = ToolNode(list({tool.name: tool for tool in search_tools + playlist_tools}.values()))
+
+    async def tools_node(state: MultiAgentState):
+        """Run the requested tools and keep search results for later agents in the thread"""
+        ai_message = state["messages"][-1]
+        # calls repeated within the turn get the earlier result instead of another round trip
+        to_run, reused, duplicates = budget.memo_calls(state, ai_message)
+        executed = []
+        if to_run:
+            result = await tool_node.ainvoke({"messages": [ai_message.model_copy(update={"tool_calls": to_run})]})
+            executed = result["messages"]
+        # the model sees compact projections, the full payloads stay in side state;
+        # reused results are projected already
+        by_id = {m.tool_call_id: m for m in project_tool_messages(executed)}
+        reused.update({call_id: by_id[original] for call_id, original in duplicates.items() if original in by_id})
+        by_id.update({call_id: message.model_copy(update={"tool_call_id": call_id, "id": None})
+                      for call_id, message in reused.items()})
+        return {
+            "messages": [by_id[call["id"]] for call in ai_message.tool_calls if call["id"] in by_id],
+            "search_results": record_search_results(state.get("search_results"), ai_message, executed),
+            "playlist_info": record_playlist_info(state.get("playlist_info"), ai_message, executed),
+            "budget": budget.record_tools(state, len(executed), len(reused)),
+        }
+
+    def route_after_tools(state: MultiAgentState):
+        """Return tool results to the agent that requested them"""
+        if budget.current(state)["stopped"]:
+            return END
+        if budget.check(state):
+            return "wrap_up"
+        current_agent = state.get("current_agent", "orchestrator")
+        if current_agent in ["search", "playlist"]:
+            return f"{current_agent}_agent"
+        return "orchestrator"
+
+    def route_after_agent(state: MultiAgentState):
+        """Run the agent's tool calls if the turn's budget allows them, else wrap up"""
+        last_message = state["messages"][-1]
+        if budget.current(state)["stopped"]:
+            return END
+        if getattr(last_message, "tool_calls", None):
+            return "wrap_up" if budget.check(state, len(last_message.tool_calls)) else "tools"
+        return END
+
+    async def wrap_up(state: MultiAgentState):
+        """Stop the turn with what it found so far, a budget ran out"""
+        return budget.stop(state, budget.check(state, len(getattr(state["messages"][-1], "tool_calls", None) or [])) or "hops")
+
     # BUILD THE GRAPH
     builder = StateGraph(MultiAgentState)
     
-    # Add agent nodes
-    builder.add_node("orchestrator", orchestrator_agent)
-    builder.add_node("search_agent", search_agent)  
-    builder.add_node("playlist_agent", playlist_agent)
-    builder.add_node("tools", ToolNode(search_tools + playlist_tools))
+    # Add agent nodes, each one records its wall time and token usage and counts against the turn's budget
+    builder.add_node("orchestrator", instrument_node("orchestrator", budget.node(orchestrator_agent)))
+    builder.add_node("search_agent", instrument_node("search_agent", budget.node(search_agent)))
+    builder.add_node("playlist_agent", instrument_node("playlist_agent", budget.node(playlist_agent)))
+    builder.add_node("tools", instrument_node("tools", budget.node(tools_node)))
+    builder.add_node("wrap_up", instrument_node("wrap_up", budget.node(wrap_up, deadline=False)))
     
     # Define edges
     builder.add_edge(START, "orchestrator")
@@ -250,16 +322,18 @@ async def create_multi_agent_graph():
             "search_agent": "search_agent",
             "playlist_agent": "playlist_agent", 
             "orchestrator": END,
-            "tools": "tools"
+            "tools": "tools",
+            "wrap_up": "wrap_up"
         }
     )
     
     # Conditional edges from search agent
     builder.add_conditional_edges(
         "search_agent",
-        tools_condition,
+        route_after_agent,
         {
             "tools": "tools",
+            "wrap_up": "wrap_up",
             "__end__": END
         }
     )
@@ -267,84 +341,234 @@ async def create_multi_agent_graph():
     # Conditional edges from playlist agent
     builder.add_conditional_edges(
         "playlist_agent", 
-        tools_condition,
+        route_after_agent,
         {
             "tools": "tools",
+            "wrap_up": "wrap_up",
             "__end__": END
         }
     )
     
-    # Tools always go back to orchestrator for routing
-    builder.add_edge("tools", "orchestrator")
+    # Tools go straight back to the agent that called them
+    builder.add_conditional_edges(
+        "tools",
+        route_after_tools,
+        {
+            "search_agent": "search_agent",
+            "playlist_agent": "playlist_agent",
+            "orchestrator": "orchestrator",
+            "wrap_up": "wrap_up",
+            "__end__": END
+        }
+    )
+
+    # A budget ran out, the partial answer ends the turn
+    builder.add_edge("wrap_up", END)
     
-    return builder.compile()
+    graph = builder.compile(checkpointer=checkpointer)
+
+    build_time = time.perf_counter() - build_start
+    tool_registry.record_build(warm, build_time)
+    print(f"Graph built in {build_time * 1000:.0f} ms ({'warm' if warm else 'cold'} MCP tools)")
+    return graph
     
 
 
 
-async def invoke_our_graph(agent, st_messages):
-    response = await agent.ainvoke({"messages": st_messages})
+# backend.py and app.py build the graph through this name
+create_graph = create_multi_agent_graph
+
+
+def thread_config(thread_id):
+    # LangGraph's own step limit stays above the hop budget, so turns end with a partial answer instead of an error
+    return {"configurable": {"thread_id": str(thread_id)}, "recursion_limit": max(25, MAX_HOPS + 5)}
+
+
+async def replay_cached_turn(agent, message, answer, thread_id):
+    """Record a cached answer in the thread as if the search agent had just given it"""
+    config = thread_config(thread_id)
+    await agent.aupdate_state(config, {"messages": [HumanMessage(content=message), AIMessage(content=answer)]},
+                              as_node="search_agent")
+    return (await agent.aget_state(config)).values
+
+
+async def run_turn(agent, message, thread_id):
+    """Run one turn and return (state, served from the response cache); earlier turns come from the checkpoint"""
+    cached = lookup_turn(response_cache, message)
+    if cached is not None:
+        return await replay_cached_turn(agent, message, cached, thread_id), True
+    start = time.perf_counter()
+    response = await agent.ainvoke({"messages": [HumanMessage(content=message)]}, config=thread_config(thread_id))
+    # a partial answer from a turn that ran out of budget is not worth repeating
+    if not (response.get("budget") or {}).get("stopped"):
+        store_turn(response_cache, message, response["messages"], time.perf_counter() - start)
+    return response, False
+
+
+async def invoke_our_graph(agent, message, thread_id):
+    """Run one turn and return the thread's full state"""
+    with trace_request(thread_id):
+        response, _ = await run_turn(agent, message, thread_id)
     return response
+
+
+async def chat_turn(agent, message, thread_id, include_tools=True, debug=False):
+    """Run one turn and return only what it added, with route, timings and token usage"""
+    with trace_request(thread_id) as trace:
+        response, cached = await run_turn(agent, message, thread_id)
+    return turn_response(response, trace, cached, include_tools, debug)
+
+
+def stopped_answer(event):
+    """The partial answer a node wrote when the turn's budget ran out, it comes from no LLM so it isn't streamed"""
+    output = event["data"].get("output")
+    if event["event"] != "on_chain_end" or event["name"] != event.get("metadata", {}).get("langgraph_node"):
+        return None
+    if not isinstance(output, dict) or not (output.get("budget") or {}).get("stopped"):
+        return None
+    return output["messages"][-1].content
+
+
+def cached_answer(event):
+    """Text of a node's model response that came from the response cache, no model call streamed it"""
+    output = event["data"].get("output")
+    if event["event"] != "on_chain_end" or event["name"] != event.get("metadata", {}).get("langgraph_node"):
+        return None
+    if not isinstance(output, dict) or not output.get("messages"):
+        return None
+    message = output["messages"][-1]
+    if not isinstance(message, AIMessage) or not message.response_metadata.get("cache_hit"):
+        return None
+    return message.content
+
+
+async def stream_our_graph(agent, message, thread_id):
+    """Run the graph and yield token and tool events as they happen"""
+    inputs = {"messages": [HumanMessage(content=message)]}
+    with trace_request(thread_id):
+        cached = lookup_turn(response_cache, message)
+        if cached is not None:
+            await replay_cached_turn(agent, message, cached, thread_id)
+            yield {"type": "token", "content": cached, "node": "cache", "run_id": "cache"}
+            yield {"type": "done"}
+            return
+        start = time.perf_counter()
+        tool_runs, hidden_runs = set(), set()
+        async for event in agent.astream_events(inputs, version='v2', config=thread_config(thread_id)):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                addition = event["data"]["chunk"].content
+                if addition:
+                    yield {
+                        "type": "token",
+                        "content": addition,
+                        "node": event.get("metadata", {}).get("langgraph_node"),
+                        # one model call, a node can make several
+                        "run_id": event["run_id"],
+                    }
+            elif kind in ("on_tool_start", "on_tool_end"):
+                # only the calls the agent made: not the wrappers' inner calls, nor speculative prefetches
+                if kind == "on_tool_start":
+                    nested = not tool_runs.isdisjoint(event.get("parent_ids", ()))
+                    if event.get("metadata", {}).get("langgraph_node") != "tools" or nested:
+                        hidden_runs.add(event["run_id"])
+                    tool_runs.add(event["run_id"])
+                if event["run_id"] in hidden_runs:
+                    continue
+                if kind == "on_tool_start":
+                    yield {"type": "tool_start", "name": event["name"]}
+                else:
+                    output = event["data"].get("output")
+                    yield {"type": "tool_end", "name": event["name"],
+                           "output": tool_preview(event["name"], getattr(output, "content", output), STREAM_TOOL_OUTPUT_CHARS)}
+            elif kind == "on_chain_end" and (answer := stopped_answer(event) or cached_answer(event)):
+                yield {"type": "token", "content": answer, "node": event["name"], "run_id": event["run_id"]}
+        if response_cache is not None:
+            state = await agent.aget_state(thread_config(thread_id))
+            if not (state.values.get("budget") or {}).get("stopped"):
+                store_turn(response_cache, message, state.values["messages"], time.perf_counter() - start)
+    yield {"type": "done"}
     
 
-async def main():
-    # Kill any existing processes on port 8090 before starting
-    print("Checking for existing processes on port 8090...")
-    kill_processes_on_port(8090)
+async def main(free_oauth_port: bool = False):
+    # opt-in, it stops whatever process holds the OAuth callback port, e.g. a server left over from an earlier run
+    if free_oauth_port:
+        print("Checking for existing processes on port 8090...")
+        await free_port(8090)
     
-    # Create the multi-agent graph
-    agent = await create_multi_agent_graph()
+    token = token_manager.load()
+    if token and token.get("refresh_token"):
+        token_manager.start()
+        if library is not None:
+            await library.start()
+
+    async with open_checkpointer() as checkpointer:
+        # Create the multi-agent graph
+        agent = await create_multi_agent_graph(checkpointer=checkpointer)
+        # restart the MCP server if it crashes while we wait for input
+        watchdog = MCPWatchdog(tool_registry)
+        watchdog.start()
     
-    config = {"configurable": {"thread_id": 1234}}
+        config = thread_config(1234)
     
-    print("\n🎵 Multi-Agent Spotify System Ready!")
-    print("Available capabilities:")
-    print("- Search Agent: Find tracks, albums, artists")
-    print("- Playlist Agent: Create and manage playlists")
-    print("- Orchestrator: Routes tasks to appropriate agents")
-    print("\nType your request (or 'quit' to exit):\n")
+        print("\n🎵 Multi-Agent Spotify System Ready!")
+        print("Available capabilities:")
+        print("- Search Agent: Find tracks, albums, artists")
+        print("- Playlist Agent: Create and manage playlists")
+        print("- Orchestrator: Routes tasks to appropriate agents")
+        print("\nType your request (or 'quit' to exit):\n")
     
-    while True:
-        try:
-            message = input("User: ")
-            if message.lower() in ['quit', 'exit', 'q']:
-                print("Goodbye!")
-                break
+        while True:
+            try:
+                # read input on a worker thread so MCP sessions keep being serviced while we wait
+                message = await asyncio.to_thread(input, "User: ")
+                if message.lower() in ['quit', 'exit', 'q']:
+                    print("Goodbye!")
+                    break
                 
-            # Initialize state for multi-agent system
-            initial_state = {
-                "messages": [HumanMessage(content=message)],
-                "current_agent": "orchestrator",
-                "task_type": "general",
-                "search_results": {},
-                "playlist_info": {}
-            }
+                # Only the new message is sent, the rest of the thread comes from the checkpoint
+                initial_state = {"messages": [HumanMessage(content=message)]}
             
-            print("\n🤖 Processing request...\n")
+                print("\n🤖 Processing request...\n")
             
-            async for event in agent.astream_events(initial_state, version='v2', config=config):
-                kind = event["event"]
-                if kind == "on_chat_model_stream":
-                    addition = event["data"]["chunk"].content
-                    print(addition, end='', flush=True)
-                elif kind == "on_tool_start":
-                    tool_name = event['name']
-                    print(f"\n🔧 [Using tool: {tool_name}]")
-                elif kind == "on_tool_end":
-                    tool_name = event['name'] 
-                    print(f"✅ [Tool {tool_name} completed]")
-                    
-            print("\n" + "="*50 + "\n")
+                with trace_request(config["configurable"]["thread_id"]) as trace:
+                    async for event in agent.astream_events(initial_state, version='v2', config=config):
+                        kind = event["event"]
+                        if kind == "on_chat_model_stream":
+                            addition = event["data"]["chunk"].content
+                            print(addition, end='', flush=True)
+                        elif kind == "on_tool_start":
+                            tool_name = event['name']
+                            print(f"\n🔧 [Using tool: {tool_name}]")
+                        elif kind == "on_tool_end":
+                            tool_name = event['name'] 
+                            print(f"✅ [Tool {tool_name} completed]")
+                        elif kind == "on_chain_end" and (answer := stopped_answer(event) or cached_answer(event)):
+                            print(answer, end='', flush=True)
+
+                print(f"\n⏱  {trace.summary()}")
+                print("\n" + "="*50 + "\n")
                     
-        except KeyboardInterrupt:
-            print("\n\nGoodbye!")
-            break
-        except Exception as e:
-            print(f"\n❌ Error occurred: {e}")
-            print("Please try again.\n")
+            except KeyboardInterrupt:
+                print("\n\nGoodbye!")
+                break
+            except Exception as e:
+                print(f"\n❌ Error occurred: {e}")
+                print("Please try again.\n")
 
+        await watchdog.stop()
+    if speculator is not None:
+        await speculator.close()
+    if library is not None:
+        await library.stop()
+    await token_manager.stop()
             
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Chat with the Spotify agent in the terminal")
+    parser.add_argument("--free-port", action="store_true",
+                        help="stop whatever process holds the OAuth callback port 8090 before starting")
     # Run the main function in an event loop
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(parser.parse_args().free_port))
\ No newline at end of file
@@ -2,62 +2,122 @@ import os
 from dotenv import load_dotenv
 
 import streamlit as st
-from langchain_core.messages import AIMessage, HumanMessage
-
-from agent_script import invoke_our_graph, create_graph
 
 #from st_callable_util import get_streamlit_cb  # Utility function to get a Streamlit callback handler with context
-import asyncio
-import nest_asyncio
 
-import time
+import json
+import uuid
 import requests
 
 load_dotenv()  # Load environment variables from a .env file if present
 
+# The agent runs in backend.py, which builds the graph and MCP sessions once at startup
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+# Only the latest messages are rendered on a rerun, older ones are loaded a page at a time
+CHAT_WINDOW = int(os.getenv("CHAT_WINDOW", "20"))
+
+
+@st.cache_resource
+def backend_session():
+    """One keep-alive HTTP session per Streamlit process, shared by every browser session and rerun"""
+    return requests.Session()
+
+
+def to_markdown(content: str) -> str:
+    # "$" would start a LaTeX block ("$uicideboy$"), and single newlines in tool listings should stay line breaks
+    return content.replace("$", "\\$").replace("\n", "  \n")
+
+
+def add_message(role, content, tools=None):
+    """Store a message with its markdown, messages never change so it is only computed once"""
+    st.session_state.messages.append({"role": role, "content": content, "markdown": to_markdown(content), "tools": tools or []})
+
+
+def render_tools(tools):
+    # tool output is long and rarely read, keep it collapsed under the answer
+    with st.expander(f"🔧 {len(tools)} tool call{'s' if len(tools) > 1 else ''}", expanded=False):
+        for tool in tools:
+            st.caption(tool["name"])
+            st.code(tool["output"], language=None)
+
+
+def render_message(msg):
+    with st.chat_message(msg["role"]):
+        st.markdown(msg["markdown"])
+        if msg.get("tools"):
+            render_tools(msg["tools"])
+
+
+def load_earlier():
+    st.session_state["visible"] += CHAT_WINDOW
+
+
 st.title("🎵Spotify Agent🎵")
 
 
-agent = asyncio.run(create_graph())  # Create the LangGraph agent
- 
 if "messages" not in st.session_state:
     # default initial message to render in message state
-    st.session_state["messages"] = [AIMessage(content="How can I help you?")]
-    
-    
-if "agent" not in st.session_state:
-    st.session_state["agent"] = asyncio.run(create_graph())
+    st.session_state["messages"] = []
+    add_message("assistant", "How can I help you?")
     
-agent = st.session_state["agent"]
     
-    
-# Loop through all messages in the session state and render them as a chat on every st.refresh mech
-for msg in st.session_state.messages:
-    # https://docs.streamlit.io/develop/api-reference/chat/st.chat_message
-    # we store them as AIMessage and HumanMessage as its easier to send to LangGraph
-    if type(msg) == AIMessage:
-        st.chat_message("assistant").write(msg.content)
-    if type(msg) == HumanMessage:
-        st.chat_message("user").write(msg.content)
+if "thread_id" not in st.session_state:
+    # the backend keeps the conversation under this id, so we only send new messages
+    st.session_state["thread_id"] = str(uuid.uuid4())
+
+if "visible" not in st.session_state:
+    st.session_state["visible"] = CHAT_WINDOW
+
+
+# Render the recent window of the conversation, so a rerun costs the same however long the session is
+messages = st.session_state.messages
+hidden = max(0, len(messages) - st.session_state.visible)
+if hidden:
+    st.button(f"⬆ Load earlier messages ({hidden} more)", on_click=load_earlier)
+for msg in messages[hidden:]:
+    render_message(msg)
         
         
 # takes new input in chat box from user and invokes the graph
 if prompt := st.chat_input():
-    st.session_state.messages.append(HumanMessage(content=prompt))
-    st.chat_message("user").write(prompt)
+    add_message("user", prompt)
+    st.chat_message("user").markdown(st.session_state.messages[-1]["markdown"])
 
-    # Process the AI's response and handles graph events using the callback mechanism
+    # Process the AI's response and render tokens as the backend streams them
     with st.chat_message("assistant"):
-        serialized_messages = [msg.dict() if hasattr(msg, 'dict') else msg for msg in st.session_state.messages]
-        output = requests.post("http://localhost:8000/chat", json={"input": serialized_messages})
-        output = output.json()
-        text = output["response"]["messages"][-1]['content']
-        print(text)
+        status = st.empty()
         placeholder = st.empty()
-        streamed_text = ""
-        for token in text.split():
-            streamed_text += token + " "
-            placeholder.write(streamed_text)
-            time.sleep(0.07)  # Adjust speed as needed
-
-        st.session_state.messages.append(AIMessage(content=text))
+        text = ""
+        run_id = None
+        tools = []
+        with backend_session().post(f"{BACKEND_URL}/chat/stream", json={"message": prompt, "thread_id": st.session_state["thread_id"]}, stream=True) as output:
+            if output.status_code in (429, 503):
+                st.warning(f"The agent is busy right now, please try again in {output.headers.get('Retry-After', 'a few')} seconds.")
+            for line in output.iter_lines(decode_unicode=True) if output.ok else []:
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "token":
+                    # each model call streams its own message, only the latest one is the answer
+                    if event["run_id"] != run_id:
+                        run_id = event["run_id"]
+                        text = ""
+                    text += event["content"]
+                    placeholder.write(text)
+                elif event["type"] == "tool_start":
+                    status.caption(f"🔧 Using tool: {event['name']}")
+                elif event["type"] == "tool_end":
+                    status.caption(f"✅ Tool {event['name']} completed")
+                    tools.append({"name": event["name"], "output": event.get("output", "")})
+                elif event["type"] == "error" and event.get("code") == "context_limit_exceeded":
+                    st.error("You've reached the input token limit for this conversation. "
+                             "Try a shorter message or start a new chat.")
+                    st.caption(event["error"])
+                elif event["type"] == "error":
+                    st.error(event["error"])
+        status.empty()
+        add_message("assistant", text, tools)
+        # the streamed text is replaced by the stored markdown, with the tool output folded away under it
+        placeholder.markdown(st.session_state.messages[-1]["markdown"])
+        if tools:
+            render_tools(tools)
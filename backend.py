@@ -1,30 +1,194 @@
+from dotenv import load_dotenv
+
+# .env has to be loaded before agent_script and the modules it imports read their settings
+load_dotenv()
+
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from agent_script import create_graph, invoke_our_graph
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
+from agent_script import create_graph, chat_turn, stream_our_graph, open_checkpointer
+import chat_response
+from mcp_registry import tool_registry
+from context_budget import ContextLimitExceeded
+from metrics import registry
+from admission import admission, AdmissionRejected, REQUEST_TIMEOUT, request_timeouts
+from token_manager import token_manager
+from supervisor import MCPWatchdog
+from library_mirror import library
+from speculation import speculator
 import asyncio
+import json
 from contextlib import asynccontextmanager
-from typing import List, Dict, Any
-from dotenv import load_dotenv
+from typing import Optional
 
 
-load_dotenv()
+class ORJSONResponse(Response):
+    """JSON response encoded with orjson, which skips FastAPI's jsonable_encoder pass over the content"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return chat_response.dumps(content)
+
 
-#create the agent once at startup
+#create the agent once at startup, conversation state lives in the checkpointer
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.agent = await create_graph()
-    yield
+    # keep the Spotify token fresh so MCP calls never fail mid-turn on an expired token
+    token = token_manager.load()
+    if token and token.get("refresh_token"):
+        token_manager.start()
+        # playlist lookups are answered from a local mirror kept in sync with the account
+        if library is not None:
+            await library.start()
+    async with open_checkpointer() as checkpointer:
+        app.state.agent = await create_graph(checkpointer=checkpointer)
+        # ping the pooled MCP sessions and restart the server if it has crashed
+        app.state.watchdog = MCPWatchdog(tool_registry)
+        app.state.watchdog.start()
+        yield
+        await app.state.watchdog.stop()
+    if library is not None:
+        await library.stop()
+    await token_manager.stop()
+    # prefetched searches still running would otherwise outlive their MCP sessions
+    if speculator is not None:
+        await speculator.close()
+    await tool_registry.close_all()
     
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+# compress large bodies, but not the token stream, gzip would hold tokens back until a block fills
+app.add_middleware(GZipMiddleware, minimum_size=1000,
+                   exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/x-ndjson",))
 
 class Query(BaseModel):
-     input: List[Dict[str, Any]]
+    # only the new user message is sent, earlier turns are resumed from the thread's checkpoint
+    message: str
+    thread_id: str
+    # per-user limits fall back to the thread when the client doesn't identify the user,
+    # either way one thread runs one turn at a time
+    user_id: Optional[str] = None
+    # /chat only: compact summaries of the turn's tool results, and the whole thread state for debugging
+    include_tools: bool = True
+    debug: bool = False
+
+    @property
+    def user_key(self):
+        return self.user_id or self.thread_id
+
+
+def rejected_response(e: AdmissionRejected):
+    return JSONResponse(status_code=e.status_code, content={"error": e.to_dict()},
+                        headers={"Retry-After": str(e.retry_after)})
+
+
+def agent_unavailable():
+    return JSONResponse(status_code=503, content={"error": {"code": "agent_unavailable", "message": "Agent not initialized"}})
+
+
+def timeout_error():
+    request_timeouts.inc()
+    return {"code": "request_timeout", "message": f"Request took longer than {REQUEST_TIMEOUT:.0f}s and was cancelled"}
+
     
 @app.post("/chat")
 async def chat(query: Query):
-    agent = app.state.agent
-    response = await invoke_our_graph(agent, query.input)
+    agent = getattr(app.state, "agent", None)
     if agent is None:
-        return {"error": "Agent not initialized"}
-    print(response)
-    return {"response": response}
+        return agent_unavailable()
+    try:
+        async with admission.admit(query.user_key, query.thread_id):
+            # the graph task is cancelled at the deadline, nothing keeps running after the 504
+            async with asyncio.timeout(REQUEST_TIMEOUT):
+                response = await chat_turn(agent, query.message, query.thread_id, query.include_tools, query.debug)
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except TimeoutError:
+        return JSONResponse(status_code=504, content={"error": timeout_error()})
+    except ContextLimitExceeded as e:
+        return JSONResponse(status_code=413, content={"error": e.to_dict()})
+    return response
+
+
+async def events_until(events, deadline):
+    """Yield from an event stream until the deadline, then cancel it"""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise TimeoutError
+            try:
+                event = await asyncio.wait_for(anext(events), remaining)
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        await events.aclose()
+
+
+@app.post("/chat/stream")
+async def chat_stream(query: Query):
+    """Stream tokens and tool events as newline-delimited JSON"""
+    agent = getattr(app.state, "agent", None)
+    if agent is None:
+        return agent_unavailable()
+    # turn saturated requests away before the response starts, so they still get a 429/503
+    try:
+        admission.check(query.user_key)
+    except AdmissionRejected as e:
+        return rejected_response(e)
+
+    async def event_lines():
+        try:
+            # the slot is only taken once the body is streamed, so a dropped client never holds one
+            async with admission.admit(query.user_key, query.thread_id):
+                deadline = asyncio.get_running_loop().time() + REQUEST_TIMEOUT
+                events = stream_our_graph(agent, query.message, query.thread_id)
+                async for event in events_until(events, deadline):
+                    yield json.dumps(event) + "\n"
+        except AdmissionRejected as e:
+            yield json.dumps({"type": "error", "error": str(e), **e.to_dict()}) + "\n"
+        except TimeoutError:
+            yield json.dumps({"type": "error", "error": timeout_error()["message"], "code": "request_timeout"}) + "\n"
+        except ContextLimitExceeded as e:
+            yield json.dumps({"type": "error", "error": str(e), **e.to_dict()}) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+async def metrics():
+    """Latency, token, tool payload and queue metrics in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admission")
+async def admission_stats():
+    """Queue depth and in-flight counts, for sizing MAX_INFLIGHT_REQUESTS"""
+    return admission.stats()
+
+
+@app.get("/health/token")
+async def token_health():
+    """Spotify token status: ok, expiring, expired or missing"""
+    health = token_manager.health()
+    return JSONResponse(status_code=200 if health["status"] in ("ok", "expiring") else 503, content=health)
+
+
+@app.get("/library")
+async def library_stats():
+    """Playlist mirror freshness and size"""
+    return library.stats() if library is not None else {"enabled": False}
+
+
+@app.get("/health/mcp")
+async def mcp_health():
+    """Result of the last MCP ping round, 503 if any session could not be restarted"""
+    health = app.state.watchdog.health()
+    down = any(status == "down" for status in health["sessions"].values())
+    return JSONResponse(status_code=503 if down else 200, content=health)
@@ -0,0 +1,213 @@
+"""Run a JSONL file of requests through the agent, several at a time.
+
+Each input line is {"message": ..., "id": ..., "thread_id": ...}; only message
+is required. Lines that share a thread_id are one conversation and run in file
+order, everything else runs concurrently on one graph and one set of MCP
+sessions. Results are appended to the output file as each request finishes,
+so an interrupted run picks up where it stopped when started again. On
+resume the output is rewritten with one record per id first, so retried
+requests (--retry-errors) replace their failed record instead of adding one.
+A request that fails or is interrupted mid-turn rolls its thread back to the
+checkpoint before it, so running it again doesn't repeat the message.
+
+    python batch_runner.py prompts.jsonl --output results.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import traceback
+
+from dotenv import load_dotenv
+
+# .env has to be loaded before chat_response and the agent modules read their settings
+load_dotenv()
+
+from chat_response import dumps
+
+# Requests (conversations, for multi-turn threads) run at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def read_requests(path):
+    """Input requests with an id and thread_id each, by default the line number and a thread per request"""
+    requests = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            if isinstance(request, str):
+                request = {"message": request}
+            request_id = str(request.get("id", line_number))
+            requests.append({**request, "id": request_id, "thread_id": str(request.get("thread_id") or f"batch-{request_id}")})
+    return requests
+
+
+def compact_output(path, retry_errors=False):
+    """Rewrite the output with the last record per id and return the ids already done.
+
+    Lines cut off when the last run was killed are dropped, and with retry_errors
+    so are failed records, their requests run again and append a new one.
+    """
+    if not os.path.exists(path):
+        return set()
+    records = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut off when the last run was killed
+            records.pop(str(record["id"]), None)
+            records[str(record["id"])] = line.rstrip("\n")
+    kept = {request_id: line for request_id, line in records.items()
+            if not retry_errors or json.loads(line).get("status") == "ok"}
+    # written next to the output and renamed over it, an interrupted rewrite leaves the old file
+    with open(path + ".tmp", "w") as f:
+        f.writelines(line + "\n" for line in kept.values())
+    os.replace(path + ".tmp", path)
+    return set(kept)
+
+
+class BatchRunner:
+    """Runs requests on a shared graph and appends one result line per request"""
+
+    def __init__(self, agent, output, concurrency=BATCH_CONCURRENCY):
+        self.agent = agent
+        self.output = output
+        self.concurrency = concurrency
+        self.latencies = []
+        self.errors = 0
+        self._slots = asyncio.Semaphore(concurrency)
+
+    def write(self, record):
+        self.output.write(dumps(record).decode() + "\n")
+        self.output.flush()
+
+    async def rollback(self, thread_id, before):
+        """Put the thread back to the checkpoint it had before a failed turn"""
+        if before.config["configurable"].get("checkpoint_id") is None:
+            # the turn was the thread's first, nothing to go back to
+            await self.agent.checkpointer.adelete_thread(thread_id)
+        else:
+            await self.agent.aupdate_state(before.config, None, as_node="__copy__")
+
+    async def run_request(self, request):
+        from agent_script import chat_turn, thread_config
+
+        started = time.time()
+        start = time.perf_counter()
+        record = {"id": request["id"], "thread_id": request["thread_id"], "message": request["message"], "started": started}
+        # a failed turn may have checkpointed part of itself, the retry has to start from here
+        before = await self.agent.aget_state(thread_config(request["thread_id"]))
+        try:
+            response = await chat_turn(self.agent, request["message"], request["thread_id"], include_tools=False)
+            record.update(status="ok", answer=response["answer"], meta=response["meta"])
+        except asyncio.CancelledError:
+            await self.rollback(request["thread_id"], before)
+            raise
+        except Exception as e:
+            self.errors += 1
+            record.update(status="error", error=e.to_dict() if hasattr(e, "to_dict") else f"{type(e).__name__}: {e}")
+            traceback.print_exc()
+            await self.rollback(request["thread_id"], before)
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        self.latencies.append(record["seconds"])
+        self.write(record)
+        print(f"[{len(self.latencies)}] {request['id']} {record['status']} in {record['seconds']:.2f}s")
+
+    async def run_thread(self, requests):
+        # one conversation's turns build on each other, so they run in order under one slot
+        async with self._slots:
+            for request in requests:
+                await self.run_request(request)
+
+    async def run(self, requests):
+        threads = {}
+        for request in requests:
+            threads.setdefault(request["thread_id"], []).append(request)
+        await asyncio.gather(*(self.run_thread(turns) for turns in threads.values()))
+
+    def summary(self, seconds, skipped):
+        count = len(self.latencies)
+        return (f"{count} requests in {seconds:.1f}s ({count / seconds if seconds else 0:.2f} req/s), "
+                f"{self.errors} errors, {skipped} skipped as already done\n"
+                f"latency p50 {percentile(self.latencies, 50):.2f}s  p95 {percentile(self.latencies, 95):.2f}s  "
+                f"p99 {percentile(self.latencies, 99):.2f}s  max {max(self.latencies, default=0):.2f}s")
+
+
+async def main(args):
+    from agent_script import create_multi_agent_graph, open_checkpointer
+    from library_mirror import library
+    from mcp_registry import tool_registry
+    from speculation import speculator
+    from supervisor import MCPWatchdog, free_port
+    from token_manager import token_manager
+
+    requests = read_requests(args.input)
+    done = compact_output(args.output, args.retry_errors)
+    todo = [request for request in requests if request["id"] not in done]
+    print(f"{len(todo)} of {len(requests)} requests to run, {args.concurrency} at a time")
+    if not todo:
+        return
+
+    # opt-in, it stops whatever process holds the OAuth callback port
+    if args.free_port:
+        await free_port(8090)
+    # keep the token fresh like the interactive loop
+    token = token_manager.load()
+    if token and token.get("refresh_token"):
+        token_manager.start()
+        if library is not None:
+            await library.start()
+
+    # conversations are checkpointed next to the output, a resumed thread continues from its last turn
+    checkpoint_db = args.checkpoint_db or args.output + ".checkpoints.sqlite"
+    try:
+        async with open_checkpointer(checkpoint_db) as checkpointer:
+            agent = await create_multi_agent_graph(checkpointer=checkpointer, config_path=args.config)
+            watchdog = MCPWatchdog(tool_registry)
+            watchdog.start()
+            with open(args.output, "a") as output:
+                runner = BatchRunner(agent, output, args.concurrency)
+                start = time.perf_counter()
+                try:
+                    await runner.run(todo)
+                finally:
+                    print("\n" + runner.summary(time.perf_counter() - start, len(requests) - len(todo)))
+            await watchdog.stop()
+    finally:
+        if speculator is not None:
+            await speculator.close()
+        await tool_registry.close_all()
+        if library is not None:
+            await library.stop()
+        await token_manager.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a JSONL file of requests through the agent")
+    parser.add_argument("input", help="JSONL with one request per line")
+    parser.add_argument("--output", help="JSONL results, appended to and used to resume (default <input>.results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--config", default="mcp_config.json", help="MCP server config")
+    parser.add_argument("--checkpoint-db", help="SQLite file for conversation state (default <output>.checkpoints.sqlite)")
+    parser.add_argument("--retry-errors", action="store_true", help="run requests that failed last time again")
+    parser.add_argument("--free-port", action="store_true",
+                        help="stop whatever process holds the OAuth callback port 8090 before starting")
+    args = parser.parse_args()
+    args.output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        print("\nInterrupted, run the same command again to resume")
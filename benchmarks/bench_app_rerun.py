@@ -0,0 +1,66 @@
+"""Streamlit rerun time as the chat session grows.
+
+Seeds app.py's session with N messages (every other one an assistant answer
+with a search result listing and its tool output) and times reruns through
+streamlit's AppTest, with the history window at its default and after one
+"load earlier" click. No backend is needed, reruns without input don't call it.
+
+Run from the repo root:  python -m benchmarks.bench_app_rerun
+"""
+import argparse
+import os
+import statistics
+import time
+
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+ANSWER = "Here is what I found:\n" + "\n".join(
+    f'{i}. "Song {i}" by Artist {i} (3:{i:02d}) - ID: {"x" * 22}' for i in range(1, 11))
+
+
+def seeded_messages(count):
+    messages = []
+    for i in range(count):
+        if i % 2:
+            messages.append({"role": "assistant", "content": ANSWER, "markdown": ANSWER.replace("\n", "  \n"),
+                             "tools": [{"name": "searchSpotify", "output": ANSWER}]})
+        else:
+            messages.append({"role": "user", "content": f"find song {i}", "markdown": f"find song {i}", "tools": []})
+    return messages
+
+
+def time_reruns(test, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        test.run()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500, 2000])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} {'rerun':>10} {'elements':>9} {'after load earlier':>19}")
+    for size in args.sizes:
+        test = AppTest.from_file(APP, default_timeout=60)
+        test.session_state["thread_id"] = "bench"
+        test.session_state["messages"] = seeded_messages(size)
+        test.run()
+        rerun_ms = time_reruns(test, args.runs)
+        elements = len(test.chat_message)
+        load_earlier = [button for button in test.button if button.label.startswith("⬆")]
+        earlier = ""
+        if load_earlier:
+            load_earlier[0].click().run()
+            earlier = f"{time_reruns(test, args.runs):>15.1f} ms"
+        print(f"{size:>8} {rerun_ms:>7.1f} ms {elements:>9} {earlier:>19}")
+
+
+if __name__ == "__main__":
+    main()
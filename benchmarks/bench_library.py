@@ -0,0 +1,145 @@
+"""Playlist lookups from the local library mirror vs live MCP round trips.
+
+A synthetic Spotify account (--playlists playlists of --tracks tracks, each
+Web API page sleeping --api-latency-ms) is synced into a temporary mirror:
+once in full, then again after one playlist changed, which only re-fetches
+that playlist. The same "what's in my <name> playlist" lookup is then timed
+against the mirror and through getMyPlaylists + paged getPlaylistTracks on
+the fake MCP server.
+
+Run from the repo root:  python -m benchmarks.bench_library
+"""
+import argparse
+import asyncio
+import math
+import os
+import tempfile
+import time
+
+from benchmarks.run_benchmarks import write_mcp_config
+from library_mirror import LibraryMirror, mirrored_playlist_tools
+
+ARTISTS = ["The Weeknd", "Dua Lipa", "OutKast", "The Killers", "Fleetwood Mac", "Billie Eilish", "Toto", "Coldplay"]
+
+
+class SyntheticSource:
+    """Stands in for SpotifySource, sleeping per Web API page like the real client would"""
+
+    def __init__(self, playlists: int, tracks: int, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.data = {}
+        for p in range(playlists):
+            playlist_id = f"playlist{p:04d}"
+            self.data[playlist_id] = {
+                "name": f"Mix {p}",
+                "snapshot_id": "v1",
+                "tracks": [{"id": f"{playlist_id}t{t:04d}", "uri": f"spotify:track:{playlist_id}t{t:04d}",
+                            "name": f"Song {t}", "artists": [ARTISTS[(p + t) % len(ARTISTS)]], "album": None,
+                            "duration_ms": 200000} for t in range(tracks)],
+            }
+
+    def _pages(self, items, size):
+        pages = max(1, math.ceil(items / size))
+        self.calls += pages
+        time.sleep(self.latency * pages)
+
+    def playlists(self):
+        self._pages(len(self.data), 50)
+        return [{"id": playlist_id, "name": p["name"], "snapshot_id": p["snapshot_id"], "owner": "me",
+                 "tracks_total": len(p["tracks"])} for playlist_id, p in self.data.items()]
+
+    def playlist_tracks(self, playlist_id):
+        tracks = self.data[playlist_id]["tracks"]
+        self._pages(len(tracks), 100)
+        return list(tracks)
+
+
+async def live_lookup(tools, name):
+    playlists = await tools["getMyPlaylists"].ainvoke({"limit": 50})
+    playlist_id = next(line.rsplit("ID: ", 1)[1] for line in playlists.splitlines() if f'"{name}"' in line)
+    pages = []
+    for offset in range(0, 10000, 50):
+        page = await tools["getPlaylistTracks"].ainvoke({"playlistId": playlist_id, "limit": 50, "offset": offset})
+        pages.append(page)
+        if page.count(" - ID: ") < 50:
+            return pages
+
+
+async def run(args):
+    source = SyntheticSource(args.playlists, args.tracks, args.api_latency_ms / 1000)
+    with tempfile.TemporaryDirectory() as tmp:
+        library = LibraryMirror(source, path=os.path.join(tmp, "library.sqlite"))
+        start = time.perf_counter()
+        await library.sync()
+        full_ms, full_calls = (time.perf_counter() - start) * 1000, source.calls
+
+        source.calls = 0
+        changed = next(iter(source.data.values()))
+        changed["snapshot_id"] = "v2"
+        changed["tracks"].append(dict(changed["tracks"][0], id="new", uri="spotify:track:new"))
+        start = time.perf_counter()
+        await library.sync()
+        incremental_ms, incremental_calls = (time.perf_counter() - start) * 1000, source.calls
+
+        start = time.perf_counter()
+        reloaded = LibraryMirror(source, path=library.path)
+        reloaded.load()
+        load_ms = (time.perf_counter() - start) * 1000
+
+        name = f"Mix {args.playlists // 2}"
+        lookups = {
+            "find playlist by name": lambda: library.find_playlists(name),
+            "playlists with track": lambda: library.playlists_with_track("spotify:track:playlist0000t0001"),
+            "tracks by artist": lambda: library.tracks_by_artist("Coldplay"),
+            "getPlaylistTracks page": lambda: library.format_tracks(library.find_playlists(name)[0]["id"]),
+        }
+        print(f"{args.playlists} playlists x {args.tracks} tracks, {args.api_latency_ms:.0f} ms per Web API page\n")
+        print(f"{'full sync':<26} {full_ms:>10.0f} ms  {full_calls:>4} API pages")
+        print(f"{'incremental sync (1 of ' + str(args.playlists) + ')':<26} {incremental_ms:>10.0f} ms  {incremental_calls:>4} API pages")
+        print(f"{'load from SQLite':<26} {load_ms:>10.1f} ms\n")
+        for label, lookup in lookups.items():
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                lookup()
+            print(f"{'mirror: ' + label:<34} {(time.perf_counter() - start) / args.iterations * 1e6:>8.1f} us")
+
+    # the same lookup through the fake MCP server, filled with an equal sized playlist
+    from mcp_registry import tool_registry
+
+    config_path = write_mcp_config(args.tool_latency_ms)
+    try:
+        tools = {tool.name: tool for tool in await tool_registry.get_tools(config_path)}
+        created = await tools["createPlaylist"].ainvoke({"name": name})
+        playlist_id = created.rsplit("Playlist ID: ", 1)[1].strip()
+        track_ids = [f"{t:022d}" for t in range(args.tracks)]
+        for chunk in range(0, len(track_ids), 100):
+            await tools["addTracksToPlaylist"].ainvoke({"playlistId": playlist_id, "trackIds": track_ids[chunk:chunk + 100]})
+        start = time.perf_counter()
+        pages = await live_lookup(tools, name)
+        live_ms = (time.perf_counter() - start) * 1000
+        print(f"{'mcp: getMyPlaylists + tracks':<34} {live_ms * 1000:>8.0f} us  ({1 + len(pages)} MCP calls)")
+
+        # and through the wrapped tool the playlist agent gets, answered by the mirror
+        mirrored = {tool.name: tool for tool in mirrored_playlist_tools(list(tools.values()), library)}
+        mirrored_id = library.find_playlists(name)[0]["id"]
+        start = time.perf_counter()
+        await mirrored["getPlaylistTracks"].ainvoke({"playlistId": mirrored_id, "limit": 50})
+        print(f"{'mirror: getPlaylistTracks tool':<34} {(time.perf_counter() - start) * 1e6:>8.0f} us")
+    finally:
+        await tool_registry.close_all()
+        os.remove(config_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--playlists", type=int, default=40)
+    parser.add_argument("--tracks", type=int, default=120)
+    parser.add_argument("--api-latency-ms", type=float, default=150.0)
+    parser.add_argument("--tool-latency-ms", type=float, default=150.0)
+    parser.add_argument("--iterations", type=int, default=1000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""/chat response size and encode time per turn, full state vs the slim turn response.
+
+Plays the long_conversation scenario (scripted LLM, fake MCP server) in one
+thread and encodes each turn's result both ways:
+
+  before  {"response": <full graph state>} through jsonable_encoder + JSONResponse,
+          which is what /chat used to return
+  after   chat_response.turn_response(...) through backend.ORJSONResponse, plus its
+          gzip size for bodies the GZipMiddleware would compress
+
+Run from the repo root:  python -m benchmarks.bench_payload
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import time
+import uuid
+
+from benchmarks.run_benchmarks import SCENARIOS, write_mcp_config
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = fn()
+    return result, (time.perf_counter() - start) / iterations * 1000
+
+
+async def run(args):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from agent_script import create_multi_agent_graph, run_turn
+    from benchmarks.scripted_llm import ScriptedChatModel
+    from backend import ORJSONResponse
+    from chat_response import turn_response
+    from mcp_registry import tool_registry
+    from metrics import trace_request
+
+    config_path = write_mcp_config(0)
+    try:
+        graph = await create_multi_agent_graph(checkpointer=InMemorySaver(), config_path=config_path,
+                                               llm=ScriptedChatModel(latency_ms=0))
+        thread_id = str(uuid.uuid4())
+        messages = SCENARIOS["long_conversation"] * args.rounds
+        print(f"{'turn':>4} {'messages':>9} {'before':>10} {'encode':>9} {'after':>9} {'gzip':>8} {'encode':>9}")
+        totals = {"before": 0, "after": 0, "before_ms": 0.0, "after_ms": 0.0}
+        for turn, message in enumerate(messages, 1):
+            with trace_request(thread_id) as trace:
+                state, cached = await run_turn(graph, message, thread_id)
+            before, before_ms = timed(lambda: JSONResponse(jsonable_encoder({"response": state})).body, args.iterations)
+            after, after_ms = timed(lambda: ORJSONResponse(turn_response(state, trace, cached)).body, args.iterations)
+            compressed = len(gzip.compress(after)) if len(after) >= 1000 else len(after)
+            totals["before"] += len(before)
+            totals["after"] += len(after)
+            totals["before_ms"] += before_ms
+            totals["after_ms"] += after_ms
+            print(f"{turn:>4} {len(state['messages']):>9} {len(before):>9}B {before_ms:>7.2f}ms "
+                  f"{len(after):>8}B {compressed:>7}B {after_ms:>7.2f}ms")
+        turns = len(messages)
+        print(f"\nmean per turn: {totals['before'] / turns:.0f}B in {totals['before_ms'] / turns:.2f}ms before, "
+              f"{totals['after'] / turns:.0f}B in {totals['after_ms'] / turns:.2f}ms after")
+    finally:
+        await tool_registry.close_all()
+        os.remove(config_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=3, help="times to play the long_conversation scenario in one thread")
+    parser.add_argument("--iterations", type=int, default=20, help="encodes per turn to average over")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
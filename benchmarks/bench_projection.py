@@ -0,0 +1,105 @@
+"""Tokens per turn that tool results add to the LLM context, raw vs projected.
+
+Replays recorded tool results through tool_projection.project_result and counts
+tokens with the same counter the context budget uses:
+
+  fixtures/tool_results_text.jsonl  responses in the Spotify MCP server's text
+                                    format, recorded with --record
+  fixtures/tool_results.jsonl       Spotify Web API shaped JSON, for servers that
+                                    pass the API payload through
+
+--record replays the calls in tool_results.jsonl against an MCP server and
+writes its responses to the text fixture. Without a config it records from
+benchmarks/fake_spotify_mcp.py, which returns the real server's text format;
+pass mcp_config.json to record from the real server and account.
+
+Run from the repo root:  python -m benchmarks.bench_projection [--record [CONFIG]]
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from context_budget import count_tokens
+from tool_projection import project_result
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+JSON_FIXTURES = os.path.join(FIXTURES, "tool_results.jsonl")
+TEXT_FIXTURES = os.path.join(FIXTURES, "tool_results_text.jsonl")
+
+
+def read_rows(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def record(config_path, output):
+    """Play the JSON fixture's tool calls against an MCP server and store its responses"""
+    from benchmarks.run_benchmarks import write_mcp_config
+    from mcp_registry import tool_registry
+    from parallel_tools import search_many_tool
+
+    fake_config = None if config_path else write_mcp_config(0)
+    try:
+        tools = {tool.name: tool for tool in await tool_registry.get_tools(config_path or fake_config)}
+        tools["searchSpotifyMany"] = search_many_tool(tools["searchSpotify"])
+        playlist_ids = {}
+        if fake_config:
+            # the fake account starts empty, give it the playlists the fixture reads
+            for name, query in (("workout", "gym hits"), ("chill", "lofi beats"), ("road trip", "classic rock")):
+                created = await tools["createPlaylist"].ainvoke({"name": name})
+                playlist_ids[name] = created.rsplit("Playlist ID: ", 1)[1].strip()
+                found = await tools["searchSpotify"].ainvoke({"query": query, "limit": 50})
+                track_ids = [line.rsplit("ID: ", 1)[1] for line in found.splitlines() if " - ID: " in line]
+                await tools["addTracksToPlaylist"].ainvoke({"playlistId": playlist_ids[name], "trackIds": track_ids})
+        with open(output, "w") as f:
+            for row in read_rows(JSON_FIXTURES):
+                args = dict(row["args"])
+                if "playlistId" in args:
+                    args["playlistId"] = playlist_ids.get(args["playlistId"], args["playlistId"])
+                result = await tools[row["tool"]].ainvoke(args)
+                f.write(json.dumps({"turn": row["turn"], "tool": row["tool"], "args": args,
+                                    "result": result if isinstance(result, str) else json.dumps(result)}) + "\n")
+        print(f"recorded {output}")
+    finally:
+        await tool_registry.close_all()
+        if fake_config:
+            os.remove(fake_config)
+
+
+def report(path, show):
+    rows = read_rows(path)
+    total_raw = total_projected = 0
+    print(f"\n{os.path.basename(path)}")
+    print(f"{'turn':>4}  {'tool':<18} {'raw':>8} {'projected':>10} {'saved':>7}")
+    for row in rows:
+        projected = project_result(row["tool"], row["result"])
+        raw_tokens = count_tokens(row["result"])
+        projected_tokens = count_tokens(projected)
+        total_raw += raw_tokens
+        total_projected += projected_tokens
+        print(f"{row['turn']:>4}  {row['tool']:<18} {raw_tokens:>8} {projected_tokens:>10} {1 - projected_tokens / raw_tokens:>7.1%}")
+        if show:
+            print(projected, "\n")
+
+    turns = len(rows)
+    print(f"mean tokens per turn: raw {total_raw / turns:.0f}, projected {total_projected / turns:.0f} "
+          f"({1 - total_projected / total_raw:.1%} fewer)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", nargs="+", default=[TEXT_FIXTURES, JSON_FIXTURES])
+    parser.add_argument("--record", nargs="?", const="", metavar="CONFIG",
+                        help="re-record the text fixture, from the fake server or the MCP config given")
+    parser.add_argument("--show", action="store_true", help="print each projected result")
+    args = parser.parse_args()
+
+    if args.record is not None:
+        asyncio.run(record(args.record or None, TEXT_FIXTURES))
+    for path in args.fixtures:
+        report(path, args.show)
+
+
+if __name__ == "__main__":
+    main()
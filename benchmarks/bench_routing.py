@@ -0,0 +1,78 @@
+"""Routing accuracy and orchestrator LLM calls saved by the fast path.
+
+Every prompt in the labeled set is routed two ways:
+- keyword:   the original categorize_request
+- fast path: classify_request, used only when it is confident
+and scored the way the graph routes it: the fast path's route when it is taken,
+otherwise categorize_request's. The orchestrator LLM only writes instructions for
+the agent, it never picks the route, so there is no LLM accuracy to report.
+
+Latency saved is the fraction of turns that skip the orchestrator times the cost of
+one orchestrator call, pass --llm-ms with a measured value for your provider.
+
+Run from the repo root:  python -m benchmarks.bench_routing
+"""
+import argparse
+import json
+import os
+import time
+
+from routing import categorize_request, classify_request, ROUTING_CONFIDENCE
+
+
+def load_prompts(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prompts", default=os.path.join(os.path.dirname(__file__), "routing_prompts.jsonl"))
+    parser.add_argument("--threshold", type=float, default=ROUTING_CONFIDENCE)
+    parser.add_argument("--llm-ms", type=float, default=700.0, help="latency of one orchestrator LLM call")
+    args = parser.parse_args()
+
+    prompts = load_prompts(args.prompts)
+    keyword_correct = 0
+    fast_taken = 0
+    fast_correct = 0
+    overall_correct = 0
+    classify_time = 0.0
+    mistakes = []
+
+    for row in prompts:
+        prompt, label = row["prompt"], row["label"]
+        if categorize_request(prompt) == label:
+            keyword_correct += 1
+
+        start = time.perf_counter()
+        route, confidence = classify_request(prompt)
+        classify_time += time.perf_counter() - start
+
+        if route != "general" and confidence >= args.threshold:
+            fast_taken += 1
+            if route == label:
+                fast_correct += 1
+                overall_correct += 1
+            else:
+                mistakes.append((prompt, label, route, f"fast path, {confidence:.2f}"))
+        elif categorize_request(prompt) == label:
+            overall_correct += 1
+        else:
+            mistakes.append((prompt, label, categorize_request(prompt), "keyword fallback"))
+
+    total = len(prompts)
+    print(f"prompts:                     {total}")
+    print(f"keyword router accuracy:     {keyword_correct / total:.1%}")
+    print(f"fast path taken:             {fast_taken}/{total} ({fast_taken / total:.1%})")
+    print(f"fast path accuracy:          {fast_correct / fast_taken:.1%}" if fast_taken else "fast path accuracy:          n/a")
+    print(f"graph routing accuracy:      {overall_correct / total:.1%} (fast path, keyword router for the rest)")
+    print(f"classifier time per prompt:  {classify_time / total * 1e6:.1f} us")
+    print(f"orchestrator calls saved:    {fast_taken / total:.1%} of turns, "
+          f"~{fast_taken / total * args.llm_ms:.0f} ms per turn at {args.llm_ms:.0f} ms per call")
+    for prompt, label, route, decided_by in mistakes:
+        print(f"  misrouted: {prompt!r} -> {route} ({decided_by}), expected {label}")
+
+
+if __name__ == "__main__":
+    main()
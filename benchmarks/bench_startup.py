@@ -0,0 +1,111 @@
+"""Cold start of the two entry points, each measured in a fresh interpreter.
+
+backend: time to import backend.py, to finish the FastAPI lifespan (graph
+built, MCP server connected) and to answer the first /chat request.
+app: time for the first Streamlit script run, a rerun, and the first run of a
+second session in the same process, via streamlit's AppTest. Times are from
+interpreter start.
+
+Runs offline: a temporary working directory holds an mcp_config.json for the
+fake Spotify MCP server, and ChatGroq is replaced by the scripted model before
+the entry point is imported.
+
+Run from the repo root:  python -m benchmarks.bench_startup --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRELUDE = """
+import json, sys, time
+start = time.perf_counter()
+import langchain_groq
+from benchmarks.scripted_llm import ScriptedChatModel
+langchain_groq.ChatGroq = lambda **kwargs: ScriptedChatModel(latency_ms=LLM_LATENCY_MS)
+"""
+
+BACKEND = PRELUDE + """
+import asyncio
+import httpx
+t0 = start
+import backend
+imported = time.perf_counter()
+
+async def main():
+    async with backend.app.router.lifespan_context(backend.app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=backend.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            response = await client.post("/chat", json={"message": "hi there", "thread_id": "bench"})
+            response.raise_for_status()
+        first = time.perf_counter()
+    print(json.dumps({"import_s": imported - t0, "ready_s": ready - t0, "first_response_s": first - t0}))
+
+asyncio.run(main())
+"""
+
+APP = PRELUDE + """
+from streamlit.testing.v1 import AppTest
+t0 = start
+test = AppTest.from_file("REPO/app.py", default_timeout=60)
+test.run()
+first = time.perf_counter()
+test.run()
+rerun = time.perf_counter()
+# a second browser tab is a new session in the same server process
+AppTest.from_file("REPO/app.py", default_timeout=60).run()
+second = time.perf_counter()
+print(json.dumps({"first_run_s": first - t0, "rerun_s": rerun - first, "new_session_s": second - rerun}))
+"""
+
+
+def run_child(code, cwd, llm_latency_ms):
+    env = dict(os.environ, PYTHONPATH=REPO, MCP_USE_ANONYMIZED_TELEMETRY="false",
+               CHECKPOINT_DB=os.path.join(cwd, "checkpoints.sqlite"), GROQ_API_KEY=os.getenv("GROQ_API_KEY", "bench"))
+    code = code.replace("LLM_LATENCY_MS", str(llm_latency_ms)).replace("REPO", REPO)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    measured["process_wall_s"] = wall
+    return measured
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--tool-latency-ms", type=float, default=150.0)
+    parser.add_argument("--skip-app", action="store_true", help="only measure the backend")
+    args = parser.parse_args()
+
+    from benchmarks.run_benchmarks import write_mcp_config
+
+    config_path = write_mcp_config(args.tool_latency_ms)
+    targets = {"backend": BACKEND} if args.skip_app else {"backend": BACKEND, "app": APP}
+    try:
+        for name, code in targets.items():
+            runs = []
+            for _ in range(args.runs):
+                with tempfile.TemporaryDirectory() as cwd:
+                    with open(config_path) as src, open(os.path.join(cwd, "mcp_config.json"), "w") as dst:
+                        dst.write(src.read())
+                    runs.append(run_child(code, cwd, args.llm_latency_ms))
+            medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+            print(f"{name:<8} " + "   ".join(f"{key} {value * 1000:.0f} ms" for key, value in medians.items()))
+    finally:
+        os.remove(config_path)
+
+
+if __name__ == "__main__":
+    main()
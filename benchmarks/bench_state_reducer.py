@@ -0,0 +1,66 @@
+"""Per-step cost of the message history as the conversation grows.
+
+Compares three ways of keeping MultiAgentState.messages:
+- copy:           no reducer, every node returns state["messages"] + [response] (the old graph)
+- add_messages:   LangGraph's stock reducer, nodes return only the delta
+- append_messages: graph_state.py's reducer, converts only the delta and appends it
+
+Run from the repo root:  python -m benchmarks.bench_state_reducer
+"""
+import argparse
+import time
+from typing import Annotated, List, TypedDict
+
+from langchain_core.messages import AIMessage
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
+
+from graph_state import append_messages
+
+
+def build_loop_graph(reducer, steps):
+    """A single node that appends one message per hop, looping `steps` times"""
+    if reducer is None:
+        class LoopState(TypedDict):
+            messages: List
+            steps: int
+    else:
+        class LoopState(TypedDict):
+            messages: Annotated[List, reducer]
+            steps: int
+
+    def node(state: LoopState):
+        response = AIMessage(content="x" * 200)
+        messages = state["messages"] + [response] if reducer is None else [response]
+        return {"messages": messages, "steps": state["steps"] + 1}
+
+    builder = StateGraph(LoopState)
+    builder.add_node("agent", node)
+    builder.add_edge(START, "agent")
+    builder.add_conditional_edges("agent", lambda s: "agent" if s["steps"] < steps else END)
+    return builder.compile()
+
+
+def per_step_us(graph, history_len, steps):
+    history = [AIMessage(content="y" * 200, id=str(i)) for i in range(history_len)]
+    start = time.perf_counter()
+    graph.invoke({"messages": history, "steps": 0}, {"recursion_limit": steps + 10})
+    return (time.perf_counter() - start) / steps * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    args = parser.parse_args()
+
+    variants = [("copy", None), ("add_messages", add_messages), ("append_messages", append_messages)]
+    print(f"{'history':>8} " + " ".join(f"{name:>16}" for name, _ in variants) + "   (us per step)")
+    graphs = [(name, build_loop_graph(reducer, args.steps)) for name, reducer in variants]
+    for length in args.lengths:
+        row = [per_step_us(graph, length, args.steps) for _, graph in graphs]
+        print(f"{length:>8} " + " ".join(f"{us:>16.0f}" for us in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""A local stand-in for the Spotify MCP server, for offline benchmarks.
+
+Serves canned searchSpotify / createPlaylist / addTracksToPlaylist /
+getMyPlaylists / getPlaylistTracks responses in the same text format as the
+real server, with IDs derived from the arguments so runs are repeatable.
+Every call sleeps FAKE_MCP_LATENCY_MS first to stand in for the Spotify API
+round trip.
+
+Run over stdio:  python benchmarks/fake_spotify_mcp.py
+"""
+import asyncio
+import hashlib
+import os
+import string
+from typing import List, Optional
+
+from mcp.server.fastmcp import FastMCP
+
+
+LATENCY = float(os.getenv("FAKE_MCP_LATENCY_MS", "150")) / 1000
+ALPHABET = string.ascii_letters + string.digits
+
+mcp = FastMCP("fake-spotify")
+playlists = {}  # id -> {"name": ..., "tracks": [...]}
+
+
+def spotify_id(*parts) -> str:
+    digest = int(hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest(), 16)
+    chars = []
+    for _ in range(22):
+        digest, index = divmod(digest, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return "".join(chars)
+
+
+def track_line(position: int, track_id: str, title: str, artist: str) -> str:
+    seconds = 150 + int(track_id.encode().hex(), 16) % 150
+    return f'{position}. "{title}" by {artist} ({seconds // 60}:{seconds % 60:02d}) - ID: {track_id}'
+
+
+@mcp.tool()
+async def searchSpotify(query: str, type: str = "track", limit: int = 10) -> str:
+    """Search for tracks, albums, artists, or playlists on Spotify"""
+    await asyncio.sleep(LATENCY)
+    title, _, artist = query.partition(" by ")
+    lines = [f'# Search results for "{query}" (type: {type})', ""]
+    for i in range(limit):
+        name = title.strip().title() if i == 0 else f"{title.strip().title()} ({['Live', 'Remix', 'Acoustic', 'Demo'][i % 4]} {i})"
+        lines.append(track_line(i + 1, spotify_id(query, type, i), name, artist.strip().title() or "Various Artists"))
+    return "\n".join(lines)
+
+
+@mcp.tool()
+async def createPlaylist(name: str, description: str = "", public: bool = False) -> str:
+    """Create a new playlist on Spotify"""
+    await asyncio.sleep(LATENCY)
+    playlist_id = spotify_id("playlist", name, len(playlists))
+    playlists[playlist_id] = {"name": name, "tracks": []}
+    return f'Successfully created playlist "{name}"\nPlaylist ID: {playlist_id}'
+
+
+@mcp.tool()
+async def addTracksToPlaylist(playlistId: str, trackIds: List[str], position: Optional[int] = None) -> str:
+    """Add tracks to a Spotify playlist"""
+    await asyncio.sleep(LATENCY)
+    if len(trackIds) > 100:
+        raise ValueError("You can add a maximum of 100 tracks in one request")
+    playlist = playlists.setdefault(playlistId, {"name": playlistId, "tracks": []})
+    playlist["tracks"].extend(trackIds)
+    return f"Successfully added {len(trackIds)} tracks to playlist (ID: {playlistId})"
+
+
+@mcp.tool()
+async def getMyPlaylists(limit: int = 50) -> str:
+    """Get a list of the current user's playlists on Spotify"""
+    await asyncio.sleep(LATENCY)
+    lines = ["# Your Playlists", ""]
+    for i, (playlist_id, playlist) in enumerate(list(playlists.items())[:limit]):
+        lines.append(f'{i + 1}. "{playlist["name"]}" ({len(playlist["tracks"])} tracks) - ID: {playlist_id}')
+    return "\n".join(lines)
+
+
+@mcp.tool()
+async def getPlaylistTracks(playlistId: str, limit: int = 50, offset: int = 0) -> str:
+    """Get a list of tracks in a Spotify playlist"""
+    await asyncio.sleep(LATENCY)
+    tracks = playlists.get(playlistId, {"tracks": []})["tracks"][offset:offset + limit]
+    lines = ["# Tracks in Playlist", ""]
+    for i, track_id in enumerate(tracks):
+        lines.append(track_line(offset + i + 1, track_id, f"Track {offset + i + 1}", "Various Artists"))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    mcp.run()
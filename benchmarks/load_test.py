@@ -0,0 +1,142 @@
+"""Throughput of one worker process serving many users at once.
+
+Builds one graph (scripted LLM, fake Spotify MCP server, as in run_benchmarks)
+and runs N simulated users concurrently against it, each sending a few turns on
+its own thread. Reports turns per second, turn latency and event loop lag (how
+late a 10 ms timer fires, which grows when something blocks the loop).
+
+The scripted model sleeps synchronously when called through invoke() and
+asynchronously through ainvoke(), like a real provider client, so sync nodes
+and async nodes are measured faithfully.
+
+Run from the repo root:
+    python -m benchmarks.load_test --users 1 8 32 --output load.json
+    python -m benchmarks.load_test --compare load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from benchmarks.run_benchmarks import git_commit, percentile, write_mcp_config
+
+
+USER_TURNS = [
+    "find Blinding Lights by The Weeknd",
+    "hi there, what can you do?",
+    "find these songs: Africa by Toto, Yellow by Coldplay, Halo by Beyonce",
+]
+
+
+async def loop_lag(samples, stop, interval=0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def run_user(graph, turns, latencies):
+    from langchain_core.messages import HumanMessage
+
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}, "recursion_limit": 50}
+    for message in turns:
+        start = time.perf_counter()
+        await graph.ainvoke({"messages": [HumanMessage(content=message)]}, config=config)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_level(graph, users, turns_per_user):
+    from search_cache import search_cache
+
+    search_cache.clear()
+    latencies, lag, stop = [], [], asyncio.Event()
+    ticker = asyncio.create_task(loop_lag(lag, stop))
+    turns = [USER_TURNS[i % len(USER_TURNS)] for i in range(turns_per_user)]
+    start = time.perf_counter()
+    await asyncio.gather(*[run_user(graph, turns, latencies) for _ in range(users)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return {
+        "users": users,
+        "turns": len(latencies),
+        "seconds": elapsed,
+        "turns_per_second": len(latencies) / elapsed,
+        "turn_ms": {"p50": 1000 * percentile(latencies, 50), "p95": 1000 * percentile(latencies, 95)},
+        "loop_lag_ms": {"p50": 1000 * percentile(lag, 50), "max": 1000 * max(lag, default=0.0)},
+    }
+
+
+async def run_load(args):
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from agent_script import create_multi_agent_graph
+    from benchmarks.scripted_llm import ScriptedChatModel
+    from mcp_registry import tool_registry
+    from speculation import speculator
+
+    config_path = write_mcp_config(args.tool_latency_ms)
+    try:
+        graph = await create_multi_agent_graph(checkpointer=InMemorySaver(), config_path=config_path,
+                                               llm=ScriptedChatModel(latency_ms=args.llm_latency_ms))
+        levels = []
+        for users in args.users:
+            result = await run_level(graph, users, args.turns)
+            levels.append(result)
+            print(f"{users:>4} users  {result['turns_per_second']:>7.2f} turns/s   turn p50 {result['turn_ms']['p50']:>7.0f} ms "
+                  f"p95 {result['turn_ms']['p95']:>7.0f} ms   loop lag max {result['loop_lag_ms']['max']:>6.0f} ms")
+    finally:
+        if speculator is not None:
+            await speculator.close()
+        await tool_registry.close_all()
+        os.remove(config_path)
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"llm_latency_ms": args.llm_latency_ms, "tool_latency_ms": args.tool_latency_ms, "turns": args.turns},
+        "levels": levels,
+    }
+
+
+def compare(baseline, current):
+    print(f"\ncompared with {baseline.get('commit')} ({baseline.get('timestamp')})")
+    print(f"{'users':>5} {'turns/s before':>15} {'after':>8} {'p95 before':>11} {'after':>8}")
+    before = {level["users"]: level for level in baseline["levels"]}
+    for level in current["levels"]:
+        old = before.get(level["users"])
+        if old is None:
+            continue
+        print(f"{level['users']:>5} {old['turns_per_second']:>15.2f} {level['turns_per_second']:>8.2f} "
+              f"{old['turn_ms']['p95']:>9.0f}ms {level['turn_ms']['p95']:>6.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", nargs="+", type=int, default=[1, 8, 32, 64])
+    parser.add_argument("--turns", type=int, default=3, help="turns per simulated user")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--tool-latency-ms", type=float, default=150.0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="a previous results file to compare against")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MCP_USE_ANONYMIZED_TELEMETRY", "false")
+    # measure the worker, not the provider: lift the gateway's limits for the scripted model
+    os.environ.setdefault("LLM_RPM", "1000000")
+    os.environ.setdefault("LLM_TPM", "1000000000")
+    os.environ.setdefault("LLM_CONCURRENCY", "256")
+    os.environ.setdefault("TOOL_CONCURRENCY", "32")
+    results = asyncio.run(run_load(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Offline benchmark suite for create_multi_agent_graph.
+
+Builds the real graph against a scripted chat model and the local fake Spotify
+MCP server (benchmarks/fake_spotify_mcp.py), so no Groq, OpenAI or Spotify
+credentials are needed. For each scenario it records end-to-end turn latency,
+per-node latency, graph hops, LLM calls and tool calls, plus cold and warm
+graph build time. Results are written as JSON so two commits can be compared.
+
+Run from the repo root:
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+
+SCENARIOS = {
+    "single_search": ["find Blinding Lights by The Weeknd"],
+    "ten_song_search": [
+        "find these songs: Blinding Lights by The Weeknd, Levitating by Dua Lipa, Hey Ya by OutKast, "
+        "Mr. Brightside by The Killers, Dreams by Fleetwood Mac, Bad Guy by Billie Eilish, "
+        "Africa by Toto, Yellow by Coldplay, Halo by Beyonce, Wonderwall by Oasis"
+    ],
+    "ten_song_playlist": ["make a 10 song playlist of summer hits"],
+    "general_chat": ["hi there, what can you do?"],
+    "long_conversation": [
+        "find Blinding Lights by The Weeknd",
+        "make a 5 song playlist of 80s synth pop",
+        "find Levitating by Dua Lipa",
+        "show me my playlists",
+        "find songs by Taylor Swift",
+        "make a 10 song playlist of road trip songs",
+        "find Dreams by Fleetwood Mac",
+        "what's in my road trip playlist",
+        "find these songs: Africa by Toto, Yellow by Coldplay, Halo by Beyonce",
+        "make a 3 song playlist of rainy day songs",
+    ],
+}
+
+NODES = {"orchestrator", "search_agent", "playlist_agent", "tools", "wrap_up"}
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values) if values else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def write_mcp_config(tool_latency_ms):
+    server = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_spotify_mcp.py")
+    config = {"mcpServers": {"spotify": {
+        "command": sys.executable,
+        "args": [server],
+        "env": {"FAKE_MCP_LATENCY_MS": str(tool_latency_ms)},
+    }}}
+    handle, path = tempfile.mkstemp(prefix="fake_mcp_", suffix=".json")
+    with os.fdopen(handle, "w") as f:
+        json.dump(config, f)
+    return path
+
+
+async def run_turn(graph, message, thread_id):
+    """One user turn, timed per node from the graph's event stream"""
+    from langchain_core.messages import HumanMessage
+
+    node_starts, node_times = {}, []
+    llm_calls = tool_calls = 0
+    start = time.perf_counter()
+    config = {"configurable": {"thread_id": thread_id}, "recursion_limit": 50}
+    async for event in graph.astream_events({"messages": [HumanMessage(content=message)]}, version="v2", config=config):
+        kind, name = event["event"], event["name"]
+        is_node = name in NODES and event.get("metadata", {}).get("langgraph_node") == name
+        if kind == "on_chain_start" and is_node:
+            node_starts[event["run_id"]] = time.perf_counter()
+        elif kind == "on_chain_end" and is_node and event["run_id"] in node_starts:
+            node_times.append((name, (time.perf_counter() - node_starts.pop(event["run_id"])) * 1000))
+        elif kind == "on_chat_model_end":
+            # count the calls the model asked for, the tool wrappers nest their own tool events
+            llm_calls += 1
+            tool_calls += len(getattr(event["data"].get("output"), "tool_calls", None) or [])
+    return {
+        "message": message,
+        "turn_ms": (time.perf_counter() - start) * 1000,
+        "hops": len(node_times),
+        "llm_calls": llm_calls,
+        "tool_calls": tool_calls,
+        "nodes": node_times,
+    }
+
+
+async def run_suite(args):
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from agent_script import create_multi_agent_graph
+    from benchmarks.scripted_llm import ScriptedChatModel
+    from mcp_registry import tool_registry
+    from search_cache import search_cache
+    from speculation import speculator
+
+    config_path = write_mcp_config(args.tool_latency_ms)
+    llm = ScriptedChatModel(latency_ms=args.llm_latency_ms)
+    try:
+        start = time.perf_counter()
+        graph = await create_multi_agent_graph(checkpointer=InMemorySaver(), config_path=config_path, llm=llm)
+        cold_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        graph = await create_multi_agent_graph(checkpointer=InMemorySaver(), config_path=config_path, llm=llm)
+        warm_ms = (time.perf_counter() - start) * 1000
+
+        scenarios = {}
+        for name in args.scenarios:
+            turns = []
+            for _ in range(args.repeat):
+                # each repetition is a fresh thread, and cached searches would hide tool latency
+                search_cache.clear()
+                if speculator is not None:
+                    speculator.clear()
+                thread_id = str(uuid.uuid4())
+                for message in SCENARIOS[name]:
+                    turns.append(await run_turn(graph, message, thread_id))
+            per_node = {}
+            for turn in turns:
+                for node, ms in turn["nodes"]:
+                    per_node.setdefault(node, []).append(ms)
+            scenarios[name] = {
+                "turns": len(turns),
+                "turn_ms": summarize([t["turn_ms"] for t in turns]),
+                "hops": summarize([t["hops"] for t in turns]),
+                "llm_calls": summarize([t["llm_calls"] for t in turns]),
+                "tool_calls": summarize([t["tool_calls"] for t in turns]),
+                "nodes_ms": {node: summarize(values) for node, values in sorted(per_node.items())},
+            }
+            print(f"{name:<20} turn p50 {scenarios[name]['turn_ms']['p50']:>8.0f} ms   "
+                  f"hops {scenarios[name]['hops']['mean']:>5.1f} (max {scenarios[name]['hops']['max']:>3.0f})   llm calls {scenarios[name]['llm_calls']['mean']:>4.1f}   "
+                  f"tool calls {scenarios[name]['tool_calls']['mean']:>4.1f}")
+        if speculator is not None:
+            stats = speculator.stats()
+            print(f"{'speculation':<20} {stats['hits']}/{stats['issued']} prefetches used, "
+                  f"{stats['saved_seconds'] * 1000:.0f} ms of search time saved")
+    finally:
+        if speculator is not None:
+            await speculator.close()
+        await tool_registry.close_all()
+        os.remove(config_path)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "llm_latency_ms": args.llm_latency_ms,
+            "tool_latency_ms": args.tool_latency_ms,
+            "repeat": args.repeat,
+            "env": {key: os.environ[key] for key in ("ROUTING_MODE", "PARALLEL_TOOLS", "TOOL_CONCURRENCY", "LLM_RPM", "LLM_TPM", "LLM_HEDGE_AFTER", "SPECULATION", "MAX_HOPS", "MAX_TOOL_CALLS", "TURN_DEADLINE") if key in os.environ},
+        },
+        "build_ms": {"cold": cold_ms, "warm": warm_ms},
+        "speculation": speculator.stats() if speculator is not None else None,
+        "scenarios": scenarios,
+    }
+
+
+def compare(baseline, current):
+    print(f"\ncompared with {baseline.get('commit')} ({baseline.get('timestamp')})")
+    print(f"{'scenario':<20} {'turn p50 before':>16} {'after':>10} {'change':>8} {'hops':>12}")
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        old, new = before["turn_ms"]["p50"], result["turn_ms"]["p50"]
+        change = (new - old) / old if old else 0.0
+        print(f"{name:<20} {old:>14.0f}ms {new:>8.0f}ms {change:>+8.1%} "
+              f"{before['hops']['mean']:>5.1f} -> {result['hops']['mean']:<4.1f}")
+    print(f"{'build (cold)':<20} {baseline['build_ms']['cold']:>14.0f}ms {current['build_ms']['cold']:>8.0f}ms")
+    print(f"{'build (warm)':<20} {baseline['build_ms']['warm']:>14.0f}ms {current['build_ms']['warm']:>8.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--tool-latency-ms", type=float, default=150.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="a previous results file to compare against")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MCP_USE_ANONYMIZED_TELEMETRY", "false")
+    # the scripted model has no provider limits, keep the gateway's RPM/TPM limiter out of the timings
+    os.environ.setdefault("LLM_RPM", "1000000")
+    os.environ.setdefault("LLM_TPM", "1000000000")
+    results = asyncio.run(run_suite(args))
+    print(f"{'graph build':<20} cold {results['build_ms']['cold']:.0f} ms, warm {results['build_ms']['warm']:.0f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""A scripted chat model that plays the agents' part without calling an LLM provider.
+
+It picks the next step from the system prompt (which agent it is), the tools it
+was bound with and the tool results since the last user message, and sleeps a
+configurable latency per call so graph timings look like a real run.
+"""
+import asyncio
+import json
+import re
+import time
+import uuid
+from typing import List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from playlist_writer import extract_track_ids
+
+
+def _text(content) -> str:
+    return content if isinstance(content, str) else json.dumps(content)
+
+
+def requested_songs(message: str) -> List[str]:
+    """Songs named in a request, or N placeholder titles for 'a 10 song playlist'"""
+    _, _, listed = message.partition(":")
+    if listed and "," in listed:
+        return [song.strip() for song in listed.split(",") if song.strip()]
+    match = re.search(r"(\d+)[- ]songs?", message)
+    count = int(match.group(1)) if match else 10
+    theme = re.sub(r".*\bof\b", "", message).strip() or "hits"
+    return [f"{theme} song {i + 1}" for i in range(count)]
+
+
+class ScriptedChatModel(BaseChatModel):
+    latency_ms: float = 300.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[tool.name for tool in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return self._respond(messages, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._respond(messages, **kwargs)
+
+    def _respond(self, messages, tools: Optional[List[str]] = None, parallel_tool_calls: bool = False, **kwargs) -> ChatResult:
+        self.calls += 1
+        message = self._next_step(messages, tools or [], parallel_tool_calls)
+        prompt_tokens = sum(len(_text(m.content)) // 4 + 4 for m in messages)
+        completion_tokens = len(_text(message.content)) // 4 + 16 * len(message.tool_calls)
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _next_step(self, messages, tools: List[str], parallel: bool) -> AIMessage:
+        system = _text(messages[0].content) if isinstance(messages[0], SystemMessage) else ""
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        request = _text(messages[last_human].content) if last_human >= 0 else ""
+        since = messages[last_human + 1:]
+        tool_results = [m for m in since if isinstance(m, ToolMessage)]
+        done = [call["name"] for m in since if isinstance(m, AIMessage) for call in m.tool_calls]
+
+        if not tools:
+            return AIMessage(content=f"Routing this to the right agent: {request}")
+
+        if "Playlist Agent" in system:
+            return self._playlist_step(request, system, tools, tool_results, done)
+        return self._search_step(request, tools, tool_results, done, parallel)
+
+    def _call(self, name: str, args: dict) -> dict:
+        return {"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "tool_call"}
+
+    def _search_step(self, request, tools, tool_results, done, parallel) -> AIMessage:
+        songs = requested_songs(request) if ":" in request else [re.sub(r"^(find|search( for)?|look up)\s+", "", request, flags=re.I)]
+        searched = len([name for name in done if name == "searchSpotify"])
+        if "searchSpotifyMany" in done or searched >= len(songs):
+            found = "\n".join(_text(m.content) for m in tool_results)
+            return AIMessage(content=f"Here is what I found:\n{found[:1500]}")
+        if len(songs) > 1 and "searchSpotifyMany" in tools:
+            return AIMessage(content="", tool_calls=[self._call("searchSpotifyMany", {"queries": songs, "type": "track", "limit": 1})])
+        remaining = songs[searched:] if parallel else songs[searched:searched + 1]
+        return AIMessage(content="", tool_calls=[
+            self._call("searchSpotify", {"query": song, "type": "track", "limit": 3}) for song in remaining
+        ])
+
+    def _playlist_step(self, request, system, tools, tool_results, done) -> AIMessage:
+        if "what's in" in request.lower() or "show me my playlists" in request.lower():
+            if "getMyPlaylists" not in done:
+                return AIMessage(content="", tool_calls=[self._call("getMyPlaylists", {"limit": 50})])
+            return AIMessage(content="Your playlists:\n" + _text(tool_results[-1].content)[:1500])
+
+        songs = requested_songs(request)
+        if "searchSpotifyMany" in tools and "searchSpotifyMany" not in done:
+            return AIMessage(content="", tool_calls=[self._call("searchSpotifyMany", {"queries": songs, "type": "track", "limit": 1})])
+        if "createPlaylist" not in done:
+            return AIMessage(content="", tool_calls=[self._call("createPlaylist", {"name": request[:60], "description": "Made by the agent"})])
+        if "addTracksToPlaylist" not in done:
+            created = next(_text(m.content) for m in reversed(tool_results) if "Playlist ID" in _text(m.content))
+            playlist_id = created.rsplit("Playlist ID: ", 1)[1].strip()
+            track_ids = []
+            for m in tool_results:
+                if m.name in ("searchSpotify", "searchSpotifyMany"):
+                    track_ids += extract_track_ids(m.content)
+            # without a search tool the real model falls back to IDs it saw earlier in the thread
+            track_ids = (track_ids or extract_track_ids(system))[:len(songs)]
+            return AIMessage(content="", tool_calls=[self._call("addTracksToPlaylist", {"playlistId": playlist_id, "trackIds": track_ids})])
+        return AIMessage(content=f"Your playlist is ready with {len(songs)} songs.")
@@ -0,0 +1,103 @@
+import orjson
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from tool_projection import project_result
+
+
+# Characters of each tool result shown in the /chat tool summaries
+TOOL_PREVIEW_CHARS = 200
+
+
+def _default(obj):
+    # LangChain messages and other pydantic models in the debug state
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def turn_messages(messages):
+    """The messages the latest turn added, everything after its HumanMessage"""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i + 1:]
+    return list(messages)
+
+
+def _text(content) -> str:
+    return content if isinstance(content, str) else dumps(content).decode()
+
+
+def tool_preview(name: str, content, limit: int = TOOL_PREVIEW_CHARS) -> str:
+    """The start of a tool result's compact projection, for showing to the user"""
+    return _text(project_result(name, _text(content)))[:limit]
+
+
+def tool_summary(message: ToolMessage) -> dict:
+    return {
+        "name": message.name,
+        "status": getattr(message, "status", "success"),
+        "chars": len(_text(message.content)),
+        "preview": tool_preview(message.name, message.content),
+    }
+
+
+def turn_timings(trace) -> dict:
+    """Milliseconds per node and per tool, like RequestTrace.summary()"""
+    totals = {}
+    for span in trace.spans:
+        key = span["name"] if span["kind"] == "node" else f"tool:{span['name']}"
+        totals[key] = totals.get(key, 0.0) + span["seconds"] * 1000
+    return {key: round(ms, 1) for key, ms in totals.items()}
+
+
+def final_answer(messages):
+    """The turn's answer: its last AIMessage with text and no pending tool calls"""
+    for message in reversed(messages):
+        if isinstance(message, AIMessage) and message.content and not message.tool_calls:
+            return message
+    return None
+
+
+def turn_response(state, trace, cached: bool = False, include_tools: bool = True, debug: bool = False) -> dict:
+    """What /chat returns for one turn: the answer, tool summaries and metadata.
+
+    The orchestrator's routing text and the agents' text before their tool calls
+    are not part of the answer, they and the full state (every message and raw
+    tool result in the thread) are only included with debug.
+    """
+    new_messages = turn_messages(state["messages"])
+    answer = final_answer(new_messages)
+    # a cached turn ran no nodes, the budget in the state is the previous turn's
+    budget = {} if cached else state.get("budget") or {}
+    response = {
+        "thread_id": trace.thread_id,
+        "answer": answer.content if answer is not None else "",
+        "messages": [{"role": "assistant", "content": answer.content, "id": answer.id}] if answer is not None else [],
+        "meta": {
+            "request_id": trace.request_id,
+            "route": state.get("task_type"),
+            "agent": state.get("current_agent"),
+            "cached": cached,
+            "ms": round((trace.seconds or 0) * 1000, 1),
+            "hops": trace.hops,
+            "tool_calls": budget.get("tool_calls", 0),
+            "mcp_calls": trace.mcp_calls,
+            "memo_hits": budget.get("memo_hits", 0),
+            "stopped": budget.get("stopped"),
+            "tokens": trace.tokens,
+            "timings": turn_timings(trace),
+        },
+    }
+    if include_tools:
+        response["tools"] = [tool_summary(m) for m in new_messages if isinstance(m, ToolMessage)]
+    if debug:
+        response["intermediate"] = [{"role": "assistant", "content": m.content, "id": m.id} for m in new_messages
+                                    if isinstance(m, AIMessage) and m.content and m is not answer]
+        response["state"] = state
+    return response
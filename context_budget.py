@@ -0,0 +1,189 @@
+import json
+import os
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+
+# Input tokens we aim to send per agent call, older turns are trimmed to fit
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+# Hard limit for a single call, past this the turn fails with ContextLimitExceeded
+MAX_INPUT_TOKENS = int(os.getenv("MAX_INPUT_TOKENS", "30000"))
+# Longest tool result kept in the context, raw search JSON is cut down to this
+TOOL_RESULT_MAX_TOKENS = int(os.getenv("TOOL_RESULT_MAX_TOKENS", "800"))
+# Tool results of the current turn are cut down to this before the user's request would be dropped
+TOOL_RESULT_MIN_TOKENS = 100
+SUMMARY_MAX_TOKENS = 300
+
+# per-message overhead of the chat template (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+try:
+    import tiktoken
+    # Llama 4 uses a ~200k vocabulary BPE, o200k_base gives close counts for English text
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+
+class ContextLimitExceeded(Exception):
+    """The conversation no longer fits in the model's input token limit"""
+
+    code = "context_limit_exceeded"
+
+    def __init__(self, tokens: int, limit: int, message: str = None):
+        self.tokens = tokens
+        self.limit = limit
+        super().__init__(message or f"This request needs about {tokens} input tokens, over the limit of {limit}.")
+
+    def to_dict(self):
+        return {"code": self.code, "message": str(self), "tokens": self.tokens, "limit": self.limit}
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # rough fallback, about four characters per token
+    return len(text) // 4 + 1
+
+
+def _content_text(content) -> str:
+    return content if isinstance(content, str) else json.dumps(content)
+
+
+def message_tokens(message) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(_content_text(message.content))
+    for call in getattr(message, "tool_calls", None) or []:
+        tokens += count_tokens(call["name"]) + count_tokens(json.dumps(call["args"]))
+    return tokens
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    # keep the head, tool results put the best matches first
+    keep_chars = int(len(text) * max_tokens / tokens)
+    return text[:keep_chars] + f"\n[... truncated {tokens - max_tokens} tokens]"
+
+
+def _group_turns(messages):
+    """Split messages into units that must be kept or dropped together.
+
+    An AIMessage with tool calls and the ToolMessages answering it form one unit,
+    so trimming never leaves a tool call without its result or vice versa.
+    """
+    units = []
+    i = 0
+    while i < len(messages):
+        message = messages[i]
+        if isinstance(message, AIMessage) and message.tool_calls:
+            call_ids = {call["id"] for call in message.tool_calls}
+            unit = [message]
+            i += 1
+            while i < len(messages) and isinstance(messages[i], ToolMessage):
+                if messages[i].tool_call_id in call_ids:
+                    unit.append(messages[i])
+                i += 1
+            answered = {m.tool_call_id for m in unit[1:]}
+            if answered != call_ids:
+                # a call without its result can't be sent to the model, keep only the text
+                if message.content:
+                    units.append([AIMessage(content=message.content, id=message.id)])
+                continue
+            units.append(unit)
+        elif isinstance(message, ToolMessage):
+            # orphaned result whose tool call was already trimmed
+            i += 1
+        else:
+            units.append([message])
+            i += 1
+    return units
+
+
+def _compact(message, max_tokens: int = TOOL_RESULT_MAX_TOKENS):
+    if isinstance(message, ToolMessage):
+        content = _content_text(message.content)
+        truncated = truncate_text(content, max_tokens)
+        if truncated is not content:
+            return message.model_copy(update={"content": truncated})
+    return message
+
+
+def _summarize(dropped_units) -> str:
+    """A short extractive note of what the trimmed turns were about"""
+    lines = []
+    for unit in dropped_units:
+        for message in unit:
+            if isinstance(message, HumanMessage):
+                lines.append(f"- user asked: {_content_text(message.content)[:150]}")
+            elif isinstance(message, AIMessage) and message.tool_calls:
+                names = ", ".join(sorted({call["name"] for call in message.tool_calls}))
+                lines.append(f"- tools used: {names}")
+    # the turns just before the kept window matter most, keep those when the note is too long
+    kept, used = [], 0
+    for line in reversed(lines):
+        used += count_tokens(line)
+        if used > SUMMARY_MAX_TOKENS:
+            break
+        kept.insert(0, line)
+    return "Earlier in this conversation (older turns trimmed):\n" + "\n".join(kept)
+
+
+def _tokens(units) -> int:
+    return sum(message_tokens(m) for unit in units for m in unit)
+
+
+def build_context(system_msg: str, messages, budget: int = None, limit: int = None):
+    """Messages for one agent call, fitted to the token budget.
+
+    The current turn, from the latest user message on, is always kept; if it
+    alone is over budget its tool results are cut shorter instead. Older turns
+    are dropped oldest first and summarized into the system message. Raises
+    ContextLimitExceeded when even the current turn is over the hard limit.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    limit = MAX_INPUT_TOKENS if limit is None else limit
+
+    raw_units = _group_turns(list(messages))
+    turn_start = max((i for i, unit in enumerate(raw_units) if isinstance(unit[0], HumanMessage)),
+                     default=max(0, len(raw_units) - 1))
+    system_tokens = count_tokens(system_msg) + MESSAGE_OVERHEAD_TOKENS
+
+    current = [[_compact(m) for m in unit] for unit in raw_units[turn_start:]]
+    if system_tokens + _tokens(current) > budget:
+        # many parallel tool results can outgrow the budget on their own, share what is left between them
+        results = [m for unit in current for m in unit if isinstance(m, ToolMessage)]
+        room = budget - system_tokens - (_tokens(current) - _tokens([results]))
+        max_tool_tokens = max(TOOL_RESULT_MIN_TOKENS, room // max(1, len(results)) - MESSAGE_OVERHEAD_TOKENS - 20)
+        current = [[_compact(m, max_tool_tokens) for m in unit] for unit in current]
+
+    used = system_tokens + _tokens(current)
+    older = [[_compact(m) for m in unit] for unit in raw_units[:turn_start]]
+    kept = []
+    for index in range(len(older) - 1, -1, -1):
+        unit_tokens = _tokens([older[index]])
+        if used + unit_tokens > budget:
+            dropped = older[:index + 1]
+            break
+        kept.insert(0, older[index])
+        used += unit_tokens
+    else:
+        dropped = []
+
+    if used > limit:
+        raise ContextLimitExceeded(used, limit)
+
+    if dropped:
+        system_msg = system_msg + "\n\n" + _summarize(dropped)
+    return [SystemMessage(content=system_msg)] + [m for unit in kept + current for m in unit]
+
+
+def provider_context_error(error: Exception):
+    """Map the provider's "too many tokens" errors to ContextLimitExceeded, or None"""
+    text = str(error)
+    markers = ["context_length_exceeded", "maximum context length", "Request too large", "reduce the length"]
+    if getattr(error, "status_code", None) == 413 or any(marker in text for marker in markers):
+        return ContextLimitExceeded(tokens=-1, limit=MAX_INPUT_TOKENS, message=f"The model rejected the request as too long: {text}")
+    return None
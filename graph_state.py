@@ -0,0 +1,43 @@
+from typing import Annotated, List, Dict, Any, TypedDict
+import uuid
+from operator import attrgetter
+
+from langchain_core.messages import RemoveMessage, convert_to_messages, message_chunk_to_message
+from langgraph.graph.message import add_messages
+
+
+_message_id = attrgetter("id")
+
+
+def append_messages(left: List, right) -> List:
+    """Message history reducer with add_messages' semantics, built for appends.
+
+    add_messages converts and re-indexes the whole history on every update.
+    Here only the delta is converted, and the history is checked with one scan
+    of its ids: an update that reuses an id (replacing that message) or removes
+    messages is handed to add_messages, anything else is appended to a new
+    list holding the same message objects. Like add_messages, incoming
+    messages without an id get one assigned in place.
+    """
+    if not isinstance(right, list):
+        right = [right]
+    new_messages = [message_chunk_to_message(m) for m in convert_to_messages(right)]
+    if any(isinstance(m, RemoveMessage) for m in new_messages):
+        return add_messages(left, new_messages)
+    given_ids = {m.id for m in new_messages if m.id is not None}
+    if given_ids and not given_ids.isdisjoint(map(_message_id, left)):
+        return add_messages(left, new_messages)
+    for m in new_messages:
+        if m.id is None:
+            m.id = str(uuid.uuid4())
+    return left + new_messages
+
+
+# Custom State for Multi-Agent System
+class MultiAgentState(TypedDict):
+    messages: Annotated[List, append_messages]  # Nodes return only new messages, the reducer appends them
+    current_agent: str  # Track which agent should handle the task
+    task_type: str      # Type of task: "search", "playlist", or "general"
+    search_results: Dict[str, Any]  # Store search results between agents
+    playlist_info: Dict[str, Any]   # Store playlist information
+    budget: Dict[str, Any]          # This turn's hops, tool calls and start time, see turn_budget.py
@@ -0,0 +1,428 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+from mcp_registry import is_tool_error
+from metrics import registry, CallbackGauge, Counter
+from token_manager import token_manager
+
+
+# Keep a local copy of the user's playlists, "0" sends every playlist lookup to MCP
+LIBRARY_MIRROR = os.getenv("LIBRARY_MIRROR", "1") == "1"
+LIBRARY_DB = os.getenv("LIBRARY_DB", "library.sqlite")
+# Re-check the playlists' snapshot_ids this often, only changed playlists are fetched again
+LIBRARY_SYNC_INTERVAL = float(os.getenv("LIBRARY_SYNC_INTERVAL", "300"))
+# Older than this the mirror isn't trusted and lookups go to MCP until the next sync
+LIBRARY_MAX_AGE = float(os.getenv("LIBRARY_MAX_AGE", "900"))
+
+# Saved tracks are mirrored like a playlist under this ID, they aren't a playlist the agent can add to
+LIKED_SONGS = "liked"
+SYNC_CONCURRENCY = 4
+
+library_lookups = Counter("agent_library_lookups_total", "Playlist lookups by where they were answered: mirror or mcp", ("source",))
+registry.register(library_lookups)
+
+
+def _artists(track: dict) -> str:
+    return ", ".join(track["artists"]) or "Unknown Artist"
+
+
+def _duration(ms) -> str:
+    seconds = int(ms or 0) // 1000
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class SpotifySource:
+    """Reads playlists and saved tracks from the Spotify Web API with the shared token"""
+
+    def __init__(self, token_manager):
+        self.token_manager = token_manager
+
+    def _client(self):
+        import spotipy
+
+        token = self.token_manager.load()
+        if not token or "access_token" not in token:
+            raise RuntimeError("No Spotify token, run refresh.py once to log in")
+        return spotipy.Spotify(auth=token["access_token"], requests_timeout=10)
+
+    def _pages(self, sp, page):
+        while page:
+            yield from (item for item in page["items"] if item)
+            page = sp.next(page) if page.get("next") else None
+
+    def playlists(self) -> list:
+        """Every playlist the user follows, with its snapshot_id"""
+        sp = self._client()
+        playlists = []
+        for item in self._pages(sp, sp.current_user_playlists(limit=50)):
+            tracks = item.get("tracks") or item.get("items") or {}
+            playlists.append({
+                "id": item["id"],
+                "name": item["name"],
+                "snapshot_id": item["snapshot_id"],
+                "owner": (item.get("owner") or {}).get("id"),
+                "tracks_total": tracks.get("total", 0),
+            })
+        # saved tracks have no snapshot_id, the count and the newest addition stand in for one
+        saved = sp.current_user_saved_tracks(limit=1)
+        newest = saved["items"][0]["added_at"] if saved["items"] else ""
+        playlists.append({"id": LIKED_SONGS, "name": "Liked Songs", "snapshot_id": f"{saved['total']}:{newest}",
+                          "owner": None, "tracks_total": saved["total"]})
+        return playlists
+
+    def playlist_tracks(self, playlist_id: str) -> list:
+        sp = self._client()
+        if playlist_id == LIKED_SONGS:
+            page = sp.current_user_saved_tracks(limit=50)
+        else:
+            page = sp.playlist_items(playlist_id, limit=100, additional_types=("track",),
+                                     fields="items(track(id,uri,name,duration_ms,album(name),artists(name))),next")
+        tracks = []
+        for item in self._pages(sp, page):
+            track = item.get("track")
+            if not track or not track.get("id"):
+                continue  # local files and removed tracks have no ID
+            tracks.append({
+                "id": track["id"],
+                "uri": track["uri"],
+                "name": track["name"],
+                "artists": [artist["name"] for artist in track.get("artists") or []],
+                "album": (track.get("album") or {}).get("name"),
+                "duration_ms": track.get("duration_ms"),
+            })
+        return tracks
+
+
+class LibraryMirror:
+    """SQLite copy of the user's playlists and saved tracks, with in-memory indexes.
+
+    The first sync fetches everything; after that only playlists whose
+    snapshot_id changed (or that the agent just wrote to) are fetched again.
+    Lookups read the indexes: playlists by name, playlists containing a track
+    URI and tracks by artist.
+    """
+
+    def __init__(self, source, path: str = LIBRARY_DB, sync_interval: float = LIBRARY_SYNC_INTERVAL,
+                 max_age: float = LIBRARY_MAX_AGE):
+        self.source = source
+        self.path = path
+        self.sync_interval = sync_interval
+        self.max_age = max_age
+        self.synced_at = None
+        self.syncs = 0
+        self.last_sync = None
+        self.last_error = None
+        self.playlists = {}   # playlist id -> playlist dict
+        self.tracks = {}      # playlist id -> [track dict]
+        self.by_name = {}     # lowercased playlist name -> [playlist id]
+        self.by_track = {}    # track URI -> {playlist id}
+        self.by_artist = {}   # lowercased artist -> {track URI}
+        self.track_info = {}  # track URI -> track dict
+        self._stale = set()   # playlists written to since their last fetch
+        self._list_stale = False
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._sync_lock = None
+        self._wake = None
+        self._task = None
+
+    # --- storage ---
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS playlists (id TEXT PRIMARY KEY, name TEXT, snapshot_id TEXT, owner TEXT, tracks_total INTEGER);
+                CREATE TABLE IF NOT EXISTS playlist_tracks (playlist_id TEXT, position INTEGER, track TEXT, PRIMARY KEY (playlist_id, position));
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """)
+        return self._db
+
+    def load(self):
+        """Fill the indexes from the database, so a restart doesn't need a full sync"""
+        with self._db_lock:
+            db = self._connect()
+            playlists = {row[0]: {"id": row[0], "name": row[1], "snapshot_id": row[2], "owner": row[3], "tracks_total": row[4]}
+                         for row in db.execute("SELECT id, name, snapshot_id, owner, tracks_total FROM playlists")}
+            tracks = {playlist_id: [] for playlist_id in playlists}
+            for playlist_id, track in db.execute("SELECT playlist_id, track FROM playlist_tracks ORDER BY playlist_id, position"):
+                tracks.setdefault(playlist_id, []).append(json.loads(track))
+            synced_at = db.execute("SELECT value FROM meta WHERE key = 'synced_at'").fetchone()
+        self._index(playlists, tracks)
+        self.synced_at = float(synced_at[0]) if synced_at else None
+        return len(playlists)
+
+    def _store(self, playlists, fetched, removed, synced_at):
+        with self._db_lock:
+            db = self._connect()
+            with db:
+                db.executemany("DELETE FROM playlists WHERE id = ?", [(playlist_id,) for playlist_id in removed])
+                db.executemany("DELETE FROM playlist_tracks WHERE playlist_id = ?",
+                               [(playlist_id,) for playlist_id in list(removed) + list(fetched)])
+                db.executemany("INSERT OR REPLACE INTO playlists VALUES (?, ?, ?, ?, ?)",
+                               [(p["id"], p["name"], p["snapshot_id"], p["owner"], p["tracks_total"]) for p in playlists])
+                db.executemany("INSERT INTO playlist_tracks VALUES (?, ?, ?)",
+                               [(playlist_id, position, json.dumps(track))
+                                for playlist_id, tracks in fetched.items() for position, track in enumerate(tracks)])
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('synced_at', ?)", (str(synced_at),))
+
+    def _index(self, playlists, tracks):
+        by_name, by_track, by_artist, track_info = {}, {}, {}, {}
+        for playlist_id, playlist in playlists.items():
+            by_name.setdefault(playlist["name"].lower(), []).append(playlist_id)
+            for track in tracks.get(playlist_id, []):
+                by_track.setdefault(track["uri"], set()).add(playlist_id)
+                track_info[track["uri"]] = track
+                for artist in track["artists"]:
+                    by_artist.setdefault(artist.lower(), set()).add(track["uri"])
+        # swap everything at once, lookups never see half an index
+        self.playlists, self.tracks = playlists, tracks
+        self.by_name, self.by_track, self.by_artist, self.track_info = by_name, by_track, by_artist, track_info
+
+    # --- sync ---
+
+    async def sync(self):
+        """Fetch the playlist list, then only the playlists that changed since the last sync"""
+        if self._sync_lock is None:
+            self._sync_lock = asyncio.Lock()
+        async with self._sync_lock:
+            start = time.perf_counter()
+            stale, self._stale = self._stale, set()
+            list_stale, self._list_stale = self._list_stale, False
+            semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+            async def fetch(playlist_id):
+                async with semaphore:
+                    return await asyncio.to_thread(self.source.playlist_tracks, playlist_id)
+
+            try:
+                remote = await asyncio.to_thread(self.source.playlists)
+                changed = [p["id"] for p in remote
+                           if p["id"] in stale or p["snapshot_id"] != self.playlists.get(p["id"], {}).get("snapshot_id")]
+                removed = set(self.playlists) - {p["id"] for p in remote}
+                fetched = dict(zip(changed, await asyncio.gather(*[fetch(playlist_id) for playlist_id in changed])))
+            except BaseException:
+                # whatever was stale still is
+                self._stale |= stale
+                self._list_stale = self._list_stale or list_stale
+                raise
+            synced_at = time.time()
+            await asyncio.to_thread(self._store, remote, fetched, removed, synced_at)
+
+            tracks = {playlist_id: fetched.get(playlist_id, self.tracks.get(playlist_id, [])) for playlist_id in
+                      (p["id"] for p in remote)}
+            self._index({p["id"]: p for p in remote}, tracks)
+            self.synced_at = synced_at
+            self.syncs += 1
+            self.last_error = None
+            self.last_sync = {"playlists": len(remote), "fetched": len(changed), "removed": len(removed),
+                              "seconds": time.perf_counter() - start}
+            print(f"Library synced: {len(changed)} of {len(remote)} playlists fetched in {self.last_sync['seconds']:.1f}s")
+            return self.last_sync
+
+    async def _run(self):
+        backoff = 5.0
+        while True:
+            try:
+                await self.sync()
+                backoff = 5.0
+                delay = self.sync_interval
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Library sync failed: {e}, retrying in {backoff:.0f}s")
+                delay, backoff = backoff, min(backoff * 2, 300.0)
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+                # a write wakes us early, give the rest of the agent's writes a moment to land
+                await asyncio.sleep(2)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def start(self):
+        """Load the stored mirror and keep it in sync in the background"""
+        if self._task is None or self._task.done():
+            await asyncio.to_thread(self.load)
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def invalidate(self, playlist_id: Optional[str] = None):
+        """The agent changed the library, serve these from MCP until the next sync picks up the change"""
+        if playlist_id is None:
+            self._list_stale = True
+        else:
+            self._stale.add(playlist_id)
+        if self._wake is not None:
+            self._wake.set()
+
+    # --- lookups ---
+
+    @property
+    def ready(self) -> bool:
+        return self.synced_at is not None and time.time() - self.synced_at <= self.max_age
+
+    def has_fresh_list(self) -> bool:
+        return self.ready and not self._list_stale
+
+    def has_fresh_tracks(self, playlist_id: str) -> bool:
+        return self.ready and playlist_id in self.tracks and playlist_id not in self._stale
+
+    def find_playlists(self, name: str) -> list:
+        """Playlists named exactly this (ignoring case), else the ones whose name contains it"""
+        name = name.lower().strip()
+        ids = self.by_name.get(name) or [playlist_id for key, ids in self.by_name.items() if name in key for playlist_id in ids]
+        return [self.playlists[playlist_id] for playlist_id in ids if playlist_id != LIKED_SONGS]
+
+    def playlists_with_track(self, uri: str) -> list:
+        return [self.playlists[playlist_id] for playlist_id in self.by_track.get(uri, ())]
+
+    def tracks_by_artist(self, artist: str) -> list:
+        return [self.track_info[uri] for uri in self.by_artist.get(artist.lower().strip(), ())]
+
+    def search(self, query: str, limit: int = 20) -> dict:
+        """Playlists, artists and tracks in the library matching a free text query"""
+        query = query.lower().strip()
+        tracks = self.tracks_by_artist(query) or [track for track in self.track_info.values()
+                                                  if query in track["name"].lower()]
+        return {"playlists": self.find_playlists(query), "tracks": tracks[:limit]}
+
+    def playlist_info(self, max_playlists: int = 50) -> dict:
+        """Summary for MultiAgentState.playlist_info: the user's playlists and when they were synced"""
+        playlists = [p for p in self.playlists.values() if p["id"] != LIKED_SONGS][:max_playlists]
+        return {
+            "playlists": [{"id": p["id"], "name": p["name"], "tracks": p["tracks_total"]} for p in playlists],
+            "liked_tracks": len(self.tracks.get(LIKED_SONGS, [])),
+            "synced_at": self.synced_at,
+        }
+
+    # --- MCP-compatible answers ---
+
+    def format_playlists(self, limit: int = 50) -> str:
+        lines = ["# Your Playlists", ""]
+        playlists = [p for p in self.playlists.values() if p["id"] != LIKED_SONGS][:limit]
+        for i, playlist in enumerate(playlists):
+            lines.append(f'{i + 1}. "{playlist["name"]}" ({playlist["tracks_total"]} tracks) - ID: {playlist["id"]}')
+        return "\n".join(lines)
+
+    def format_tracks(self, playlist_id: str, limit: int = 50, offset: int = 0) -> str:
+        lines = ["# Tracks in Playlist", ""]
+        for i, track in enumerate(self.tracks[playlist_id][offset:offset + limit]):
+            lines.append(f'{offset + i + 1}. "{track["name"]}" by {_artists(track)} ({_duration(track["duration_ms"])}) - ID: {track["id"]}')
+        return "\n".join(lines)
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "synced_at": self.synced_at,
+            "syncs": self.syncs,
+            "last_sync": self.last_sync,
+            "last_error": self.last_error,
+            "playlists": len(self.playlists),
+            "tracks": len(self.track_info),
+            "stale": len(self._stale) + int(self._list_stale),
+        }
+
+
+def mirrored_playlist_tools(tools, library: LibraryMirror):
+    """Answer getMyPlaylists/getPlaylistTracks from the mirror when it is fresh, and mark what writes change"""
+
+    def wrap(tool, run):
+        return StructuredTool(name=tool.name, description=tool.description, args_schema=tool.args_schema,
+                              coroutine=run, handle_tool_error=True)
+
+    def mirrored(tool):
+        if tool.name == "getMyPlaylists":
+            async def get_playlists(**kwargs):
+                if library.has_fresh_list():
+                    library_lookups.inc(source="mirror")
+                    return library.format_playlists(int(kwargs.get("limit") or 50))
+                library_lookups.inc(source="mcp")
+                return await tool.ainvoke(kwargs)
+            return wrap(tool, get_playlists)
+
+        if tool.name == "getPlaylistTracks":
+            async def get_tracks(**kwargs):
+                playlist_id = kwargs.get("playlistId")
+                if library.has_fresh_tracks(playlist_id):
+                    library_lookups.inc(source="mirror")
+                    return library.format_tracks(playlist_id, int(kwargs.get("limit") or 50), int(kwargs.get("offset") or 0))
+                library_lookups.inc(source="mcp")
+                return await tool.ainvoke(kwargs)
+            return wrap(tool, get_tracks)
+
+        if tool.name in ("createPlaylist", "addTracksToPlaylist"):
+            async def write(**kwargs):
+                result = await tool.ainvoke(kwargs)
+                if not is_tool_error(result):
+                    library.invalidate(kwargs.get("playlistId"))
+                return result
+            return wrap(tool, write)
+
+        return tool
+
+    return [mirrored(tool) for tool in tools]
+
+
+class SearchLibraryInput(BaseModel):
+    query: str = Field(description="A playlist name, artist or song title")
+
+
+def search_library_tool(library: LibraryMirror):
+    """A local tool that looks up playlists and saved songs in the mirror instead of paging through MCP"""
+
+    async def search_library(query: str):
+        if not library.ready:
+            return {"error": "LibraryNotSynced", "details": "The library isn't synced yet, use getMyPlaylists and getPlaylistTracks"}
+        library_lookups.inc(source="mirror")
+        found = library.search(query)
+        tracks = [{"name": track["name"], "artists": _artists(track), "id": track["id"],
+                   "in_playlists": [p["name"] for p in library.playlists_with_track(track["uri"])]}
+                  for track in found["tracks"]]
+        return json.dumps({"playlists": found["playlists"], "tracks": tracks})
+
+    return StructuredTool(
+        name="searchMyLibrary",
+        description="Find the user's own playlists by name, and songs in their playlists or liked songs by title or artist",
+        args_schema=SearchLibraryInput,
+        coroutine=search_library,
+        handle_tool_error=True,
+    )
+
+
+def format_library(playlist_info, max_chars: int = 1500) -> str:
+    """The user's playlists for the playlist agent's system prompt"""
+    lines = []
+    used = 0
+    for playlist in (playlist_info or {}).get("library", {}).get("playlists", []):
+        line = f'- "{playlist["name"]}" ({playlist["tracks"]} tracks) - ID: {playlist["id"]}'
+        if used + len(line) > max_chars:
+            break
+        lines.append(line)
+        used += len(line)
+    return "\n".join(lines)
+
+
+# shared by every graph in this process, None when LIBRARY_MIRROR=0
+library = LibraryMirror(SpotifySource(token_manager)) if LIBRARY_MIRROR else None
+
+if library is not None:
+    registry.register(CallbackGauge("agent_library_age_seconds", "Seconds since the playlist mirror last synced",
+                                    lambda: time.time() - library.synced_at if library.synced_at else 0))
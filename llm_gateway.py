@@ -0,0 +1,234 @@
+import asyncio
+import os
+import random
+import time
+import weakref
+
+from context_budget import message_tokens, provider_context_error
+from metrics import registry, CallbackGauge, Counter, Histogram
+
+
+# Provider limits, the defaults match Groq's free tier for llama-4-scout
+LLM_RPM = float(os.getenv("LLM_RPM", "30"))
+LLM_TPM = float(os.getenv("LLM_TPM", "30000"))
+# LLM calls in flight across all requests the process is serving
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0"))
+# Completion tokens reserved per call before the real usage is known
+LLM_COMPLETION_RESERVE = int(os.getenv("LLM_COMPLETION_RESERVE", "512"))
+# After this many seconds without an answer, race a second request against the first (0 disables)
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+# Secondary model used for hedges and once the primary's retries are exhausted, e.g. gpt-4o-mini
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError", "TimeoutError"}
+
+llm_latency = registry.register(Histogram("agent_llm_seconds", "LLM call latency including retries", ["model"]))
+llm_retries = registry.register(Counter("agent_llm_retries_total", "LLM calls retried", ["reason"]))
+llm_hedges = registry.register(Counter("agent_llm_hedges_total", "Hedged LLM requests by which one answered", ["winner"]))
+llm_rate_wait = registry.register(Histogram("agent_llm_rate_limit_wait_seconds", "Time LLM calls waited for the RPM/TPM limiter"))
+
+_live_limits = weakref.WeakSet()
+registry.register(CallbackGauge("agent_llm_inflight", "LLM calls in flight",
+                                lambda: sum(limits.inflight for limits in _live_limits)))
+
+
+class TokenBucket:
+    """Refills `per_minute` units a minute, callers wait until enough units are available"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        amount = min(amount, self.capacity)
+        # one waiter at a time so a large request isn't starved by small ones
+        async with self._lock:
+            self._refill()
+            while self.level < amount:
+                await asyncio.sleep((amount - self.level) / self.rate)
+                self._refill()
+            self.level -= amount
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        self._refill()
+        if self._lock.locked() or self.level < amount:
+            return False
+        self.level -= amount
+        return True
+
+    def adjust(self, amount: float):
+        """Charge (or refund) the difference once the real usage is known, the level may go negative"""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+def error_status(error: Exception):
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    return status if status is not None else getattr(response, "status_code", None)
+
+
+def is_retryable(error: Exception) -> bool:
+    return error_status(error) in RETRYABLE_STATUS or type(error).__name__ in RETRYABLE_ERRORS
+
+
+def retry_after(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimits:
+    """Limiter state shared by a gateway and every copy of it bound to different tools"""
+
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM, concurrency=LLM_CONCURRENCY):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.inflight = 0
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "fallbacks": 0, "rate_wait_seconds": 0.0}
+        _live_limits.add(self)
+
+    async def acquire(self, tokens: int):
+        start = time.perf_counter()
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+        waited = time.perf_counter() - start
+        llm_rate_wait.observe(waited)
+        self.stats["rate_wait_seconds"] += waited
+
+
+class LLMGateway:
+    """Async front door for every LLM call: rate limits, retries, hedging and fallback"""
+
+    def __init__(self, primary, fallback=None, limits=None, max_retries=LLM_MAX_RETRIES,
+                 base_delay=LLM_RETRY_BASE_DELAY, hedge_after=LLM_HEDGE_AFTER):
+        self.primary = primary
+        self.fallback = fallback
+        self.limits = limits or RateLimits()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.hedge_after = hedge_after
+
+    def bind_tools(self, tools, **kwargs):
+        """A gateway over tool-bound models that shares this one's limits"""
+        fallback = self.fallback.bind_tools(tools, **kwargs) if self.fallback is not None else None
+        return LLMGateway(self.primary.bind_tools(tools, **kwargs), fallback, self.limits,
+                          self.max_retries, self.base_delay, self.hedge_after)
+
+    async def ainvoke(self, messages):
+        estimate = sum(message_tokens(m) for m in messages) + LLM_COMPLETION_RESERVE
+        await self.limits.acquire(estimate)
+        start = time.perf_counter()
+        async with self.limits.slots:
+            self.limits.inflight += 1
+            self.limits.stats["calls"] += 1
+            try:
+                response = await self._with_retries(messages)
+            finally:
+                self.limits.inflight -= 1
+        llm_latency.observe(time.perf_counter() - start, model=_model_name(self.primary))
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage.get("total_tokens"):
+            self.limits.tokens.adjust(usage["total_tokens"] - estimate)
+        return response
+
+    async def _with_retries(self, messages):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._hedged(messages)
+            except Exception as e:
+                context_error = provider_context_error(e)
+                if context_error is not None:
+                    raise context_error from e
+                if not is_retryable(e):
+                    raise
+                if attempt == self.max_retries:
+                    if self.fallback is None:
+                        raise
+                    print(f"LLM retries exhausted ({e}), falling back to {_model_name(self.fallback)}")
+                    self.limits.stats["fallbacks"] += 1
+                    return await self.fallback.ainvoke(messages)
+                reason = "rate_limited" if error_status(e) == 429 else "server_error"
+                llm_retries.inc(reason=reason)
+                self.limits.stats["retries"] += 1
+                # full jitter keeps many waiting requests from retrying in lockstep
+                delay = retry_after(e) or random.uniform(0, self.base_delay * 2 ** attempt)
+                await asyncio.sleep(delay)
+                await self.limits.requests.acquire(1)
+
+    async def _hedged(self, messages):
+        # with astream_events both attempts would stream their tokens to the client, so no hedge
+        if not self.hedge_after or _streaming():
+            return await self.primary.ainvoke(messages)
+
+        first = asyncio.ensure_future(self.primary.ainvoke(messages))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        # hedge on the fallback if there is one, otherwise only if the RPM budget has room for a duplicate
+        hedge_model = self.fallback
+        if hedge_model is None and self.limits.requests.try_acquire(1):
+            hedge_model = self.primary
+        if hedge_model is None:
+            return await first
+
+        self.limits.stats["hedges"] += 1
+        second = asyncio.ensure_future(hedge_model.ainvoke(messages))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # both can finish in the same wakeup, an answer beats an error
+                task = next((task for task in done if task.exception() is None), None)
+                if task is None and pending:
+                    continue
+                task = task or (first if first in done else second)
+                winner = "hedge" if task is second else "primary"
+                llm_hedges.inc(winner=winner)
+                if winner == "hedge":
+                    self.limits.stats["hedge_wins"] += 1
+                return task.result()
+        finally:
+            for task in (first, second):
+                task.cancel()
+
+    def stats(self):
+        return dict(self.limits.stats, inflight=self.limits.inflight)
+
+
+def _streaming() -> bool:
+    """Whether the current run streams model tokens to a callback, as astream_events does"""
+    from langchain_core.runnables.config import ensure_config
+    from langchain_core.tracers._streaming import _StreamingCallbackHandler
+
+    callbacks = ensure_config().get("callbacks")
+    handlers = getattr(callbacks, "handlers", callbacks) or []
+    return any(isinstance(handler, _StreamingCallbackHandler) for handler in handlers)
+
+
+def _model_name(model):
+    bound = getattr(model, "bound", model)
+    return getattr(bound, "model_name", None) or getattr(bound, "model", None) or type(bound).__name__
+
+
+def fallback_model():
+    """The configured ChatOpenAI fallback, or None"""
+    if not LLM_FALLBACK_MODEL or not os.getenv("OPENAI_API_KEY"):
+        return None
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=LLM_FALLBACK_MODEL)
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import time
+import weakref
+from collections import OrderedDict
+
+
+def is_tool_error(result) -> bool:
+    """mcp_use tools return a dict with an "error" key instead of raising"""
+    return isinstance(result, dict) and "error" in result
+
+
+def config_hash(config_path: str) -> str:
+    """Hash the contents of an MCP config file, so an edited config gets fresh tools"""
+    with open(config_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class PooledClient:
+    """A live MCPClient together with the LangChain tools bound to its sessions"""
+
+    def __init__(self, client, tools, loop):
+        self.client = client
+        self.tools = tools
+        self.loop = loop  # MCP sessions only work on the event loop that opened them
+        self.created_at = time.time()
+
+    def is_healthy(self) -> bool:
+        sessions = self.client.get_all_active_sessions()
+        return bool(sessions) and all(session.is_connected for session in sessions.values())
+
+
+class MCPToolRegistry:
+    """Process-wide cache of MCP tool discovery and a small pool of live MCP sessions.
+
+    Tool schemas are discovered once per config file contents. Sessions are kept
+    open between graph builds, reconnected when they drop, and the least recently
+    used client is closed when the pool is full.
+    """
+
+    def __init__(self, pool_size: int = 2):
+        self.pool_size = pool_size
+        self._pool = OrderedDict()  # config hash -> PooledClient
+        self._schemas = {}          # config hash -> {server name: [mcp Tool]}
+        self._locks = weakref.WeakKeyDictionary()  # event loop -> asyncio.Lock
+        self.build_times = {"cold": [], "warm": []}
+
+    def _lock(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._locks:
+            self._locks[loop] = asyncio.Lock()
+        return self._locks[loop]
+
+    def is_warm(self, config_path: str = "mcp_config.json") -> bool:
+        """True if get_tools would reuse a live client instead of spawning the server"""
+        entry = self._pool.get(config_hash(config_path))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return entry is not None and entry.loop is loop and entry.is_healthy()
+
+    async def get_tools(self, config_path: str = "mcp_config.json"):
+        key = config_hash(config_path)
+        loop = asyncio.get_running_loop()
+        async with self._lock():
+            entry = self._pool.get(key)
+            if entry is not None and entry.loop is not loop:
+                # e.g. a new asyncio.run() per script rerun, the old sessions can't be used here
+                self._pool.pop(key)
+                entry = None
+
+            if entry is not None and not entry.is_healthy():
+                try:
+                    await self._reconnect(entry)
+                except Exception as e:
+                    print(f"MCP reconnect failed, starting a new client: {e}")
+                    self._pool.pop(key)
+                    await self._close(entry)
+                    entry = None
+
+            if entry is None:
+                entry = await self._connect(config_path, key, loop)
+                self._pool[key] = entry
+                await self._evict()
+
+            self._pool.move_to_end(key)
+            return entry.tools
+
+    async def _connect(self, config_path, key, loop):
+        # mcp_use is slow to import, only pay for it when a session is actually opened
+        from mcp_use.client import MCPClient
+        from mcp_use.adapters.langchain_adapter import LangChainAdapter
+
+        client = MCPClient.from_config_file(config_path)
+        adapter = LangChainAdapter()
+        schemas = self._schemas.get(key)
+        if schemas is None:
+            tools = await adapter.create_tools(client)
+            self._schemas[key] = {
+                name: list(session.connector.tools)
+                for name, session in client.get_all_active_sessions().items()
+            }
+        else:
+            # discovery already ran for this config, bind the cached schemas to the new sessions
+            await client.create_all_sessions()
+            tools = []
+            for name, session in client.get_all_active_sessions().items():
+                for mcp_tool in schemas.get(name, []):
+                    converted = adapter._convert_tool(mcp_tool, session.connector)
+                    if converted is not None:
+                        tools.append(converted)
+        return PooledClient(client, tools, loop)
+
+    async def _reconnect(self, entry):
+        # reconnecting in place keeps the existing tools valid, they hold the connector objects
+        for name, session in entry.client.get_all_active_sessions().items():
+            if not session.is_connected:
+                await self._restart_session(name, session)
+
+    async def _restart_session(self, name, session):
+        print(f"Reconnecting MCP session '{name}'")
+        # once the server has died the connector already counts as disconnected, so disconnect()
+        # is a no-op and the old session would be reused without the initialize handshake
+        await session.connector._cleanup_resources()
+        await session.connect()
+        await session.initialize()
+
+    async def check_health(self, ping_timeout: float = 5.0):
+        """Ping every live session on this loop, reconnect the ones that died; returns name -> status"""
+        status = {}
+        loop = asyncio.get_running_loop()
+        async with self._lock():
+            for entry in self._pool.values():
+                if entry.loop is not loop:
+                    continue
+                for name, session in entry.client.get_all_active_sessions().items():
+                    try:
+                        if not session.is_connected:
+                            raise ConnectionError("session is disconnected")
+                        await asyncio.wait_for(session.connector.client_session.send_ping(), ping_timeout)
+                        status[name] = "ok"
+                        continue
+                    except Exception as e:
+                        print(f"MCP session '{name}' failed its health check: {e}")
+                    try:
+                        # a stdio session reconnects by starting a fresh server process
+                        await self._restart_session(name, session)
+                        status[name] = "restarted"
+                    except Exception as e:
+                        print(f"Restarting MCP session '{name}' failed: {e}")
+                        status[name] = "down"
+        return status
+
+    async def _evict(self):
+        while len(self._pool) > self.pool_size:
+            _, entry = self._pool.popitem(last=False)
+            await self._close(entry)
+
+    async def _close(self, entry):
+        if entry.loop is not asyncio.get_running_loop():
+            return
+        try:
+            await entry.client.close_all_sessions()
+        except Exception as e:
+            print(f"Error closing MCP sessions: {e}")
+
+    async def close_all(self):
+        while self._pool:
+            _, entry = self._pool.popitem()
+            await self._close(entry)
+
+    def record_build(self, warm: bool, seconds: float):
+        self.build_times["warm" if warm else "cold"].append(seconds)
+
+    def stats(self):
+        def summary(times):
+            if not times:
+                return {"count": 0}
+            return {"count": len(times), "mean_ms": 1000 * sum(times) / len(times), "max_ms": 1000 * max(times)}
+
+        return {
+            "pool_size": len(self._pool),
+            "cached_configs": len(self._schemas),
+            "cold_builds": summary(self.build_times["cold"]),
+            "warm_builds": summary(self.build_times["warm"]),
+        }
+
+
+# shared by every graph build in this process
+tool_registry = MCPToolRegistry()
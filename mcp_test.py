@@ -1,34 +1,49 @@
-import subprocess
+import asyncio
+import json
 import os
+import sys
 
-# Set environment variables
-env = os.environ.copy()
-env["SPOTIFY_CLIENT_ID"] = "c86f7613eb3c42318201c2e24625ab71"
-env["SPOTIFY_CLIENT_SECRET"] = "84ddcc1d0cd046d4be5122a8f9e453c0"
-env["SPOTIFY_REDIRECT_URI"] = "http://127.0.0.1:8090/callback"
-
-# Command and arguments
-cmd = [
-    "--directory",
-    "/home/harshil0216/spotify-mcp",
-    "run",
-    "spotify-mcp"
-]
-
-# Run the command
-process = subprocess.Popen(
-    cmd,
-    env=env,
-    stdout=subprocess.PIPE,
-    stderr=subprocess.PIPE,
-    text=True
-)
-
-# Print output in real-time
-for line in process.stdout:
-    print(line, end='')
-
-for line in process.stderr:
-    print(line, end='')
-
-process.wait()
\ No newline at end of file
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from supervisor import ManagedProcess, free_port
+
+# Runs the Spotify MCP server from mcp_config.json on its own and prints its output,
+# e.g. `python mcp_test.py` or `python mcp_test.py other_config.json spotify`;
+# --free-port first stops whatever process holds the OAuth callback port
+free_oauth_port = "--free-port" in sys.argv
+args = [arg for arg in sys.argv[1:] if arg != "--free-port"]
+config_path = args[0] if args else "mcp_config.json"
+server_name = args[1] if len(args) > 1 else None
+
+
+async def main():
+    with open(config_path) as f:
+        servers = json.load(f)["mcpServers"]
+    name = server_name or next(iter(servers))
+    server = servers[name]
+
+    # credentials come from .env, the config can add or override variables per server
+    env = os.environ.copy()
+    env.setdefault("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8090/callback")
+    env.update(server.get("env", {}))
+
+    # an earlier server that didn't shut down still holds the OAuth callback port
+    if free_oauth_port:
+        await free_port(8090)
+
+    process = await ManagedProcess(server["command"], server.get("args", []), env=env, name=name).start()
+    print(f"Started {name} (pid {process.health()['pid']}), Ctrl+C to stop")
+    try:
+        await process.wait()
+    finally:
+        await process.stop()
+        print(process.health())
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
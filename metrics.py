@@ -0,0 +1,266 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from langchain_core.tools import StructuredTool
+
+
+# Set TRACE_FILE to append one JSON line per request for offline analysis
+TRACE_FILE = os.getenv("TRACE_FILE")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50)
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{str(value).replace(chr(34), chr(39))}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (bucket_counts, total, count) in sorted(self._series.items()):
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                labels = _label_text(self.labelnames + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _label_text(self.labelnames + ("le",), key + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {count}")
+        return lines
+
+
+class CallbackGauge:
+    """A gauge read from a function when /metrics is scraped"""
+
+    def __init__(self, name, help, fn):
+        self.name, self.help, self.fn = name, help, fn
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.fn()}"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_latency = registry.register(Histogram("agent_request_seconds", "End-to-end latency of one chat turn"))
+request_hops = registry.register(Histogram("agent_request_hops", "Graph nodes executed per chat turn", buckets=COUNT_BUCKETS))
+request_mcp_calls = registry.register(Histogram("agent_request_mcp_calls", "MCP tool calls made per chat turn", buckets=COUNT_BUCKETS))
+graph_overhead = registry.register(Histogram("agent_graph_overhead_seconds", "Turn time not spent inside any node"))
+node_latency = registry.register(Histogram("agent_node_seconds", "Wall time per graph node execution", ["node"]))
+llm_tokens = registry.register(Counter("agent_llm_tokens_total", "LLM tokens used", ["node", "kind"]))
+tool_latency = registry.register(Histogram("agent_tool_seconds", "MCP tool round trip time", ["tool"]))
+tool_payload = registry.register(Histogram("agent_tool_payload_bytes", "Size of MCP tool arguments and results", ["tool", "direction"], buckets=SIZE_BUCKETS))
+tool_errors = registry.register(Counter("agent_tool_errors_total", "MCP tool calls that returned an error", ["tool"]))
+
+
+class RequestTrace:
+    """Timings collected for one chat turn"""
+
+    def __init__(self, thread_id=None):
+        self.request_id = uuid.uuid4().hex
+        self.thread_id = thread_id
+        self.started = time.time()
+        self.spans = []  # {"kind": "node"/"tool", "name", "seconds", ...}
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.seconds = None
+        self._lock = threading.Lock()
+
+    def add_span(self, **span):
+        with self._lock:
+            self.spans.append(span)
+
+    @property
+    def hops(self):
+        return sum(1 for span in self.spans if span["kind"] == "node")
+
+    @property
+    def mcp_calls(self):
+        return sum(1 for span in self.spans if span["kind"] == "tool")
+
+    def summary(self) -> str:
+        """One line breakdown of where the turn spent its time"""
+        totals = {}
+        for span in self.spans:
+            key = span["name"] if span["kind"] == "node" else f"tool:{span['name']}"
+            totals[key] = totals.get(key, 0.0) + span["seconds"]
+        parts = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in totals.items())
+        return (f"{(self.seconds or 0) * 1000:.0f}ms, {self.hops} hops, "
+                f"{self.tokens['prompt']}+{self.tokens['completion']} tokens ({parts})")
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            "thread_id": self.thread_id,
+            "started": self.started,
+            "seconds": self.seconds,
+            "hops": self.hops,
+            "mcp_calls": self.mcp_calls,
+            "tokens": self.tokens,
+            "spans": self.spans,
+        }
+
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def trace_request(thread_id=None):
+    """Collect a RequestTrace for everything the graph does inside this block"""
+    trace = RequestTrace(thread_id)
+    token = current_trace.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.seconds = time.perf_counter() - start
+        try:
+            current_trace.reset(token)
+        except ValueError:
+            # a streaming response can be closed from a different context than it started in
+            current_trace.set(None)
+        request_latency.observe(trace.seconds)
+        request_hops.observe(trace.hops)
+        request_mcp_calls.observe(trace.mcp_calls)
+        node_seconds = sum(span["seconds"] for span in trace.spans if span["kind"] == "node")
+        graph_overhead.observe(max(0.0, trace.seconds - node_seconds))
+        if TRACE_FILE:
+            with open(TRACE_FILE, "a") as f:
+                f.write(json.dumps(trace.to_dict()) + "\n")
+
+
+def _record_node(name, seconds, update):
+    prompt = completion = 0
+    for message in (update or {}).get("messages", []) if isinstance(update, dict) else []:
+        usage = getattr(message, "usage_metadata", None) or {}
+        prompt += usage.get("input_tokens", 0)
+        completion += usage.get("output_tokens", 0)
+    node_latency.observe(seconds, node=name)
+    if prompt or completion:
+        llm_tokens.inc(prompt, node=name, kind="prompt")
+        llm_tokens.inc(completion, node=name, kind="completion")
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_span(kind="node", name=name, seconds=seconds, prompt_tokens=prompt, completion_tokens=completion)
+        trace.tokens["prompt"] += prompt
+        trace.tokens["completion"] += completion
+
+
+def instrument_node(name, fn):
+    """Wrap a graph node to record its wall time and the tokens its LLM call used"""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_node(state):
+            start = time.perf_counter()
+            update = await fn(state)
+            _record_node(name, time.perf_counter() - start, update)
+            return update
+        return async_node
+
+    @functools.wraps(fn)
+    def node(state):
+        start = time.perf_counter()
+        update = fn(state)
+        _record_node(name, time.perf_counter() - start, update)
+        return update
+    return node
+
+
+def _size(value):
+    return len(value) if isinstance(value, str) else len(json.dumps(value, default=str))
+
+
+def _record_tool(name, seconds, kwargs, result):
+    is_error = isinstance(result, dict) and "error" in result
+    tool_latency.observe(seconds, tool=name)
+    tool_payload.observe(_size(kwargs), tool=name, direction="request")
+    tool_payload.observe(_size(result), tool=name, direction="response")
+    if is_error:
+        tool_errors.inc(tool=name)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_span(kind="tool", name=name, seconds=seconds,
+                       request_bytes=_size(kwargs), response_bytes=_size(result), error=is_error)
+
+
+def instrument_tool(tool):
+    """Wrap an MCP tool to record its round trip time and payload sizes"""
+
+    async def run(**kwargs):
+        start = time.perf_counter()
+        result = None
+        try:
+            result = await tool.ainvoke(kwargs)
+        except Exception as e:
+            result = {"error": str(e)}
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            _record_tool(tool.name, seconds, kwargs, result)
+        return result
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=run,
+        handle_tool_error=True,
+    )
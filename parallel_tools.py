@@ -0,0 +1,60 @@
+import asyncio
+import json
+import os
+from typing import List
+
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+
+
+# Let one model turn emit many tool calls, which ToolNode already runs concurrently
+PARALLEL_TOOLS = os.getenv("PARALLEL_TOOLS", "1") == "1"
+# Upper bound on MCP tool calls in flight at once for a graph
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+
+
+def limit_concurrency(tool, semaphore: asyncio.Semaphore):
+    """Wrap a tool so at most the semaphore's value of its calls run at once"""
+
+    async def run(**kwargs):
+        async with semaphore:
+            return await tool.ainvoke(kwargs)
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=run,
+        handle_tool_error=True,
+    )
+
+
+class SearchManyInput(BaseModel):
+    queries: List[str] = Field(description='Songs or artists to look up, e.g. ["Blinding Lights The Weeknd", "Levitating Dua Lipa"]')
+    type: str = Field(default="track", description="track, album, artist or playlist")
+    limit: int = Field(default=1, description="Results per query, 1 is enough to resolve a song to its ID")
+
+
+def search_many_tool(search_tool):
+    """A bulk tool that resolves a list of song/artist strings in one step.
+
+    Each query goes through search_tool, which is already cached and
+    concurrency-limited, so the searches run in parallel up to TOOL_CONCURRENCY.
+    """
+
+    async def search_many(queries: List[str], type: str = "track", limit: int = 1):
+        results = await asyncio.gather(*[
+            search_tool.ainvoke({"query": query, "type": type, "limit": limit}) for query in queries
+        ])
+        return json.dumps([
+            {"query": query, "type": type, "limit": limit, "result": result}
+            for query, result in zip(queries, results)
+        ])
+
+    return StructuredTool(
+        name="searchSpotifyMany",
+        description="Search Spotify for many songs, albums or artists at once and return the results for each query",
+        args_schema=SearchManyInput,
+        coroutine=search_many,
+        handle_tool_error=True,
+    )
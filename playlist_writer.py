@@ -0,0 +1,167 @@
+import asyncio
+import json
+import random
+import re
+from typing import List
+
+from langchain_core.tools import StructuredTool, ToolException
+from pydantic import BaseModel, Field
+
+from mcp_registry import is_tool_error
+
+
+# Spotify accepts at most 100 items per "add items to playlist" request
+MAX_TRACKS_PER_REQUEST = 100
+PLAYLIST_PAGE_SIZE = 50
+
+TRACK_ID_PATTERNS = [
+    re.compile(r"spotify:track:([A-Za-z0-9]{22})"),
+    re.compile(r"open\.spotify\.com/track/([A-Za-z0-9]{22})"),
+    re.compile(r"\bID: ([A-Za-z0-9]{22})\b"),
+    re.compile(r'"id":\s*"([A-Za-z0-9]{22})"'),
+]
+
+
+def extract_track_ids(content) -> List[str]:
+    """Track IDs from a tool result, in order of appearance"""
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    found = []
+    for pattern in TRACK_ID_PATTERNS:
+        found.extend((match.start(), match.group(1)) for match in pattern.finditer(content))
+    return list(dict.fromkeys(track_id for _, track_id in sorted(found)))
+
+
+def normalize_track_id(track: str) -> str:
+    """Accept a bare ID, a spotify:track: URI or an open.spotify.com link"""
+    ids = extract_track_ids(track)
+    return ids[0] if ids else track.strip()
+
+
+def is_rate_limited(result) -> bool:
+    text = json.dumps(result) if isinstance(result, dict) else str(result)
+    return "429" in text or "rate limit" in text.lower() or "too many requests" in text.lower()
+
+
+def retry_after_seconds(result):
+    match = re.search(r"retry[- ]after[^0-9]*(\d+)", json.dumps(result) if isinstance(result, dict) else str(result), re.I)
+    return float(match.group(1)) if match else None
+
+
+async def call_with_backoff(tool, args, max_retries: int = 5, base_delay: float = 0.5):
+    """Invoke a tool, retrying with jittered exponential backoff while Spotify answers 429"""
+    for attempt in range(max_retries + 1):
+        try:
+            result = await tool.ainvoke(args)
+        except Exception as e:
+            result = {"error": type(e).__name__, "details": str(e)}
+        if not (is_tool_error(result) and is_rate_limited(result)) or attempt == max_retries:
+            return result
+        delay = retry_after_seconds(result) or base_delay * 2 ** attempt
+        await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+
+# One numbered line per playlist item in the MCP server's text listing, with or without an ID
+TEXT_ITEM_LINE = re.compile(r"^\s*\d+\.\s", re.M)
+
+
+def playlist_page(result, offset: int):
+    """(track IDs, whether more pages follow) for one getPlaylistTracks result.
+
+    Whether to go on is decided from the page itself (next/total, or its item
+    count), not from the IDs found, which skip repeats, local files and
+    unavailable tracks.
+    """
+    payload = result
+    if isinstance(result, str):
+        try:
+            payload = json.loads(result)
+        except ValueError:
+            payload = None
+    items = payload.get("items") if isinstance(payload, dict) else payload
+    if isinstance(items, list):
+        # Web API paging object: only the tracks' own IDs, not their albums' or artists'
+        tracks = [item["track"] if isinstance(item, dict) and isinstance(item.get("track"), dict) else item for item in items]
+        ids = [track["id"] for track in tracks if isinstance(track, dict) and track.get("id")]
+        if isinstance(payload, dict) and "next" in payload:
+            return ids, bool(payload["next"])
+        if isinstance(payload, dict) and payload.get("total") is not None:
+            return ids, offset + len(items) < payload["total"]
+        return ids, len(items) >= PLAYLIST_PAGE_SIZE
+    text = result if isinstance(result, str) else json.dumps(result)
+    return extract_track_ids(text), len(TEXT_ITEM_LINE.findall(text)) >= PLAYLIST_PAGE_SIZE
+
+
+async def existing_track_ids(get_tracks_tool, playlist_id: str, max_pages: int = 200):
+    """Set index of the track IDs already in a playlist, built from paged getPlaylistTracks calls.
+
+    Returns (ids, complete). Without an offset argument only the first page can
+    be read, so complete is False when that page was full.
+    """
+    pages_supported = "offset" in getattr(get_tracks_tool.args_schema, "model_fields", {})
+    existing = set()
+    for page in range(max_pages):
+        args = {"playlistId": playlist_id, "limit": PLAYLIST_PAGE_SIZE}
+        if pages_supported:
+            args["offset"] = page * PLAYLIST_PAGE_SIZE
+        result = await call_with_backoff(get_tracks_tool, args)
+        if is_tool_error(result):
+            # ToolException reaches the model as the tool result, anything else would end the turn
+            raise ToolException(f"Could not read playlist {playlist_id}: {result.get('details', result)}")
+        page_ids, more = playlist_page(result, page * PLAYLIST_PAGE_SIZE)
+        existing.update(page_ids)
+        if not more:
+            return existing, True
+        if not pages_supported:
+            return existing, False
+    return existing, False
+
+
+async def write_tracks(add_tool, get_tracks_tool, playlist_id: str, track_ids: List[str]) -> dict:
+    """Add tracks that aren't already in the playlist, in as few API-sized requests as possible"""
+    wanted = list(dict.fromkeys(normalize_track_id(track) for track in track_ids if track))
+    existing, complete = await existing_track_ids(get_tracks_tool, playlist_id)
+    new_ids = [track_id for track_id in wanted if track_id not in existing]
+
+    added, requests_made, errors = 0, 0, []
+    for start in range(0, len(new_ids), MAX_TRACKS_PER_REQUEST):
+        chunk = new_ids[start:start + MAX_TRACKS_PER_REQUEST]
+        result = await call_with_backoff(add_tool, {"playlistId": playlist_id, "trackIds": chunk})
+        requests_made += 1
+        if is_tool_error(result):
+            errors.append(result.get("details", str(result)))
+        else:
+            added += len(chunk)
+
+    summary = {
+        "playlistId": playlist_id,
+        "requested": len(track_ids),
+        "added": added,
+        "skipped_duplicates": len(wanted) - len(new_ids) + (len(track_ids) - len(wanted)),
+        "write_requests": requests_made,
+        "errors": errors,
+    }
+    if not complete:
+        summary["duplicate_check"] = f"only the first {len(existing)} tracks of the playlist were checked for duplicates"
+    return summary
+
+
+class AddTracksInput(BaseModel):
+    playlistId: str = Field(description="The Spotify ID of the playlist")
+    trackIds: List[str] = Field(description="All track IDs (or spotify:track: URIs) to add, in one call")
+
+
+def bulk_add_tracks_tool(add_tool, get_tracks_tool):
+    """Replace addTracksToPlaylist with a deduplicating, chunked writer under the same name"""
+
+    async def add_tracks(playlistId: str, trackIds: List[str]):
+        summary = await write_tracks(add_tool, get_tracks_tool, playlistId, trackIds)
+        return json.dumps(summary)
+
+    return StructuredTool(
+        name=add_tool.name,
+        description="Add tracks to a playlist. Pass every track in a single call, tracks already in the playlist are skipped",
+        args_schema=AddTracksInput,
+        coroutine=add_tracks,
+        handle_tool_error=True,
+    )
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from metrics import registry, CallbackGauge
+from routing import score_request
+
+
+# Opt-in: serve repeated turns and agent LLM calls from memory
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "0") == "1"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_SIZE = int(os.getenv("RESPONSE_CACHE_MAX_SIZE", "1000"))
+# Cosine similarity needed for a near-duplicate prompt to count as a hit, 0 turns the lookup off
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+EMBEDDING_DIM = 512
+
+# Tools with side effects, a turn or model response that calls them is never cached
+WRITE_TOOLS = {"createPlaylist", "addTracksToPlaylist"}
+
+# Words that make a prompt depend on earlier turns ("add that one", "more like those")
+CONTEXT_WORDS = re.compile(r"\b(that|those|these|it|them|this|same|more|again|another|also|else|previous|earlier|last|above)\b")
+
+
+# Words a near-duplicate prompt may add, drop or reword; every other word (artists, titles, years) must match
+FILLER_WORDS = {
+    "a", "an", "the", "me", "my", "i", "you", "can", "could", "would", "will", "please", "pls", "thanks", "thank",
+    "hey", "hi", "hello", "just", "some", "any", "for", "to", "of", "on", "in", "up", "and", "want",
+    "find", "search", "look", "show", "give", "get", "list", "play", "what", "are", "is", "spotify",
+    "song", "songs", "track", "tracks", "music",
+}
+
+
+def normalize_prompt(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s']", " ", str(text).lower()).split())
+
+
+def content_words(text: str) -> list:
+    return [word for word in normalize_prompt(text).split() if word not in FILLER_WORDS]
+
+
+def prompt_anchor(text: str) -> str:
+    """The words a similar prompt has to share exactly, so "Muse" never matches "Mase" or 1965 matches 1969"""
+    return " ".join(sorted(set(content_words(text))))
+
+
+def is_context_dependent(text: str) -> bool:
+    return bool(CONTEXT_WORDS.search(normalize_prompt(text)))
+
+
+def embed(text: str):
+    """Hashed bag of words and character trigrams of the prompt's content words, L2 normalized, so no model is needed"""
+    import numpy as np
+
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    normalized = " ".join(content_words(text))
+    padded = f" {normalized} "
+    trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+    # words weigh more than trigrams, the sign bit keeps hash collisions from only adding up
+    for features, weight in ((normalized.split(), 2.0), (trigrams, 1.0)):
+        for feature in features:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            vector[digest % EMBEDDING_DIM] += weight if digest >> 63 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ResponseCache:
+    """Exact-match LRU cache with a TTL and a bounded cosine-similarity index over prompts"""
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_size: int = RESPONSE_CACHE_MAX_SIZE,
+                 similarity: float = RESPONSE_CACHE_SIMILARITY):
+        # NumPy is only imported when the (opt-in) cache is created
+        import numpy as np
+
+        self.ttl = ttl
+        self.max_size = max_size
+        self.similarity = similarity
+        self._entries = OrderedDict()  # key -> (stored_at, value, elapsed, row)
+        # one row per entry that has a prompt embedding, rows are reused after eviction
+        self._vectors = np.zeros((max_size, EMBEDDING_DIM), dtype=np.float32)
+        self._row_keys = [None] * max_size
+        self._row_scopes = [None] * max_size
+        self._free_rows = list(range(max_size - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.stats_by_scope = {}
+
+    def _stats(self, scope):
+        return self.stats_by_scope.setdefault(scope, {"hits": 0, "semantic_hits": 0, "misses": 0, "saved_seconds": 0.0})
+
+    def _drop(self, key):
+        _, _, _, row = self._entries.pop(key)
+        if row is not None:
+            self._row_keys[row] = None
+            self._row_scopes[row] = None
+            self._free_rows.append(row)
+
+    def _nearest(self, scope, prompt):
+        import numpy as np
+
+        # only prompts with exactly the same content words are compared, similarity then
+        # decides whether their order and phrasing are close enough
+        wanted = (scope, prompt_anchor(prompt))
+        rows = [row for row, row_scope in enumerate(self._row_scopes) if row_scope == wanted]
+        if not rows:
+            return None
+        scores = self._vectors[rows] @ embed(prompt)
+        best = int(np.argmax(scores))
+        return self._row_keys[rows[best]] if scores[best] >= self.similarity else None
+
+    def get(self, scope: str, key: str, prompt: str = None):
+        """The cached value for this key, or for the most similar prompt in the same scope"""
+        with self._lock:
+            stats = self._stats(scope)
+            semantic = False
+            if key not in self._entries and prompt and self.similarity:
+                key = self._nearest(scope, prompt)
+                semantic = key is not None
+            entry = self._entries.get(key) if key is not None else None
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            stats["hits"] += 1
+            stats["semantic_hits"] += semantic
+            stats["saved_seconds"] += entry[2]
+            return entry[1]
+
+    def put(self, scope: str, key: str, value, elapsed: float, prompt: str = None):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            while len(self._entries) >= self.max_size:
+                self._drop(next(iter(self._entries)))
+            row = None
+            if prompt and self.similarity:
+                row = self._free_rows.pop()
+                self._vectors[row] = embed(prompt)
+                self._row_keys[row] = key
+                self._row_scopes[row] = (scope, prompt_anchor(prompt))
+            self._entries[key] = (time.time(), value, elapsed, row)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            hits = sum(s["hits"] for s in self.stats_by_scope.values())
+            misses = sum(s["misses"] for s in self.stats_by_scope.values())
+            return {
+                "size": len(self._entries),
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+                "saved_seconds": sum(s["saved_seconds"] for s in self.stats_by_scope.values()),
+                "scopes": {scope: dict(s) for scope, s in self.stats_by_scope.items()},
+            }
+
+
+def _digest(parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _current_turn(messages):
+    """Messages from the last user message on, the part of the context a cached response depends on"""
+    last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=None)
+    return (messages[last_human:], messages[last_human].content) if last_human is not None else ([], None)
+
+
+def _writes(message) -> bool:
+    return any(call["name"] in WRITE_TOOLS for call in getattr(message, "tool_calls", None) or [])
+
+
+def _fresh_copy(message):
+    """A cached response with new message and tool call ids, so it can be appended to another thread"""
+    copy = message.model_copy(deep=True)
+    copy.id = None
+    # no model call streams it, stream_our_graph sends its content when the node ends
+    copy.response_metadata["cache_hit"] = True
+    # and no tokens were spent on it, the node metrics would count the original call's usage again
+    copy.usage_metadata = None
+    for call in copy.tool_calls:
+        call["id"] = f"call_{uuid.uuid4().hex[:24]}"
+    return copy
+
+
+async def cached_ainvoke(cache, scope: str, llm, messages):
+    """Invoke an agent's model, reusing its earlier response to the same turn.
+
+    The key covers the system prompt and the current turn (user message, tool
+    calls and results so far). Earlier turns are left out so repeated requests
+    hit across threads, which is why prompts that refer back to them skip the
+    cache. Similar prompts only match on the first call of a turn.
+    """
+    system = messages[0].content if messages and isinstance(messages[0], SystemMessage) else ""
+    turn, prompt = _current_turn(messages)
+    if cache is None or prompt is None or is_context_dependent(prompt):
+        return await llm.ainvoke(messages)
+
+    # tool calls are keyed by name and arguments, their ids are random per call
+    key = scope + ":" + _digest([system, [normalize_prompt(prompt)] + [
+        [m.type, m.content, [[call["name"], call["args"]] for call in getattr(m, "tool_calls", None) or []]]
+        for m in turn[1:]
+    ]])
+    first_call = len(turn) == 1
+    cached = cache.get(scope, key, prompt if first_call else None)
+    if cached is not None:
+        return _fresh_copy(cached)
+
+    start = time.perf_counter()
+    response = await llm.ainvoke(messages)
+    if not _writes(response):
+        cache.put(scope, key, response, time.perf_counter() - start, prompt if first_call else None)
+    return response
+
+
+def turn_key(message: str) -> str:
+    return "turn:" + normalize_prompt(message)
+
+
+def cacheable_turn(message: str) -> bool:
+    """Whole turns are only cached for self-contained requests that can't be playlist changes"""
+    return score_request(message)["playlist"] == 0 and not is_context_dependent(message)
+
+
+def lookup_turn(cache, message: str):
+    """The answer given to an earlier identical or similar request, or None"""
+    if cache is None or not cacheable_turn(message):
+        return None
+    return cache.get("turn", turn_key(message), message)
+
+
+def store_turn(cache, message: str, messages, elapsed: float):
+    """Remember a finished turn's answer, unless any step of it wrote to a playlist"""
+    if cache is None or not cacheable_turn(message):
+        return
+    turn, _ = _current_turn(messages)
+    if any(_writes(m) for m in turn) or not turn or not isinstance(turn[-1], AIMessage) or not turn[-1].content:
+        return
+    cache.put("turn", turn_key(message), turn[-1].content, elapsed, message)
+
+
+response_cache = ResponseCache() if RESPONSE_CACHE else None
+
+if response_cache is not None:
+    registry.register(CallbackGauge("agent_response_cache_hit_ratio", "Share of cacheable turns and LLM calls served from the response cache",
+                                    lambda: response_cache.stats()["hit_ratio"]))
+    registry.register(CallbackGauge("agent_response_cache_saved_seconds", "Latency the response cache has saved so far",
+                                    lambda: response_cache.stats()["saved_seconds"]))
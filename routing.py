@@ -0,0 +1,84 @@
+import os
+import re
+
+
+# Only confident routes skip the orchestrator LLM, "llm" sends every request through it
+ROUTING_MODE = os.getenv("ROUTING_MODE", "fast")
+ROUTING_CONFIDENCE = float(os.getenv("ROUTING_CONFIDENCE", "0.6"))
+
+
+def categorize_request(message: str) -> str:
+    """Determine which agent should handle the request"""
+    message_lower = message.lower()
+
+    # Playlist-related keywords
+    playlist_keywords = ["playlist", "create", "add tracks", "add songs", "make a playlist"]
+
+    # Search-related keywords
+    search_keywords = ["search", "find", "look for", "discover", "track", "song", "artist", "album"]
+
+    if any(keyword in message_lower for keyword in playlist_keywords):
+        return "playlist"
+    elif any(keyword in message_lower for keyword in search_keywords):
+        return "search"
+    else:
+        return "general"
+
+
+# (pattern, weight) pairs, matched against the lowercased message
+PLAYLIST_PATTERNS = [
+    (r"\bplaylists?\b", 3),
+    (r"\bmix ?tape\b", 2),
+    (r"\b(add|put|save)\b.*\b(to|into|in)\b (my|the|a|that|this)\b", 2),
+    (r"\badd (tracks|songs|them|these|those|it)\b", 3),
+    (r"\b(create|make|build|generate|curate)\b", 1),
+    (r"\b(remove|delete) .*\bfrom\b", 2),
+    (r"\bmy (playlists|library)\b", 2),
+]
+
+SEARCH_PATTERNS = [
+    (r"\b(search|find|look ?up|look for)\b", 2),
+    (r"\b(tracks?|songs?|singles?|albums?|artists?|bands?|discography)\b", 1),
+    (r"\bwho (sings|sang|wrote|performs)\b", 3),
+    (r"\bwhat('s| is) the (song|track|album)\b", 3),
+    (r"\b(discover|recommend|suggest|similar to)\b", 1),
+    (r"\bby [a-z0-9]", 1),
+    (r"\b(latest|newest|top|popular) (songs?|tracks?|releases?|albums?)\b", 2),
+]
+
+
+def score_request(message: str) -> dict:
+    """Weighted keyword scores for each specialist agent"""
+    message_lower = message.lower()
+    scores = {}
+    for route, patterns in (("playlist", PLAYLIST_PATTERNS), ("search", SEARCH_PATTERNS)):
+        scores[route] = sum(weight for pattern, weight in patterns if re.search(pattern, message_lower))
+    return scores
+
+
+def classify_request(message: str):
+    """Return (task_type, confidence) for a user message.
+
+    Extends categorize_request with weighted scores: confidence is the winning
+    route's share of the total score, scaled down when the evidence is thin.
+    Requests with no signal, or a tie, are "general" with zero confidence.
+    """
+    scores = score_request(message)
+    playlist, search = scores["playlist"], scores["search"]
+    if playlist == search:
+        return "general", 0.0
+    route = "playlist" if playlist > search else "search"
+    top, total = max(playlist, search), playlist + search
+    # a single weak keyword is not enough evidence on its own
+    confidence = (top / total) * min(1.0, top / 3)
+    return route, confidence
+
+
+def fast_route(message: str, threshold: float = None):
+    """The route to take without asking the orchestrator LLM, or None if it is ambiguous"""
+    if ROUTING_MODE != "fast":
+        return None
+    route, confidence = classify_request(message)
+    if route == "general" or confidence < (ROUTING_CONFIDENCE if threshold is None else threshold):
+        return None
+    return route
@@ -0,0 +1,214 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.tools import StructuredTool
+
+from mcp_registry import is_tool_error
+from tool_projection import project_result
+
+
+def search_key(query: str, type: str = "track", limit=10) -> str:
+    """Normalize searchSpotify arguments so trivially different queries share an entry"""
+    normalized_query = " ".join(str(query).lower().split())
+    normalized_type = (type or "track").lower()
+    normalized_limit = int(limit) if limit is not None else 10
+    return f"{normalized_type}|{normalized_limit}|{normalized_query}"
+
+
+class SearchCache:
+    """LRU cache of searchSpotify results with a TTL and optional JSON persistence"""
+
+    def __init__(self, ttl: float = 3600, max_size: int = 512, path: str = None, save_delay: float = 2.0):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.path = path
+        self.save_delay = save_delay
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, result)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+        if path:
+            self.load()
+            # writes are batched, the last ones are flushed when the process exits
+            atexit.register(self.flush)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, key: str):
+        """Like get, without counting a hit or miss or refreshing the entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, key: str, result):
+        with self._lock:
+            self._entries[key] = (time.time(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            # one write per save_delay however many searches finish in between
+            if self.path and self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable search cache {self.path}: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, (stored_at, result) in stored.items():
+                if now - stored_at <= self.ttl:
+                    self._entries[key] = (stored_at, result)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        # one writer at a time, each with its own temp file, renamed into place so a crash
+        # never leaves a half-written cache
+        with self._save_lock:
+            with self._lock:
+                snapshot = dict(self._entries)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            with tempfile.NamedTemporaryFile("w", dir=directory, prefix=os.path.basename(self.path) + ".",
+                                             suffix=".tmp", delete=False) as f:
+                try:
+                    json.dump(snapshot, f)
+                except Exception:
+                    f.close()
+                    os.remove(f.name)
+                    raise
+            os.replace(f.name, self.path)
+
+    def flush(self):
+        """Write pending entries now, a failed write is reported and retried on the next put"""
+        with self._lock:
+            if self._save_timer is None:
+                return
+            self._save_timer.cancel()
+            self._save_timer = None
+        try:
+            self.save()
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not save search cache {self.path}: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def cached_search_tool(tool, cache: SearchCache, speculator=None):
+    """Wrap the MCP searchSpotify tool so repeated searches are served from the cache,
+    and searches started speculatively from the user message are picked up instead of repeated"""
+
+    async def search(**kwargs):
+        key = search_key(kwargs.get("query", ""), kwargs.get("type"), kwargs.get("limit"))
+        result = cache.get(key)
+        if result is not None:
+            return result
+        if speculator is not None:
+            result = await speculator.take(kwargs.get("query", ""), kwargs.get("type"), kwargs.get("limit"))
+        if result is None:
+            result = await tool.ainvoke(kwargs)
+        if not is_tool_error(result):
+            # put() only schedules the file write, it runs on a timer thread
+            cache.put(key, result)
+        return result
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=search,
+        handle_tool_error=True,
+    )
+
+
+def _search_entries(call, message):
+    """(args, result) pairs for the searches a tool call performed"""
+    if call["name"] == "searchSpotify":
+        yield call["args"], message.content
+    elif call["name"] == "searchSpotifyMany":
+        try:
+            entries = json.loads(message.content)
+        except (TypeError, ValueError):
+            return
+        for entry in entries:
+            if not is_tool_error(entry["result"]):
+                yield entry, entry["result"]
+
+
+def record_search_results(search_results, ai_message, tool_messages, max_entries: int = 50):
+    """Store search results from a tool step in the thread's search_results"""
+    calls = {call["id"]: call for call in getattr(ai_message, "tool_calls", None) or []}
+    updated = dict(search_results or {})
+    for message in tool_messages:
+        call = calls.get(getattr(message, "tool_call_id", None))
+        if call is None or getattr(message, "status", None) == "error":
+            continue
+        for args, result in _search_entries(call, message):
+            key = search_key(args.get("query", ""), args.get("type"), args.get("limit"))
+            updated.pop(key, None)
+            updated[key] = {"query": args.get("query"), "type": args.get("type", "track"), "result": result}
+    # keep the most recent searches, the state is checkpointed with every step
+    for key in list(updated)[:-max_entries]:
+        del updated[key]
+    return updated
+
+
+def format_search_results(search_results, max_chars: int = 2000) -> str:
+    """Summarize earlier searches for an agent's system prompt, newest first"""
+    lines = []
+    used = 0
+    for entry in reversed(list((search_results or {}).values())):
+        content = project_result("searchSpotify", entry["result"])
+        content = content if isinstance(content, str) else json.dumps(content)
+        block = f'Search "{entry["query"]}" ({entry["type"]}):\n{content}'
+        if used + len(block) > max_chars:
+            break
+        lines.append(block)
+        used += len(block)
+    return "\n\n".join(lines)
+
+
+# shared by every graph in this process, set SEARCH_CACHE_PATH to keep it across restarts
+search_cache = SearchCache(
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "3600")),
+    max_size=int(os.getenv("SEARCH_CACHE_MAX_SIZE", "512")),
+    path=os.getenv("SEARCH_CACHE_PATH"),
+)
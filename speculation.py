@@ -0,0 +1,203 @@
+import asyncio
+import os
+import re
+import time
+
+from mcp_registry import is_tool_error
+from metrics import registry, Counter, Histogram
+from search_cache import search_key
+
+
+# Start the searches a request obviously needs while the LLM is still deciding, "0" turns it off
+SPECULATION = os.getenv("SPECULATION", "1") == "1"
+# At most this many prefetched searches per request, each one is a real Spotify API call
+SPECULATION_MAX_PREFETCH = int(os.getenv("SPECULATION_MAX_PREFETCH", "10"))
+# Prefetches use searchSpotify's default limit, smaller requests are served by trimming the result
+SPECULATION_LIMIT = int(os.getenv("SPECULATION_LIMIT", "10"))
+# Predictions nobody asked for within this many seconds are dropped
+SPECULATION_TTL = float(os.getenv("SPECULATION_TTL", "60"))
+
+QUOTED = re.compile(r'["“]([^"”]{2,100})["”]')
+LEADING_VERB = re.compile(r"^(?:please\s+)?(?:find|search(?: for)?|look ?up|look for|play|get|show me|queue)\s+(?:me\s+)?", re.I)
+# "songs by X" names an artist, not a title
+GENERIC_TITLE = re.compile(r"^(?:(?:some|the|a few|any|all|more|other|latest|newest|top|popular|best|new|recent)\s+)*"
+                           r"(?:songs?|tracks?|music|hits?|albums?|singles?|stuff)$", re.I)
+TRAILING_WORDS = re.compile(r"\s+(?:please|on spotify|for me|thanks?|thank you)\s*$", re.I)
+FIELD_PREFIX = re.compile(r"\b(?:track|artist|album):")
+
+speculative_searches = Counter("agent_speculative_searches_total", "Prefetched searches by outcome: hit, wasted or failed", ("outcome",))
+speculation_saved = Histogram("agent_speculation_saved_seconds", "Search time a prefetched result saved the agent")
+for metric in (speculative_searches, speculation_saved):
+    registry.register(metric)
+
+
+def _clean(text: str) -> str:
+    return " ".join(text.strip(" \t.,!?;:'\"“”").split())
+
+
+def predict_searches(message: str, limit: int = SPECULATION_MAX_PREFETCH) -> list:
+    """searchSpotify queries a request will almost certainly need: quoted titles and "<title> by <artist>" phrases"""
+    queries = [_clean(title) for title in QUOTED.findall(message)]
+    _, _, listed = message.partition(":")
+    # a list after a colon is one song per item, otherwise the whole message is one item
+    # "and" only separates items when another "by" follows, "Simon and Garfunkel" is one artist
+    for item in re.split(r",|;|\n|\band\b(?=.*\bby\b)", listed if listed.strip() else message):
+        item = LEADING_VERB.sub("", QUOTED.sub(lambda m: m.group(1), item.strip()))
+        title, by, artist = item.rpartition(" by ")
+        if not by:
+            continue
+        title, artist = _clean(LEADING_VERB.sub("", title)), _clean(TRAILING_WORDS.sub("", _clean(artist)))
+        if not artist or len(artist.split()) > 5:
+            continue
+        if title and not GENERIC_TITLE.match(title):
+            # a quoted title found above gets its artist attached instead of being searched twice
+            queries = [query for query in queries if query.lower() != title.lower()]
+            queries.append(f"{title} {artist}")
+        else:
+            queries.append(artist)
+    unique = []
+    for query in queries:
+        if query and match_key(query) not in {match_key(q) for q in unique}:
+            unique.append(query)
+    return unique[:limit]
+
+
+def match_key(query: str, type: str = "track"):
+    """Queries that differ only in case, punctuation, "by" or field prefixes return the same songs"""
+    words = re.findall(r"\w+", FIELD_PREFIX.sub(" ", str(query).lower()))
+    return (type or "track").lower(), frozenset(word for word in words if word != "by")
+
+
+def trim_search_result(result, limit: int):
+    """The first `limit` numbered items of a searchSpotify text result, None if it isn't in that format"""
+    if not isinstance(result, str):
+        return None
+    lines = result.split("\n")
+    starts = [i for i, line in enumerate(lines) if re.match(r"\d+\. ", line)]
+    if not starts:
+        return None
+    end = starts[limit] if limit < len(starts) else len(lines)
+    return "\n".join(lines[:end]).rstrip("\n")
+
+
+class Prefetch:
+    def __init__(self, query, type, limit, task):
+        self.query = query
+        self.type = type
+        self.limit = limit
+        self.task = task
+        self.started = time.perf_counter()
+        self.finished = None
+
+
+class Speculator:
+    """Searches started from the raw user message, served if the agent then asks for the same thing.
+
+    Prefetches live outside the search cache: a result only reaches the cache
+    (and the thread) once the agent really requests it, unused ones expire
+    after SPECULATION_TTL seconds and are counted as wasted.
+    """
+
+    def __init__(self, ttl: float = SPECULATION_TTL, max_prefetch: int = SPECULATION_MAX_PREFETCH,
+                 limit: int = SPECULATION_LIMIT, max_pending: int = 256):
+        self.ttl = ttl
+        self.max_prefetch = max_prefetch
+        self.limit = limit
+        self.max_pending = max_pending
+        self.issued = 0
+        self.hits = 0
+        self.wasted = 0
+        self.failed = 0
+        self.saved_seconds = 0.0
+        self._pending = {}  # match key -> Prefetch
+        # every prefetch task until it finishes, taken and expired ones included, so close() can wait for them
+        self._tasks = set()
+
+    def prefetch(self, message: str, search_tool, cache=None):
+        """Start the predicted searches in the background and return their queries"""
+        self._expire()
+        started = []
+        for query in predict_searches(message, self.max_prefetch):
+            key = match_key(query)
+            if key in self._pending or len(self._pending) >= self.max_pending:
+                continue
+            if cache is not None and cache.peek(search_key(query, "track", self.limit)) is not None:
+                continue
+            args = {"query": query, "type": "track", "limit": self.limit}
+            prefetch = Prefetch(query, "track", self.limit, None)
+            prefetch.task = asyncio.create_task(self._run(prefetch, search_tool, args))
+            self._tasks.add(prefetch.task)
+            prefetch.task.add_done_callback(self._tasks.discard)
+            self._pending[key] = prefetch
+            self.issued += 1
+            started.append(query)
+        return started
+
+    async def _run(self, prefetch, search_tool, args):
+        try:
+            return await search_tool.ainvoke(args)
+        finally:
+            prefetch.finished = time.perf_counter()
+
+    async def take(self, query: str, type: str = "track", limit=10):
+        """A prefetched result for this search, waiting for it if it is still running; None if there is none"""
+        key = match_key(query, type)
+        prefetch = self._pending.get(key)
+        limit = int(limit) if limit is not None else 10
+        if prefetch is None or limit > prefetch.limit:
+            return None
+        del self._pending[key]
+        asked = time.perf_counter()
+        try:
+            result = await prefetch.task
+        except Exception:
+            result = None
+        if result is not None and not is_tool_error(result) and limit < prefetch.limit:
+            result = trim_search_result(result, limit)
+        if result is None or is_tool_error(result):
+            self.failed += 1
+            speculative_searches.inc(outcome="failed")
+            return None
+        # the search ran while the LLM was thinking, whatever part of it came before the ask is saved
+        saved = min(prefetch.finished, asked) - prefetch.started
+        self.hits += 1
+        self.saved_seconds += saved
+        speculative_searches.inc(outcome="hit")
+        speculation_saved.observe(saved)
+        return result
+
+    def _expire(self, now=None):
+        now = now or time.perf_counter()
+        for key, prefetch in list(self._pending.items()):
+            if now - prefetch.started > self.ttl:
+                del self._pending[key]
+                prefetch.task.cancel()
+                self.wasted += 1
+                speculative_searches.inc(outcome="wasted")
+
+    def clear(self):
+        self._expire(now=float("inf"))
+
+    async def close(self):
+        """Cancel the prefetches still running and wait for them, call it before the MCP sessions are closed"""
+        self.clear()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        settled = self.hits + self.wasted + self.failed
+        return {
+            "issued": self.issued,
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "wasted": self.wasted,
+            "failed": self.failed,
+            "hit_rate": self.hits / settled if settled else 0.0,
+            "saved_seconds": self.saved_seconds,
+        }
+
+
+# shared by every graph in this process, None when SPECULATION=0
+speculator = Speculator() if SPECULATION else None
@@ -0,0 +1,268 @@
+import asyncio
+import collections
+import os
+import signal
+import socket
+import subprocess
+import time
+
+
+# How often the watchdog pings the MCP sessions, and how long a ping may take
+MCP_HEALTH_INTERVAL = float(os.getenv("MCP_HEALTH_INTERVAL", "15"))
+MCP_PING_TIMEOUT = float(os.getenv("MCP_PING_TIMEOUT", "5"))
+
+TCP_LISTEN = "0A"
+
+
+def _listening_inodes(port: int) -> set:
+    """Socket inodes listening on the port, read from /proc/net/tcp and tcp6"""
+    inodes = set()
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table) as f:
+                next(f)  # header
+                for line in f:
+                    fields = line.split()
+                    local_port = int(fields[1].rsplit(":", 1)[1], 16)
+                    if local_port == port and fields[3] == TCP_LISTEN:
+                        inodes.add(fields[9])
+        except FileNotFoundError:
+            continue
+    return inodes
+
+
+def find_port_pids(port: int) -> list:
+    """PIDs of processes holding a listening socket on the port, without lsof or netstat"""
+    if not os.path.exists("/proc/net/tcp"):
+        return _find_port_pids_lsof(port)
+    inodes = _listening_inodes(port)
+    if not inodes:
+        return []
+    targets = {f"socket:[{inode}]" for inode in inodes}
+    pids = []
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        if int(pid) == os.getpid():
+            continue
+        try:
+            fds = os.listdir(f"/proc/{pid}/fd")
+        except (PermissionError, FileNotFoundError):
+            continue
+        for fd in fds:
+            try:
+                if os.readlink(f"/proc/{pid}/fd/{fd}") in targets:
+                    pids.append(int(pid))
+                    break
+            except OSError:
+                continue
+    return pids
+
+
+def _find_port_pids_lsof(port: int) -> list:
+    # no /proc (macOS), lsof is always there
+    try:
+        result = subprocess.run(["lsof", "-ti", f"tcp:{port}", "-sTCP:LISTEN"], capture_output=True, text=True)
+    except FileNotFoundError:
+        print(f"Can't look up processes on port {port}: no /proc and no lsof")
+        return []
+    return [int(pid) for pid in result.stdout.split()]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # a zombie child still answers signal 0
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return True
+
+
+def _sigterm(pids) -> dict:
+    outcome = {}
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+            outcome[pid] = "terminated"
+        except ProcessLookupError:
+            outcome[pid] = "gone"
+        except PermissionError:
+            outcome[pid] = "not permitted"
+    return outcome
+
+
+def _sigkill(pending, outcome: dict) -> dict:
+    for pid in pending:
+        try:
+            os.kill(pid, signal.SIGKILL)
+            outcome[pid] = "killed"
+        except ProcessLookupError:
+            pass
+    return outcome
+
+
+async def terminate_pids(pids, timeout: float = 3.0) -> dict:
+    """SIGTERM the processes, then SIGKILL whatever is still running after the timeout, without blocking the event loop"""
+    outcome = _sigterm(pids)
+    deadline = time.monotonic() + timeout
+    pending = [pid for pid, state in outcome.items() if state == "terminated"]
+    while pending and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        pending = [pid for pid in pending if _alive(pid)]
+    return _sigkill(pending, outcome)
+
+
+def port_in_use(port: int, host: str = "127.0.0.1") -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.2)
+        return sock.connect_ex((host, port)) == 0
+
+
+async def free_port(port: int, timeout: float = 3.0) -> dict:
+    """Stop every process listening on the port, gracefully first; the /proc scan runs in a thread"""
+    pids = await asyncio.to_thread(find_port_pids, port)
+    if not pids:
+        print(f"No processes found on port {port}")
+        return {}
+    print(f"Found processes on port {port}: {pids}")
+    outcome = await terminate_pids(pids, timeout)
+    for pid, state in outcome.items():
+        print(f"Process {pid} on port {port}: {state}")
+    return outcome
+
+
+class ManagedProcess:
+    """Runs a command, streams stdout and stderr as they arrive and restarts it when it crashes"""
+
+    def __init__(self, command, args=(), env=None, name=None, max_restarts: int = 5, log_lines: int = 200):
+        self.command = command
+        self.args = list(args)
+        self.env = env
+        self.name = name or os.path.basename(command)
+        self.max_restarts = max_restarts
+        self.lines = collections.deque(maxlen=log_lines)
+        self.process = None
+        self.restarts = 0
+        self.started_at = None
+        self.last_exit = None
+        self._stopping = False
+        self._task = None
+
+    async def _pump(self, stream, label):
+        # both pipes are read concurrently, so a chatty stderr can't fill its pipe and block the child
+        while True:
+            line = await stream.readline()
+            if not line:
+                return
+            text = line.decode(errors="replace").rstrip()
+            self.lines.append((label, text))
+            print(f"[{self.name} {label}] {text}")
+
+    async def _run_once(self):
+        self.process = await asyncio.create_subprocess_exec(
+            self.command, *self.args, env=self.env,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        self.started_at = time.time()
+        await asyncio.gather(self._pump(self.process.stdout, "out"), self._pump(self.process.stderr, "err"))
+        return await self.process.wait()
+
+    async def _supervise(self):
+        backoff = 1.0
+        while True:
+            self.last_exit = await self._run_once()
+            if self._stopping:
+                return
+            if self.restarts >= self.max_restarts:
+                print(f"{self.name} exited with {self.last_exit}, giving up after {self.restarts} restarts")
+                return
+            # a process that ran for a while before crashing gets restarted quickly again
+            if time.time() - self.started_at > 60:
+                backoff = 1.0
+            print(f"{self.name} exited with {self.last_exit}, restarting in {backoff:.0f}s")
+            self.restarts += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._supervise())
+        # surface a missing executable straight away instead of inside the task
+        while self.process is None and not self._task.done():
+            await asyncio.sleep(0.01)
+        if self._task.done():
+            self._task.result()
+        return self
+
+    async def wait(self):
+        if self._task is not None:
+            await self._task
+
+    async def stop(self, timeout: float = 3.0):
+        self._stopping = True
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.process.kill()
+        await self.wait()
+
+    def health(self):
+        running = self.process is not None and self.process.returncode is None
+        return {
+            "name": self.name,
+            "running": running,
+            "pid": self.process.pid if running else None,
+            "uptime": time.time() - self.started_at if running else None,
+            "restarts": self.restarts,
+            "last_exit": self.last_exit,
+        }
+
+
+class MCPWatchdog:
+    """Pings the pooled MCP sessions and reconnects (restarting the server) when one has died"""
+
+    def __init__(self, registry, interval: float = MCP_HEALTH_INTERVAL, ping_timeout: float = MCP_PING_TIMEOUT):
+        self.registry = registry
+        self.interval = interval
+        self.ping_timeout = ping_timeout
+        self.checks = 0
+        self.restarts = 0
+        self.last_status = {}
+        self._task = None
+
+    async def check(self):
+        self.checks += 1
+        self.last_status = await self.registry.check_health(self.ping_timeout)
+        self.restarts += sum(1 for status in self.last_status.values() if status == "restarted")
+        return self.last_status
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                print(f"MCP health check failed: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def health(self):
+        return {"checks": self.checks, "restarts": self.restarts, "sessions": self.last_status}
@@ -0,0 +1,65 @@
+import asyncio
+import json
+from langchain_core.tools import StructuredTool
+
+from playlist_writer import write_tracks
+
+
+def track_id(n: int) -> str:
+    return f"track{n:017d}"
+
+
+def playlist_tools(playlist, page):
+    """getPlaylistTracks and addTracksToPlaylist over an in-memory playlist, pages rendered by page()"""
+    added = []
+
+    async def getPlaylistTracks(playlistId: str, limit: int = 50, offset: int = 0) -> str:
+        """Get a list of tracks in a Spotify playlist"""
+        return page(playlist, offset, limit)
+
+    async def addTracksToPlaylist(playlistId: str, trackIds: list) -> str:
+        """Add tracks to a Spotify playlist"""
+        added.extend(trackIds)
+        return f"Successfully added {len(trackIds)} tracks"
+
+    return (StructuredTool.from_function(coroutine=addTracksToPlaylist),
+            StructuredTool.from_function(coroutine=getPlaylistTracks), added)
+
+
+def text_page(playlist, offset, limit):
+    lines = ["# Tracks in Playlist", ""]
+    for i, item in enumerate(playlist[offset:offset + limit], offset + 1):
+        lines.append(f'{i}. "Local file" by Unknown (3:00)' if item is None else f'{i}. "Track {i}" by Someone (3:00) - ID: {item}')
+    return "\n".join(lines)
+
+
+def json_page(playlist, offset, limit):
+    items = [{"track": None if item is None else {
+        "id": item, "name": "Track", "album": {"id": track_id(900)}, "artists": [{"id": track_id(901)}]}}
+        for item in playlist[offset:offset + limit]]
+    more = offset + limit < len(playlist)
+    return json.dumps({"items": items, "total": len(playlist), "next": "https://api.spotify.com/next" if more else None})
+
+
+def playlist_with_repeats():
+    """A full first page that is mostly repeats and local files, and the wanted tracks at positions 101 and 111"""
+    playlist = [track_id(n % 5) for n in range(40)] + [None] * 10
+    playlist += [track_id(n) for n in range(100, 150)] + [track_id(1000)] + [track_id(n) for n in range(200, 209)]
+    playlist += [track_id(1001)] + [track_id(n) for n in range(300, 309)]
+    assert playlist[100] == track_id(1000) and playlist[110] == track_id(1001)
+    return playlist
+
+
+def test_full_page_with_repeats_does_not_end_the_duplicate_check():
+    for page in (text_page, json_page):
+        add_tool, get_tool, added = playlist_tools(playlist_with_repeats(), page)
+        summary = asyncio.run(write_tracks(add_tool, get_tool, "p", [track_id(1000), track_id(1001), track_id(2000)]))
+        assert added == [track_id(2000)], page.__name__
+        assert summary["skipped_duplicates"] == 2
+        assert "duplicate_check" not in summary
+
+
+def test_album_and_artist_ids_are_not_playlist_tracks():
+    add_tool, get_tool, added = playlist_tools([track_id(1)], json_page)
+    asyncio.run(write_tracks(add_tool, get_tool, "p", [track_id(900), track_id(901)]))
+    assert added == [track_id(900), track_id(901)]
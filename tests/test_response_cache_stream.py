@@ -0,0 +1,70 @@
+import asyncio
+import json
+import os
+import uuid
+
+os.environ.setdefault("MCP_USE_ANONYMIZED_TELEMETRY", "false")
+os.environ.setdefault("LLM_RPM", "1000000")
+os.environ.setdefault("LLM_TPM", "1000000000")
+os.environ.setdefault("FAKE_MCP_LATENCY_MS", "0")
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+import agent_script
+from benchmarks.run_benchmarks import write_mcp_config
+from benchmarks.scripted_llm import ScriptedChatModel
+from response_cache import ResponseCache
+
+
+class StreamingScriptedModel(ScriptedChatModel):
+    """The scripted model, streamed word by word like a provider would"""
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = (await self._agenerate(messages, stop, None, **kwargs)).generations[0].message
+        tool_call_chunks = [{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                            for i, call in enumerate(message.tool_calls)]
+        for word in message.content.split(" ") if message.content else [""]:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " ", tool_call_chunks=tool_call_chunks))
+            tool_call_chunks = []
+
+
+async def streamed_answer(graph, message):
+    """The text app.py would show: the tokens of the last model call or node that streamed"""
+    text, run_id = "", None
+    async for event in agent_script.stream_our_graph(graph, message, str(uuid.uuid4())):
+        if event["type"] == "token":
+            if event["run_id"] != run_id:
+                run_id, text = event["run_id"], ""
+            text += event["content"]
+    return text.strip()
+
+
+def test_cached_agent_response_is_streamed(monkeypatch):
+    from langgraph.checkpoint.memory import InMemorySaver
+    from mcp_registry import tool_registry
+    from speculation import speculator
+
+    cache = ResponseCache()
+    monkeypatch.setattr(agent_script, "response_cache", cache)
+    # no whole-turn hits, so the second run is answered by the agents' cached LLM calls
+    monkeypatch.setattr(agent_script, "lookup_turn", lambda cache, message: None)
+    config_path = write_mcp_config(0)
+
+    async def run():
+        graph = await agent_script.create_multi_agent_graph(
+            checkpointer=InMemorySaver(), config_path=config_path, llm=StreamingScriptedModel(latency_ms=0))
+        try:
+            return [await streamed_answer(graph, "find Blinding Lights by The Weeknd") for _ in range(2)]
+        finally:
+            if speculator is not None:
+                await speculator.close()
+            await tool_registry.close_all()
+
+    try:
+        first, second = asyncio.run(run())
+    finally:
+        os.remove(config_path)
+    assert cache.stats()["scopes"]["search_agent"]["hits"] > 0
+    assert first
+    assert second == first
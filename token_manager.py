@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import time
+
+from metrics import registry, CallbackGauge
+
+
+SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
+SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
+SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8090/callback")
+SPOTIFY_SCOPES = ("playlist-modify-public playlist-modify-private user-read-playback-state user-modify-playback-state "
+                  "user-read-currently-playing playlist-read-private user-read-recently-played user-top-read user-library-read")
+# spotipy's token cache, written by refresh.py the first time you log in
+SPOTIFY_TOKEN_CACHE = os.getenv("SPOTIFY_TOKEN_CACHE", ".cache")
+# The MCP server's spotify-config.json, kept in sync so its calls use the fresh token
+SPOTIFY_MCP_CONFIG = os.getenv("SPOTIFY_MCP_CONFIG")
+# Refresh this many seconds before the token expires
+TOKEN_REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+
+
+def write_json_atomic(path: str, data: dict):
+    """Write to a temp file and rename it over the target, so readers never see half a file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def oauth(cache_handler=None, open_browser=False):
+    """SpotifyOAuth built from env credentials"""
+    from spotipy.oauth2 import SpotifyOAuth
+
+    if not SPOTIFY_CLIENT_ID or not SPOTIFY_CLIENT_SECRET:
+        raise RuntimeError("Set SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET in your .env file")
+    return SpotifyOAuth(
+        client_id=SPOTIFY_CLIENT_ID,
+        client_secret=SPOTIFY_CLIENT_SECRET,
+        redirect_uri=SPOTIFY_REDIRECT_URI,
+        scope=SPOTIFY_SCOPES,
+        cache_handler=cache_handler,
+        cache_path=SPOTIFY_TOKEN_CACHE if cache_handler is None else None,
+        open_browser=open_browser,
+    )
+
+
+class SpotifyTokenManager:
+    """Keeps the Spotify access token fresh in the background.
+
+    The token is read from spotipy's cache file and refreshed with the refresh
+    token TOKEN_REFRESH_MARGIN seconds before it expires. Fresh tokens are
+    written atomically to the cache and to the MCP server's config, so the
+    server never makes a call with an expired token and other processes
+    sharing the files pick it up.
+    """
+
+    def __init__(self, cache_path=SPOTIFY_TOKEN_CACHE, mcp_config_path=SPOTIFY_MCP_CONFIG, margin=TOKEN_REFRESH_MARGIN):
+        self.cache_path = cache_path
+        self.mcp_config_path = mcp_config_path
+        self.margin = margin
+        self.token = None
+        self._mtime = None
+        self.last_refresh = None
+        self.last_error = None
+        self.refreshes = 0
+        self.failures = 0
+        self._task = None
+        self._lock = asyncio.Lock()
+
+    def load(self):
+        """Reload the cache file if it changed, another process may have refreshed already"""
+        try:
+            mtime = os.path.getmtime(self.cache_path)
+        except OSError:
+            return self.token
+        if mtime != self._mtime:
+            try:
+                with open(self.cache_path) as f:
+                    self.token = json.load(f)
+                self._mtime = mtime
+            except (OSError, ValueError) as e:
+                self.last_error = f"Unreadable token cache {self.cache_path}: {e}"
+        return self.token
+
+    def seconds_left(self):
+        token = self.load()
+        if not token or "expires_at" not in token:
+            return None
+        return token["expires_at"] - time.time()
+
+    async def refresh(self, force=False):
+        """Exchange the refresh token for a new access token, unless the current one is still fresh"""
+        async with self._lock:
+            left = self.seconds_left()
+            if not force and left is not None and left > self.margin:
+                return self.token
+            if not self.token or not self.token.get("refresh_token"):
+                raise RuntimeError(f"No refresh token in {self.cache_path}, run refresh.py once to log in")
+            from spotipy.cache_handler import MemoryCacheHandler
+
+            refresh_token = self.token["refresh_token"]
+            # spotipy's client is synchronous, keep the HTTP call off the event loop
+            fresh = await asyncio.to_thread(oauth(MemoryCacheHandler()).refresh_access_token, refresh_token)
+            # Spotify only sometimes rotates the refresh token
+            fresh.setdefault("refresh_token", refresh_token)
+            self.save(fresh)
+            self.refreshes += 1
+            self.last_refresh = time.time()
+            self.last_error = None
+            print(f"Spotify token refreshed, valid for {(fresh['expires_at'] - time.time()) / 60:.0f} minutes")
+            return fresh
+
+    def save(self, token: dict):
+        write_json_atomic(self.cache_path, token)
+        self.token = token
+        self._mtime = os.path.getmtime(self.cache_path)
+        if self.mcp_config_path:
+            self._share_with_mcp(token)
+
+    def _share_with_mcp(self, token: dict):
+        try:
+            with open(self.mcp_config_path) as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            config = {"clientId": SPOTIFY_CLIENT_ID, "clientSecret": SPOTIFY_CLIENT_SECRET, "redirectUri": SPOTIFY_REDIRECT_URI}
+        config.update({
+            "accessToken": token["access_token"],
+            "refreshToken": token["refresh_token"],
+            "expiresAt": int(token["expires_at"] * 1000),
+        })
+        write_json_atomic(self.mcp_config_path, config)
+
+    async def _run(self):
+        backoff = 5.0
+        while True:
+            left = self.seconds_left()
+            if left is not None and left > self.margin:
+                await asyncio.sleep(left - self.margin)
+            try:
+                await self.refresh()
+                backoff = 5.0
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"Spotify token refresh failed: {e}, retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 300.0)
+
+    def start(self):
+        """Refresh in the background for as long as the event loop runs"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def health(self):
+        left = self.seconds_left()
+        if left is None:
+            status = "missing"
+        elif left <= 0:
+            status = "expired"
+        elif left <= self.margin:
+            status = "expiring"
+        else:
+            status = "ok"
+        return {
+            "status": status,
+            "expires_in": left,
+            "scope": (self.token or {}).get("scope"),
+            "last_refresh": self.last_refresh,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "background_refresh": self._task is not None and not self._task.done(),
+        }
+
+
+token_manager = SpotifyTokenManager()
+
+registry.register(CallbackGauge("agent_spotify_token_expires_in_seconds", "Seconds until the Spotify access token expires",
+                                lambda: token_manager.seconds_left() or 0))
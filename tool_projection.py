@@ -0,0 +1,183 @@
+import json
+import os
+import re
+
+
+# Set TOOL_PROJECTION=0 to send raw tool results to the model
+TOOL_PROJECTION = os.getenv("TOOL_PROJECTION", "1") == "1"
+
+# Fields the agents actually use, per Spotify object type. Override with
+# TOOL_PROJECTION_FIELDS='{"track": ["name", "artists", "uri"]}'
+PROJECTION_FIELDS = {
+    "track": ["name", "artists", "uri"],
+    "album": ["name", "artists", "uri", "release_date", "total_tracks"],
+    "artist": ["name", "uri", "genres", "popularity"],
+    "playlist": ["name", "id", "owner", "tracks"],
+}
+PROJECTION_FIELDS.update(json.loads(os.getenv("TOOL_PROJECTION_FIELDS", "{}")))
+
+# tools whose results are projected, everything else passes through
+PROJECTED_TOOLS = {"searchSpotify", "searchSpotifyMany", "getPlaylistTracks", "getMyPlaylists"}
+
+# Search results shown to the model, the rest are counted in a "more not shown" line
+SEARCH_MAX_ITEMS = int(os.getenv("TOOL_PROJECTION_MAX_ITEMS", "10"))
+
+# The Spotify MCP server's text format: a "# ..." header, then one numbered line per item,
+#   1. "Halo" by Beyoncé (3:44) - ID: 4JehYebiI9JE8sR8MisGVb
+#   1. "Workout" (25 tracks) - ID: 3cEYpjA9oz9GiPac4AsH4n
+#   1. Beyoncé - ID: 6vWDO969PvNqNYHIOW5v0m
+TEXT_HEADER = re.compile(r'^# (?:Search results for "(?P<query>.*)" \(type: (?P<type>\w+)\)|(?P<title>.*))$')
+TEXT_ITEM = re.compile(r'^\d+\.\s+(?:"(?P<name>.*)"|(?P<bare>.+?))(?: by (?P<by>.+?))?(?: \((?P<detail>[^()]*)\))?'
+                       r' - ID: (?P<id>[A-Za-z0-9]+)$')
+TEXT_TYPES = {"getPlaylistTracks": "track", "getMyPlaylists": "playlist"}
+
+
+def _duration(ms):
+    seconds = int(ms) // 1000
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+FIELD_GETTERS = {
+    "artists": lambda item: ", ".join(artist["name"] for artist in item.get("artists") or []),
+    "duration": lambda item: _duration(item["duration_ms"]) if item.get("duration_ms") is not None else "",
+    "genres": lambda item: ", ".join((item.get("genres") or [])[:3]),
+    "owner": lambda item: (item.get("owner") or {}).get("display_name") or (item.get("owner") or {}).get("id", ""),
+    "tracks": lambda item: (item.get("tracks") or {}).get("total", "") if isinstance(item.get("tracks"), dict) else item.get("tracks", ""),
+    "album": lambda item: (item.get("album") or {}).get("name", ""),
+}
+
+
+def _field(item, field):
+    getter = FIELD_GETTERS.get(field)
+    value = getter(item) if getter else item.get(field, "")
+    return str(value if value is not None else "").replace("|", "/").replace("\n", " ")
+
+
+def project_items(item_type: str, items) -> str:
+    """Render Spotify objects as a compact table with only the configured fields"""
+    fields = PROJECTION_FIELDS.get(item_type, ["name", "uri"])
+    rows = [f"{item_type}s: " + " | ".join(fields)]
+    for item in items:
+        if item_type == "track" and isinstance(item, dict) and isinstance(item.get("track"), dict):
+            item = item["track"]  # playlist items wrap the track
+        if isinstance(item, dict):
+            rows.append(" | ".join(_field(item, field) for field in fields))
+    return "\n".join(rows)
+
+
+def _project_json(payload):
+    """Compact text for a Spotify API style payload, or None if the shape is unknown"""
+    if isinstance(payload, dict):
+        # search responses: {"tracks": {"items": [...]}, "albums": {...}, ...}, capped like the text format
+        tables = [
+            project_items(key[:-1], payload[key]["items"][:SEARCH_MAX_ITEMS])
+            for key in ("tracks", "albums", "artists", "playlists")
+            if isinstance(payload.get(key), dict) and isinstance(payload[key].get("items"), list)
+        ]
+        if tables:
+            return "\n\n".join(tables)
+        if isinstance(payload.get("items"), list):
+            return _project_json(payload["items"])
+    if isinstance(payload, list) and payload and isinstance(payload[0], dict):
+        first = payload[0].get("track", payload[0]) if isinstance(payload[0].get("track"), dict) else payload[0]
+        item_type = first.get("type", "track")
+        return project_items(item_type, payload)
+    return None
+
+
+def _text_item(item_type: str, match) -> str:
+    """One item line with only the configured fields, the ID is always kept"""
+    fields = PROJECTION_FIELDS.get(item_type, ["name", "uri"])
+    name = match.group("name") or match.group("bare")
+    line = f'"{name}"' if match.group("name") is not None else name
+    if match.group("by") and ("artists" in fields or "owner" in fields):
+        line += f" by {match.group('by')}"
+    detail = match.group("detail")
+    if detail and (("duration" in fields and re.fullmatch(r"\d+:\d\d", detail)) or ("tracks" in fields and "track" in detail)):
+        line += f" ({detail})"
+    return f"{line} - ID: {match.group('id')}"
+
+
+def _project_text(tool_name: str, text: str) -> str:
+    """The MCP server's numbered listings without numbering and unused fields, search results capped"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    item_type = TEXT_TYPES.get(tool_name, "track")
+    projected, items = [], 0
+    for line in lines:
+        header = TEXT_HEADER.match(line)
+        if header:
+            item_type = header.group("type") or item_type
+            projected.append(f'{item_type}s for "{header.group("query")}":' if header.group("query") is not None
+                             else header.group("title") + ":")
+            continue
+        match = TEXT_ITEM.match(line)
+        if match is None:
+            projected.append(line)
+            continue
+        items += 1
+        if tool_name == "searchSpotify" and items > SEARCH_MAX_ITEMS:
+            continue
+        projected.append(_text_item(item_type, match))
+    if tool_name == "searchSpotify" and items > SEARCH_MAX_ITEMS:
+        projected.append(f"({items - SEARCH_MAX_ITEMS} more results not shown)")
+    return "\n".join(projected)
+
+
+def project_result(tool_name: str, content):
+    """The part of a tool result that re-enters the LLM context"""
+    if not TOOL_PROJECTION or tool_name not in PROJECTED_TOOLS:
+        return content
+    if tool_name == "searchSpotifyMany":
+        try:
+            entries = json.loads(content)
+        except (TypeError, ValueError):
+            return content
+        return "\n\n".join(
+            f'query "{entry["query"]}":\n{project_result("searchSpotify", entry["result"])}'
+            for entry in entries
+        )
+    if isinstance(content, str):
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            return _project_text(tool_name, content)
+    else:
+        payload = content
+    projected = _project_json(payload)
+    if projected is None:
+        return content if isinstance(content, str) else json.dumps(content)
+    return projected
+
+
+def project_tool_messages(tool_messages):
+    """Copies of ToolMessages with projected content; the originals keep the full payload"""
+    projected = []
+    for message in tool_messages:
+        content = project_result(message.name, message.content)
+        if content is message.content:
+            projected.append(message)
+        else:
+            projected.append(message.model_copy(update={"content": content}))
+    return projected
+
+
+def record_playlist_info(playlist_info, ai_message, tool_messages, max_playlists: int = 20):
+    """Keep full getMyPlaylists/getPlaylistTracks payloads for programmatic use"""
+    calls = {call["id"]: call for call in getattr(ai_message, "tool_calls", None) or []}
+    updated = dict(playlist_info or {})
+    tracks = dict(updated.get("tracks", {}))
+    for message in tool_messages:
+        call = calls.get(getattr(message, "tool_call_id", None))
+        if call is None or getattr(message, "status", None) == "error":
+            continue
+        if call["name"] == "getMyPlaylists":
+            updated["playlists"] = message.content
+        elif call["name"] == "getPlaylistTracks":
+            playlist_id = call["args"].get("playlistId")
+            tracks.pop(playlist_id, None)
+            tracks[playlist_id] = message.content
+    for playlist_id in list(tracks)[:-max_playlists]:
+        del tracks[playlist_id]
+    if tracks:
+        updated["tracks"] = tracks
+    return updated
@@ -0,0 +1,169 @@
+import asyncio
+import functools
+import json
+import os
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from chat_response import tool_preview, turn_messages
+from metrics import registry, Counter
+
+
+# Graph nodes one turn may run before it wraps up with what it has
+MAX_HOPS = int(os.getenv("MAX_HOPS", "16"))
+# Tool calls one turn may execute, repeats served from the memo don't count
+MAX_TOOL_CALLS = int(os.getenv("MAX_TOOL_CALLS", "30"))
+# Seconds one turn may run, a node still running at the deadline is cancelled
+TURN_DEADLINE = float(os.getenv("TURN_DEADLINE", "90"))
+
+# Characters of each tool result quoted in a partial answer
+PARTIAL_RESULT_CHARS = 1500
+
+STOP_MESSAGES = {
+    "hops": "it took more steps than allowed for one request",
+    "tool_calls": "it needed more tool calls than allowed for one request",
+    "deadline": "it ran out of time",
+    "loop": "it kept repeating the same tool calls",
+}
+
+budget_stops = registry.register(Counter("agent_budget_stops_total", "Turns wrapped up early by their execution budget", ["reason"]))
+tool_memo_hits = registry.register(Counter("agent_tool_memo_hits_total", "Repeated tool calls answered from earlier in the turn", ["tool"]))
+
+
+def call_key(call) -> str:
+    return call["name"] + ":" + json.dumps(call["args"], sort_keys=True, default=str)
+
+
+def _stub_results(message, text):
+    """Error results for tool calls that will not run, so no call is left without a result"""
+    calls = getattr(message, "tool_calls", None) or []
+    return [ToolMessage(content=text, name=call["name"], tool_call_id=call["id"], status="error") for call in calls]
+
+
+class TurnBudget:
+    """Hop, tool call and wall-clock limits for one turn of the graph.
+
+    The counters live in the graph state under "budget", keyed by the turn's
+    HumanMessage, so they are checkpointed with the thread like everything else
+    and start over with each new message.
+    """
+
+    def __init__(self, max_hops: int = MAX_HOPS, max_tool_calls: int = MAX_TOOL_CALLS, deadline: float = TURN_DEADLINE):
+        self.max_hops = max_hops
+        self.max_tool_calls = max_tool_calls
+        self.deadline = deadline
+
+    def current(self, state) -> dict:
+        """This turn's counters, fresh ones if the state's belong to an earlier turn"""
+        messages = state.get("messages") or []
+        turn = next((m.id for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+        budget = state.get("budget")
+        if not budget or budget.get("turn") != turn:
+            return {"turn": turn, "started": time.time(), "hops": 0, "tool_calls": 0, "memo_hits": 0,
+                    "repeat_rounds": 0, "stopped": None}
+        return budget
+
+    def remaining(self, budget) -> float:
+        return self.deadline - (time.time() - budget["started"])
+
+    def check(self, state, pending_calls: int = 0):
+        """Why the turn has to stop before its next node, or None if it can go on"""
+        budget = self.current(state)
+        if budget["stopped"]:
+            return budget["stopped"]
+        if budget["repeat_rounds"] >= 2:
+            return "loop"
+        if self.remaining(budget) <= 0:
+            return "deadline"
+        if budget["hops"] >= self.max_hops:
+            return "hops"
+        if budget["tool_calls"] + pending_calls > self.max_tool_calls:
+            return "tool_calls"
+        return None
+
+    def node(self, fn, deadline: bool = True):
+        """Wrap a graph node to count it as a hop and cancel it at the turn's deadline"""
+
+        @functools.wraps(fn)
+        async def budgeted(state):
+            budget = self.current(state)
+            try:
+                if deadline:
+                    update = await asyncio.wait_for(fn(state), timeout=max(0.0, self.remaining(budget)))
+                else:
+                    update = await fn(state)
+            except asyncio.TimeoutError:
+                update = self.stop(state, "deadline")
+            update = dict(update or {})
+            budget = update.get("budget") or budget
+            update["budget"] = {**budget, "hops": budget["hops"] + 1}
+            return update
+
+        return budgeted
+
+    def memo_calls(self, state, ai_message):
+        """Split a model turn's tool calls into ones to run and ones answered by another call.
+
+        Returns (calls to run, {call id: earlier ToolMessage}, {call id: id of the
+        identical call in this batch}). A call with the same name and arguments as
+        one already answered in this turn, or as another call in the same batch,
+        is not run again.
+        """
+        messages = turn_messages(state["messages"])
+        results = {m.tool_call_id: m for m in messages
+                   if isinstance(m, ToolMessage) and getattr(m, "status", "success") != "error"}
+        answered = {}
+        for message in messages:
+            for call in getattr(message, "tool_calls", None) or []:
+                if call["id"] in results:
+                    answered.setdefault(call_key(call), results[call["id"]])
+        to_run, reused, duplicates, first_of = [], {}, {}, {}
+        for call in ai_message.tool_calls:
+            key = call_key(call)
+            if key in answered:
+                reused[call["id"]] = answered[key]
+            elif key in first_of:
+                duplicates[call["id"]] = first_of[key]
+            else:
+                first_of[key] = call["id"]
+                to_run.append(call)
+                continue
+            tool_memo_hits.inc(tool=call["name"])
+        return to_run, reused, duplicates
+
+    def record_tools(self, state, executed: int, reused: int) -> dict:
+        """Budget after a tools node ran `executed` calls and answered `reused` without running them"""
+        budget = self.current(state)
+        # a round of nothing but repeats means the agent is going in circles, the second one stops it
+        repeat_rounds = budget["repeat_rounds"] + 1 if reused and not executed else budget["repeat_rounds"]
+        return {**budget, "tool_calls": budget["tool_calls"] + executed, "memo_hits": budget["memo_hits"] + reused,
+                "repeat_rounds": repeat_rounds}
+
+    def stop(self, state, reason: str) -> dict:
+        """The update that ends the turn: results for unanswered tool calls and a partial answer"""
+        budget = self.current(state)
+        budget_stops.inc(reason=reason)
+        messages = state.get("messages") or []
+        stubs = _stub_results(messages[-1], "Not run: the request was stopped before this call.") if messages else []
+        return {
+            "messages": stubs + [AIMessage(content=self.partial_answer(state, reason))],
+            "budget": {**budget, "stopped": reason},
+        }
+
+    def partial_answer(self, state, reason: str) -> str:
+        """What the turn found before it stopped, without another LLM call"""
+        found, seen = [], set()
+        for message in turn_messages(state.get("messages") or []):
+            if isinstance(message, ToolMessage) and getattr(message, "status", "success") != "error":
+                text = tool_preview(message.name, message.content, PARTIAL_RESULT_CHARS)
+                if text and text not in seen:
+                    seen.add(text)
+                    found.append(f"{message.name}:\n{text}")
+        answer = f"I stopped before finishing this request because {STOP_MESSAGES.get(reason, reason)}."
+        if found:
+            answer += " Here is what I found so far:\n\n" + "\n\n".join(found)
+        else:
+            answer += " Please try again, or split it into smaller requests."
+        return answer
+